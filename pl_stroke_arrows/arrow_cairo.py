@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Cairo rendering of the arrows, outside GIMP
+#
+# Draws the shaft, head and tail computed by arrow_geometry.py with pycairo, with the
+# same stroke settings as the plug-in puts on the GIMP context: miter join (limit
+# 100), butt cap, antialiasing and stroke width.
+#
+# As a script, renders thumbnails in parallel from a JSON Lines job file:
+#   python3 arrow_cairo.py jobs.jsonl [--processes 8]
+# (a job that fails is reported on stderr with its line number, the others go on)
+# one job per line:
+#   {"output": "thumb.png", "width": 256, "height": 256,
+#    "background": "thumb_src.png",              optional, PNG drawn under the arrows
+#    "color": [0.0, 0.0, 0.0, 1.0],              optional, RGBA 0.0 - 1.0
+#    "style": {"arrowStyle": "empty", ...},      optional, same as arrow_cli.py
+#    "arrows": [{"points": [[x, y], ...]}, ...]} same path specs as arrow_cli.py
+#
+# pycairo is only needed for this module, the plug-in doesn't use it.
+#
+# License: GPLv3 (see pl_stroke_arrows.py)
+
+import sys
+import math
+import json
+import argparse
+import multiprocessing
+
+try :
+    import cairo
+except ImportError :
+    cairo = None
+
+from arrow_geometry import DEFAULT_STYLE, DELTA_T, prepareStyle, computeArrow, computeMarkers, Curve
+from arrow_cli import styleFromRequest, pointsFromRequest
+
+
+#*************************************************************************************
+
+
+def requireCairo() :
+
+    if cairo is None :
+        raise RuntimeError("pycairo is needed for the cairo rendering (pip install pycairo)")
+
+
+# same settings as drawArrows puts on the GIMP context
+def setupContext(cr, strokeWidth, color=(0.0, 0.0, 0.0, 1.0), antialias=True) :
+
+    requireCairo()
+
+    cr.set_source_rgba(*color)
+    cr.set_line_width(strokeWidth)
+    cr.set_line_join(cairo.LINE_JOIN_MITER)
+    cr.set_line_cap(cairo.LINE_CAP_BUTT)
+    cr.set_miter_limit(100.0) # max value accepted by GIMP: 100.0
+
+    if antialias :
+        cr.set_antialias(cairo.ANTIALIAS_DEFAULT)
+    else :
+        cr.set_antialias(cairo.ANTIALIAS_NONE)
+    # end if
+
+
+#*************************************************************************************
+
+
+def drawShaft(cr, shaftCoords) :
+
+    cr.new_path()
+    cr.move_to(shaftCoords[0], shaftCoords[1])
+
+    i = 2
+    while i + 5 < len(shaftCoords) :
+        cr.curve_to(*shaftCoords[i:i+6])
+        i += 6
+    # end while
+
+    if cr.get_line_width() > 0.0 :
+        cr.stroke()
+    else :
+        cr.new_path()
+
+
+def drawElement(cr, element) :
+
+    cr.new_path()
+
+    for vertices, closed in element["lines"] :
+
+        cr.move_to(*vertices[0])
+        for x, y in vertices[1:] :
+            cr.line_to(x, y)
+        # end for
+        if closed :
+            cr.close_path()
+
+    # end for
+
+    if element["circle"] is not None :
+        oriX, oriY, radius = element["circle"]
+        cr.new_sub_path()
+        cr.arc(oriX, oriY, radius, 0.0, 2.0 * math.pi)
+        cr.close_path()
+    # end if
+
+    if element["filled"] :
+        cr.fill()
+    elif cr.get_line_width() > 0.0 :
+        cr.stroke()
+    else :
+        cr.new_path()
+    # end if
+
+
+#*************************************************************************************
+
+
+# draw one arrow computed by computeArrow, the context must be set up by setupContext
+def renderArrow(cr, arrowGeometry, drawShaftPath=True, drawHead=True, drawTail=True, markers=()) :
+
+    if drawShaftPath :
+        drawShaft(cr, arrowGeometry.shaft)
+
+    if drawHead :
+        drawElement(cr, arrowGeometry.head)
+        for marker in markers :
+            drawElement(cr, marker)
+        # end for
+    # end if
+
+    if drawTail and arrowGeometry.tail is not None :
+        drawElement(cr, arrowGeometry.tail)
+
+
+#*************************************************************************************
+
+
+# one thumbnail job (see header), returns the output file name
+def renderThumbnail(job) :
+
+    requireCairo()
+
+    if "background" in job :
+        surface = cairo.ImageSurface.create_from_png(job["background"])
+    else :
+        surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, int(job["width"]), int(job["height"]))
+    # end if
+
+    cr = cairo.Context(surface)
+
+    userStyle = styleFromRequest(job, DEFAULT_STYLE)
+    style = prepareStyle(**userStyle)
+
+    setupContext(cr, style.strokeWidth, tuple(job.get("color", (0.0, 0.0, 0.0, 1.0))))
+
+    for arrow in job["arrows"] :
+
+        pointsList = pointsFromRequest(arrow)
+        curve = Curve(pointsList, DELTA_T)
+        arrowGeometry = computeArrow(pointsList, style, DELTA_T, curve)
+
+        markers = []
+        markerSpacing = float(arrow.get("markerSpacing", 0.0))
+        if markerSpacing > 0.0 :
+            markers = computeMarkers(pointsList, style, markerSpacing, DELTA_T, curve)
+
+        renderArrow(cr, arrowGeometry, markers=markers)
+
+    # end for
+
+    surface.write_to_png(job["output"])
+    surface.finish()
+
+    return job["output"]
+
+
+# (line number, line) of the job file, decoded by the workers
+def readJobs(jobsFile) :
+
+    for lineNumber, line in enumerate(jobsFile, 1) :
+        line = line.strip()
+        if line != "" :
+            yield lineNumber, line
+    # end for
+
+
+# one job line in a worker: (line number, output file name, error message or None), so a
+# bad job is reported without stopping the pool
+def renderJob(numberedLine) :
+
+    lineNumber, line = numberedLine
+
+    try :
+        job = json.loads(line)
+        if not isinstance(job, dict) :
+            raise ValueError("a job must be a JSON object")
+        return lineNumber, renderThumbnail(job), None
+    except (ValueError, TypeError, KeyError, IndexError, ZeroDivisionError, OSError,
+            MemoryError, cairo.Error) as error :
+        return lineNumber, None, str(error)
+    # end try
+
+
+# render the jobs with a pool of processes, (line number, output, error) reported as
+# they are done
+def renderThumbnails(jobs, processes=None, chunkSize=16) :
+
+    requireCairo()
+
+    with multiprocessing.Pool(processes) as pool :
+        for result in pool.imap_unordered(renderJob, jobs, chunkSize) :
+            yield result
+        # end for
+    # end with
+
+
+#*************************************************************************************
+
+
+def main() :
+
+    parser = argparse.ArgumentParser(description="Render arrows on PNG thumbnails with cairo.")
+    parser.add_argument("jobs", help="JSON Lines job file, - for stdin")
+    parser.add_argument("--processes", type=int, default=None,
+                        help="number of worker processes (default: one per CPU)")
+    args = parser.parse_args()
+
+    requireCairo()
+
+    count = 0
+    failures = 0
+
+    with ( sys.stdin if args.jobs == "-" else open(args.jobs) ) as jobsFile :
+        for lineNumber, output, error in renderThumbnails(readJobs(jobsFile), args.processes) :
+            if error is None :
+                count += 1
+            else :
+                failures += 1
+                print("line {}: {}".format(lineNumber, error), file=sys.stderr)
+            # end if
+        # end for
+    # end with
+
+    print("{} thumbnails rendered, {} failed".format(count, failures), file=sys.stderr)
+
+    return 1 if failures > 0 else 0
+
+
+if __name__ == "__main__" :
+    sys.exit(main())
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Command line arrow geometry, no GIMP needed
+#
+# Reads one JSON object per line (JSON Lines) on stdin and writes the computed arrow
+# on stdout, one line per input line, as soon as it is computed. Nothing is kept from
+# one line to the next except the last prepared style, so memory stays constant.
+#
+# input line:
+#   {"id": 12,                                   optional, copied to the output
+#    "points": [[x, y], [x, y], ...],            anchor, control, control, anchor...
+#    "gimp": [x, y, x, y, ...],                  or the GIMP flat list of a stroke
+#    "invert": false,                            optional, flip the path direction
+#    "markerSpacing": 0.0,                       optional, repeated heads
+#    "style": {"arrowStyle": "empty", ...}}      optional, plug-in parameter names,
+#                                                 missing values use the defaults
+#
+# output line:
+#   {"id": 12, "shaft": [[x, y], ...], "head": element, "tail": element or null,
+#    "markers": [element, ...]}
+#   element: {"filled": bool, "lines": [{"points": [[x, y], ...], "closed": bool}],
+#             "circle": [x, y, radius] or null}
+#   or {"id": 12, "error": "message"} when the line can't be used
+#
+# usage: producer | python3 arrow_cli.py [--style '{"wingLen": 30}'] | renderer
+#
+# License: GPLv3 (see pl_stroke_arrows.py)
+
+import sys
+import math
+import json
+import argparse
+
+from arrow_geometry import (DEFAULT_STYLE, DELTA_T, OVERRIDE_CHOICES, OVERRIDE_RANGES,
+                            prepareStyle, computeArrow, computeMarkers, Curve, listToPoints,
+                            coordsToPoints)
+
+
+#*************************************************************************************
+
+
+def elementToJson(element) :
+
+    if element is None :
+        return None
+
+    return {
+        "filled" : element["filled"],
+        "lines"  : [ {"points": vertices, "closed": closed} for vertices, closed in element["lines"] ],
+        "circle" : element["circle"],
+    }
+
+
+#*************************************************************************************
+
+
+# style of a line over the base style, values checked as the per-path parameters of
+# the plug-in (same choices and ranges)
+def styleFromRequest(request, baseStyle) :
+
+    style = request.get("style", {})
+    if not isinstance(style, dict) :
+        raise ValueError("'style' must be a JSON object")
+
+    userStyle = dict(baseStyle)
+    userStyle.update(style)
+
+    unknown = set(userStyle) - set(DEFAULT_STYLE)
+    if unknown :
+        raise ValueError("unknown style parameter(s): " + ", ".join(sorted(unknown)))
+
+    for name, value in userStyle.items() :
+
+        if name in OVERRIDE_CHOICES and value not in OVERRIDE_CHOICES[name] :
+            raise ValueError("{} must be one of {}".format(name, ", ".join(OVERRIDE_CHOICES[name])))
+        elif name in OVERRIDE_RANGES :
+            checkRange(name, value)
+        elif name == "tailUnitRelative" and not isinstance(value, bool) :
+            raise ValueError("tailUnitRelative must be true or false")
+        # end if
+
+    # end for
+
+    return userStyle
+
+
+# number inside the range of the plug-in argument name
+def checkRange(name, value) :
+
+    low, high = OVERRIDE_RANGES[name]
+
+    if isinstance(value, bool) or not isinstance(value, (int, float)) :
+        raise ValueError("{} must be a number".format(name))
+    if not math.isfinite(value) :
+        raise ValueError("{} must be a finite number".format(name))
+    if not low <= value <= high :
+        raise ValueError("{} must be between {:g} and {:g}".format(name, low, high))
+
+    return float(value)
+
+
+def pointsFromRequest(request) :
+
+    if "points" in request :
+        pointsList = [ [float(x), float(y)] for x, y in request["points"] ]
+    elif "gimp" in request :
+        pointsList = listToPoints([ float(value) for value in request["gimp"] ])
+    else :
+        raise ValueError("missing 'points' or 'gimp' coordinates")
+    # end if
+
+    # 1e400 or NaN in the JSON text would give Infinity and NaN in the output
+    if not all( math.isfinite(x) and math.isfinite(y) for x, y in pointsList ) :
+        raise ValueError("coordinates must be finite numbers")
+
+    if len(pointsList) < 4 or (len(pointsList) - 1) % 3 != 0 :
+        raise ValueError("a path needs 3n + 1 points (anchor, control, control, anchor...)")
+
+    if request.get("invert", False) :
+        pointsList.reverse()
+
+    return pointsList
+
+
+#*************************************************************************************
+
+
+def processLines(inputFile, outputFile, baseStyle) :
+
+    lastKey = None
+    style = None
+
+    for line in inputFile :
+
+        line = line.strip()
+        if line == "" :
+            continue
+
+        result = {}
+
+        try :
+
+            request = json.loads(line)
+            if not isinstance(request, dict) :
+                raise ValueError("a line must be a JSON object")
+            if "id" in request :
+                result["id"] = request["id"]
+
+            userStyle = styleFromRequest(request, baseStyle)
+            markerSpacing = checkRange("markerSpacing", request.get("markerSpacing", 0.0))
+
+            # consecutive arrows usually share their style, prepare it only once
+            key = tuple(sorted(userStyle.items()))
+            if key != lastKey :
+                style = prepareStyle(**userStyle)
+                lastKey = key
+            # end if
+
+            pointsList = pointsFromRequest(request)
+            curve = Curve(pointsList, DELTA_T)
+            arrowGeometry = computeArrow(pointsList, style, DELTA_T, curve)
+
+            result["shaft"] = coordsToPoints(arrowGeometry.shaft)
+            result["head"] = elementToJson(arrowGeometry.head)
+            result["tail"] = elementToJson(arrowGeometry.tail)
+
+            markers = []
+            if markerSpacing > 0.0 :
+                markers = computeMarkers(pointsList, style, markerSpacing, DELTA_T, curve)
+            result["markers"] = [ elementToJson(marker) for marker in markers ]
+
+        except (ValueError, TypeError, KeyError, IndexError, ZeroDivisionError) as error :
+
+            result["error"] = str(error)
+
+        # end try
+
+        outputFile.write(json.dumps(result) + "\n")
+        outputFile.flush()
+
+    # end for
+
+
+#*************************************************************************************
+
+
+def main() :
+
+    parser = argparse.ArgumentParser(description="Compute arrows from JSON Lines path specs "
+                                                 "read on stdin, results on stdout.")
+    parser.add_argument("--style", default="{}",
+                        help="JSON object of default style parameters for all lines")
+    args = parser.parse_args()
+
+    baseStyle = dict(DEFAULT_STYLE)
+    try :
+        baseStyle = styleFromRequest({"style": json.loads(args.style)}, baseStyle)
+    except ValueError as styleError :
+        parser.error("--style: {}".format(styleError))
+
+    try :
+        processLines(sys.stdin, sys.stdout, baseStyle)
+    except BrokenPipeError :
+        pass
+
+    return 0
+
+
+if __name__ == "__main__" :
+    sys.exit(main())
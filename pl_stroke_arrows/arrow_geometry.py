@@ -0,0 +1,2058 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Arrow geometry for pl_stroke_arrows
+#
+# Pure python, no GIMP needed: shortens the path, places the arrowhead and builds the
+# tail from a points list. Used by the plug-in and by the standalone tools.
+# The path is held by a Curve (segment coefficients and arc length table), head and
+# tail both cut it through views, the tail seeing it backwards.
+#
+# Original author : Pascal Lachat
+
+# ------------------
+
+# License: GPLv3
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY, without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# To view a copy of the GNU General Public License
+# visit: http://www.gnu.org/licenses/gpl.html
+
+# ------------------
+
+# Formats
+# -------
+# - points list: [ [x, y], ... ] anchors and control points of a cubic Bezier spline,
+#    anchor, control, control, anchor, ... (3n + 1 points for n segments)
+# - GIMP flat list: [x, y, x, y, ...] with a control point before the first anchor and
+#    after the last one, as returned by Gimp.Path.stroke_get_points()
+# - coords: [x, y, x, y, ...] the points of a points list one after the other, used
+#    for the shaft so that long paths are copied by slices, never point by point
+# - element: a head or tail shape, dict with
+#       "filled"  : True to fill, False to stroke
+#       "lines"   : list of (vertices, closed), vertices [ [x, y], ... ] joined by
+#                    straight lines
+#       "circle"  : (x, y, radius) or None
+# - records: ArrowSpec (prepared style), ArrowheadSpec, HeadPlacement, ArrowGeometry,
+#    named tuples
+
+
+#*************************************************************************************
+
+
+import math
+import bisect
+import collections
+
+
+# default values of the plug-in parameters (user units)
+DEFAULT_STYLE = {
+    "arrowStyle"       : "filled",
+    "wingLen"          : 40.0,
+    "tipAngle"         : 35.0,
+    "harpoonFactor"    : 0.0,
+    "strokeWidth"      : 4.0,
+    "tailType"         : "none",
+    "tailStyle"        : "default",
+    "tailSize"         : 80.0,
+    "tailUnitRelative" : True,
+}
+
+DELTA_T = 0.01 # increment of t parameter used to scan segments
+
+ARROW_PARTS = ("shaft", "head", "tail") # what computeArrow can build
+
+OUTLINE_TOLERANCE = 0.05 # max distance (px) between the shaft and its flattened outline
+MITER_LIMIT = 100.0      # same as the GIMP context
+SHAFT_WINDOW = 20        # coords at each end of a shaft read for its bounds: patch, cut
+                         # segment and the next one
+
+# per-path overrides ("arrow: style=empty tail=bullet wing=30"), see parseOverrides
+OVERRIDE_NAMES = {
+    "style"     : "arrowStyle",
+    "wing"      : "wingLen",
+    "tip"       : "tipAngle",
+    "shape"     : "harpoonFactor",
+    "width"     : "strokeWidth",
+    "tail"      : "tailType",
+    "tailstyle" : "tailStyle",
+    "tailwidth" : "tailSize",
+    "tailrel"   : "tailUnitRelative",
+    "repeat"    : "markerSpacing",
+    "flip"      : "invertPath",
+}
+
+OVERRIDE_CHOICES = {
+    "arrowStyle" : ["filled", "empty", "simple"],
+    "tailType"   : ["none", "crossbar", "bullet", "feathered", "arrowhead"],
+    "tailStyle"  : ["default", "filled", "empty", "simple"],
+}
+
+OVERRIDE_CHOICE_ALIASES = {"bar": "crossbar", "feather": "feathered", "two-way": "arrowhead"}
+
+# same limits as the plug-in arguments
+OVERRIDE_RANGES = {
+    "wingLen"       : (2.0, 500.0),
+    "tipAngle"      : (10.0, 120.0),
+    "harpoonFactor" : (-10.0, 5.0),
+    "strokeWidth"   : (0.0, 50.0),
+    "tailSize"      : (2.0, 500.0),
+    "markerSpacing" : (0.0, 5000.0),
+}
+
+OVERRIDE_BOOLEANS = ["tailUnitRelative", "invertPath"]
+
+
+#*************************************************************************************
+
+
+# records: named tuples, compared and hashed by value (cache keys, when the fields are
+# hashable), _replace() for a copy with some fields changed
+
+# one arrowhead (the head, or the tail of a two-way arrow) of a prepared style, in
+# pixels, already shrunk for the stroke
+ArrowheadSpec = collections.namedtuple("ArrowheadSpec",
+                    ("arrowStyle", "arrowLength", "axisLength", "wingLength", "cutDistance",
+                     "tipProtruding"))
+
+# style prepared from the user parameters (see prepareStyle), angles in radians; tail
+# is the ArrowheadSpec of a two-way arrow, None for other tail types
+ArrowSpec = collections.namedtuple("ArrowSpec",
+                ("strokeWidth", "tipAngle", "harpoonFactor", "head", "tailType", "tailStyle",
+                 "tailSize", "tail"))
+
+# where designPath put an arrowhead: view left for the shaft, axis length (shorter on
+# short paths), anchor, direction at the cut, patch points joining the shaft
+HeadPlacement = collections.namedtuple("HeadPlacement",
+                    ("view", "axisLength", "anchorX", "anchorY", "endAngle", "patch"))
+
+# one arrow, see computeArrow: shaft coords, head and tail elements (None when not
+# built), and in outline mode the outline element and the names of the merged parts;
+# control points box and longest miter of the shaft, for its bounds (see shaftExtent)
+ArrowGeometry = collections.namedtuple("ArrowGeometry",
+                    ("shaft", "head", "tail", "outline", "merged", "shaftBox", "shaftMiter"))
+
+
+# prepared styles by their parameters tuple (see groupedArrowGeometries), the least
+# recently used dropped beyond size entries
+class StyleCache (collections.OrderedDict) :
+
+    def __init__(self, size) :
+
+        collections.OrderedDict.__init__(self)
+        self.size = size
+
+    def __getitem__(self, key) :
+
+        value = collections.OrderedDict.__getitem__(self, key)
+        self.move_to_end(key)
+
+        return value
+
+    def __setitem__(self, key, value) :
+
+        collections.OrderedDict.__setitem__(self, key, value)
+        self.move_to_end(key)
+        while len(self) > self.size :
+            self.popitem(last=False)
+        # end while
+
+
+#*************************************************************************************
+
+
+# convert the user parameters to the values used by the geometry (ArrowSpec)
+def prepareStyle(arrowStyle, strokeWidth, wingLen, tipAngle, harpoonFactor, tailType,
+                    tailStyle, tailSize, tailUnitRelative) :
+
+    if tailStyle == "default" :
+        tailStyle = arrowStyle
+    # end if
+
+    tipAngle            = math.radians(tipAngle)       # convert from user friendly
+    harpoonFactor       = 1.0 - (harpoonFactor / 10.0) # convert from user friendly
+
+    # get arrow length from wing length entered in the UI
+    arrowLen = math.cos( tipAngle / 2.0 ) * wingLen # arrowLen is used from here
+
+    # for diamond shapes, we adjust the reference length
+    if harpoonFactor > 1.0 :
+        weight = 0.15
+        ratio = 1.0 + (harpoonFactor - 1.0) * weight
+        arrowLen = arrowLen / ratio # mitigated for optical reasons
+        tailSize *= ratio # we want to keep the same relative tail size
+    # end if
+
+    if tailUnitRelative == True :
+        refSize = 2.0 * math.tan(0.5 * tipAngle) * arrowLen # reference size from arrowhead width
+        tailSize = tailSize / 100.0 * refSize
+
+    # for feather types other than simple, we adjust the reference size (used as width)
+    # not active, keep just in case
+    # if tailType == "feathered" and tailStyle != "simple" :
+        # tailSize /= 1.25
+
+    # CONSTANTS
+    harpThreshold = 0.7  # harpoon factor under which cut point and anchor point become distinct
+
+    if arrowStyle == "simple" :
+        harpThreshold = 0.9
+
+    head = arrowheadSpec(arrowStyle, strokeWidth, tipAngle, harpoonFactor, arrowLen, harpThreshold)
+
+    # same for arrow tail
+    tail = None
+
+    if tailType == "arrowhead" :
+
+        tail = arrowheadSpec(tailStyle, strokeWidth, tipAngle, harpoonFactor, arrowLen, harpThreshold)
+
+    elif ( tailType == "bullet" and tailStyle != "filled"
+        or tailType == "feathered" and tailStyle == "empty" ) :
+
+        tailSize = max( tailSize - strokeWidth, 2.0 )
+
+    #end if
+
+    return ArrowSpec(strokeWidth, tipAngle, harpoonFactor, head, tailType, tailStyle, tailSize, tail)
+
+
+# lengths of an arrowhead of length arrowLength (before shrinking)
+def arrowheadSpec(arrowStyle, strokeWidth, tipAngle, harpoonFactor, arrowLength, harpThreshold) :
+
+    wingLength = arrowLength / math.cos( tipAngle / 2.0 )
+    axisLength = harpoonFactor * arrowLength
+    # find anchor placement of the head, curve cut point must not be past harpThreshold * arrowLength
+    cutDistance = max( 0.0, ( harpThreshold - harpoonFactor ) * arrowLength ) # added distance to cut point
+
+    # for styles with contour, we reduce arrow size
+    tipProtruding, arrowLength, axisLength, wingLength = shrinkArrowhead(arrowStyle, strokeWidth,
+                                            tipAngle, arrowLength, axisLength, wingLength)
+
+    return ArrowheadSpec(arrowStyle, arrowLength, axisLength, wingLength, cutDistance, tipProtruding)
+
+
+#*************************************************************************************
+
+
+# ArrowGeometry (shaft coords, head and tail) of one arrow from the points list of a
+# path, style: an ArrowSpec; the curve (arc length table) can be given when it is
+# shared with other computations, pointsList is then unused; view: part of the curve
+# to use, the whole curve by default
+# parts: the ones not in it are None (the head cut is always made, the tail needs it)
+# placements: dict keeping the head placements made on this curve and view, by
+# (ArrowheadSpec, strokeWidth, harpoonFactor), for styles sharing the same head
+def computeArrow(pointsList, style, deltaT=DELTA_T, curve=None, view=None, parts=ARROW_PARTS,
+                 placements=None) :
+
+    if curve is None :
+        curve = Curve(pointsList, deltaT)
+    # end if
+
+    if view is None :
+        view = curve.view()
+    # end if
+
+    strokeWidth = style.strokeWidth
+    tipAngle    = style.tipAngle
+    tailType    = style.tailType
+    tailStyle   = style.tailStyle
+    tailSize    = style.tailSize
+
+    # get the new shortened and prepared path for the arrowhead
+    # ---------------------------------------------------------
+
+    key = (style.head, strokeWidth, style.harpoonFactor)
+    if placements is not None and key in placements :
+        head = placements[key]
+    else :
+        head = designPath(style.head, strokeWidth, view, style.harpoonFactor)
+    # end if
+    if placements is not None :
+        placements[key] = head
+    # end if
+    view = head.view
+
+    headElement = None
+    if "head" in parts :
+        headElement = arrowheadElement(style.head, head.axisLength, head.anchorX, head.anchorY,
+                                       tipAngle, head.endAngle)
+    # end if
+
+    #*********************************************************************************
+
+    # arrow tail
+    # ----------
+    # the tail works on the same curve, seen from the start (no copy)
+    # its cut is needed for the shaft even when the tail isn't drawn
+
+    tailView = view.reversed()
+    tailPatch = []
+    tailElement = None
+
+    if "tail" not in parts and "shaft" not in parts :
+
+        pass
+
+    elif tailType == "crossbar" :
+
+        endX, endY = tailView.endPoint()
+        tailAngle = tailView.endAngle()
+
+        tailElement = crossbarElement(endX, endY, tailAngle, tailSize)
+
+    # bullet
+    elif tailType == "bullet" :
+
+        oriX, oriY = tailView.endPoint()
+
+        if tailStyle == "empty" :
+
+            tailView, placeHolder, tailCutDistance = shortenView(tailView, tailSize / 2.0, 0.0, 0.0)
+
+        tailElement = bulletElement(tailStyle, oriX, oriY, tailSize)
+
+    # feathered
+    elif tailType == "feathered" and ( tailStyle == "filled" or tailStyle == "empty" ) :
+
+        tailView, tailSize, tailCutDistance = shortenView(tailView, tailSize, 0.0, 0.0)
+
+        cutX, cutY = tailView.endPoint()
+        tailAngle = tailView.endAngle()
+
+        tailPatch = buildPatch([], tailSize, cutX, cutY, tailAngle)
+        tailElement = featherElement(tailStyle, tailSize, cutX, cutY, tailAngle)
+
+    # simple feather
+    elif tailType == "feathered" and tailStyle == "simple" :
+
+        n = 2 # number of wings (2 - 5)
+        tailLength = (2.0 * strokeWidth + tailSize / 2.5 + 1.0) * float(n-1) / 2.0
+
+        # tailCutDistance unused
+        tailView, tailLength, tailCutDistance = shortenView(tailView, tailLength, 0.0, 0.0)
+
+        cutX, cutY = tailView.endPoint()
+        tailAngle = tailView.endAngle()
+
+        clearSegments = 1 # max: n-1, number of intervals not drawn between wings
+        patchReduction = 1.0 - float(clearSegments) / float(n-1)
+        patchSize = tailLength * patchReduction
+
+        tailPatch = buildPatch([], patchSize, cutX, cutY, tailAngle)
+        tailElement = simpleFeatherElement(tailSize, cutX, cutY, tailLength, tailAngle, n)
+
+    # backwards arrowhead
+    elif tailType == "arrowhead" :
+
+        tail = designPath(style.tail, strokeWidth, tailView, style.harpoonFactor)
+        tailView = tail.view
+        tailPatch = tail.patch
+
+        tailElement = arrowheadElement(style.tail, tail.axisLength, tail.anchorX, tail.anchorY,
+                                       tipAngle, tail.endAngle)
+
+    #end if
+
+    if "tail" not in parts :
+        tailElement = None
+    # end if
+
+    # the shaft: tail patch, the curve between both cuts, head patch
+    newCoords = None
+    shaftBox = None
+    shaftMiter = 1.0
+    if "shaft" in parts :
+        tailPatch.reverse()
+        shaftView = tailView.reversed()
+        newCoords = flattenPoints(tailPatch) + shaftView.coords() + flattenPoints(head.patch)
+        shaftBox, shaftMiter = shaftExtent(newCoords, shaftView)
+    # end if
+
+    return ArrowGeometry(newCoords, headElement, tailElement, None, (), shaftBox, shaftMiter)
+
+
+#*************************************************************************************
+
+
+# arrowheads repeated every markerSpacing pixels of arc length, the tip of each marker
+# placed like the tip of the main arrowhead would be at that distance
+def computeMarkers(pointsList, style, markerSpacing, deltaT=DELTA_T, curve=None, maxLength=None) :
+
+    if curve is None :
+        curve = Curve(pointsList, deltaT)
+    # end if
+
+    head          = style.head
+    arrowLength   = head.arrowLength
+    axisLength    = head.axisLength
+    cutDistance   = head.cutDistance
+
+    totalLength = curve.length()
+    if maxLength is not None :
+        totalLength = min(totalLength, maxLength) # arrow drawn on the start of the path only
+    # end if
+
+    # distance from the cut point to the tip, and room left for the main arrowhead
+    headReach = axisLength + cutDistance + head.tipProtruding
+    lastTip = totalLength - headReach - arrowLength
+
+    cutLengths = []
+    tipDistance = markerSpacing
+
+    while tipDistance <= lastTip :
+
+        if tipDistance >= headReach :
+            cutLengths.append(tipDistance - headReach)
+        # end if
+
+        tipDistance += markerSpacing
+
+    # end while
+
+    markers = []
+
+    # all cut points found in a single walk along the curve
+    for u in curve.uAtLengths(cutLengths) :
+
+        cutX, cutY = curve.point(u)
+        endAngle = curve.tangentAngle(u)
+
+        anchorX = cutX + math.cos(endAngle) * cutDistance
+        anchorY = cutY + math.sin(endAngle) * cutDistance
+
+        markers.append(arrowheadElement(head, axisLength, anchorX, anchorY, style.tipAngle,
+                                        endAngle))
+
+    # end for
+
+    return markers
+
+
+#*************************************************************************************
+
+
+# arrows of several paths (points lists or Curves), one (arrowGeometry, markers, frame)
+# at a time, no markers when markerSpacing is 0, with outline the arrowGeometry also
+# has its outline and merged parts (see arrowOutline)
+# with framesNumber > 0, each path gives framesNumber arrows growing along it (frame
+# 1 to framesNumber), otherwise one arrow (frame 0); parts: see computeArrow
+def arrowGeometries(pathsPoints, style, markerSpacing=0.0, deltaT=DELTA_T, outline=False,
+                    framesNumber=0, parts=ARROW_PARTS) :
+
+    for pointsList in pathsPoints :
+
+        # shared by the arrow, the repeated heads and the frames
+        if isinstance(pointsList, Curve) :
+            curve = pointsList
+        else :
+            curve = Curve(pointsList, deltaT)
+        # end if
+
+        if framesNumber > 0 :
+            frames = growingViews(curve, framesNumber)
+        else :
+            frames = [ (0, None, None) ]
+        # end if
+
+        for frame, view, maxLength in frames :
+
+            arrowGeometry = computeArrow(pointsList, style, deltaT, curve, view, parts)
+
+            if outline :
+                outlineElement, merged = arrowOutline(arrowGeometry, style.strokeWidth)
+                arrowGeometry = arrowGeometry._replace(outline=outlineElement, merged=tuple(merged))
+            # end if
+
+            markers = []
+            if markerSpacing > 0.0 :
+                markers = computeMarkers(pointsList, style, markerSpacing, deltaT, curve, maxLength)
+            # end if
+
+            yield arrowGeometry, markers, frame
+
+        # end for
+
+    # end for
+
+
+# views of the first k / framesNumber of the curve length, k = 1 to framesNumber, as
+# (k, view, length); all the cut points found in a single walk along the curve
+def growingViews(curve, framesNumber) :
+
+    totalLength = curve.length()
+    lengths = [ totalLength * float(k) / float(framesNumber) for k in range(1, framesNumber + 1) ]
+
+    k = 1
+    for u, length in zip(curve.uAtLengths(lengths), lengths) :
+
+        if k == framesNumber :
+            u = float(curve.segmentsNumber) # the whole path, no rounding
+        # end if
+
+        yield k, CurveView(curve, 0.0, u, False), length
+        k += 1
+
+    # end for
+
+
+# arrows of groups of paths sharing their parameters, groups: [ (parameters, pathsPoints) ]
+# with parameters the prepareStyle arguments and markerSpacing; the style is prepared
+# once per group, yields (style, arrowGeometry, markers, frame), see arrowGeometries
+# styleCache: dict or StyleCache keeping the prepared styles between calls, by their
+# parameters
+def groupedArrowGeometries(groups, drawMarkers=True, deltaT=DELTA_T, outline=False,
+                           framesNumber=0, parts=ARROW_PARTS, styleCache=None) :
+
+    for parameters, pathsPoints in groups :
+
+        styleParameters = dict(parameters)
+        markerSpacing = styleParameters.pop("markerSpacing", 0.0)
+
+        key = tuple(sorted(styleParameters.items()))
+        if styleCache is not None and key in styleCache :
+            style = styleCache[key]
+        else :
+            style = prepareStyle(**styleParameters)
+        # end if
+        if styleCache is not None :
+            styleCache[key] = style
+        # end if
+
+        if not drawMarkers :
+            markerSpacing = 0.0
+        # end if
+
+        for arrowGeometry, markers, frame in arrowGeometries(pathsPoints, style, markerSpacing,
+                                                    deltaT, outline, framesNumber, parts) :
+            yield style, arrowGeometry, markers, frame
+        # end for
+
+    # end for
+
+
+# the arrow of one curve in several styles (contact sheet), (style, arrowGeometry,
+# markers) for each ArrowSpec of styles: the curve and its arc length table are
+# shared, the head cut is made once for the styles with the same head
+def styleVariants(curve, styles, markerSpacing=0.0, deltaT=DELTA_T, outline=False) :
+
+    placements = {}
+
+    for style in styles :
+
+        arrowGeometry = computeArrow(None, style, deltaT, curve, placements=placements)
+
+        if outline :
+            outlineElement, merged = arrowOutline(arrowGeometry, style.strokeWidth)
+            arrowGeometry = arrowGeometry._replace(outline=outlineElement, merged=tuple(merged))
+        # end if
+
+        markers = []
+        if markerSpacing > 0.0 :
+            markers = computeMarkers(None, style, markerSpacing, deltaT, curve)
+        # end if
+
+        yield style, arrowGeometry, markers
+
+    # end for
+
+
+#*************************************************************************************
+
+
+# per-path parameters from a text like "arrow: style=empty tail=bullet wing=30", the
+# short names of OVERRIDE_NAMES or the plug-in argument names; words without "=" are
+# left out (" copy", " #1" added by GIMP to duplicated paths); returns a dict of
+# argument names and values, raises ValueError on unknown names or wrong values
+def parseOverrides(text) :
+
+    overrides = {}
+
+    if "arrow:" in text :
+        text = text.split("arrow:", 1)[1]
+    # end if
+
+    for item in text.replace(",", " ").split() :
+
+        if "=" not in item :
+            continue
+        # end if
+
+        name, value = item.split("=", 1)
+        name = OVERRIDE_NAMES.get(name.lower(), name)
+
+        if name in OVERRIDE_CHOICES :
+            value = OVERRIDE_CHOICE_ALIASES.get(value.lower(), value.lower())
+            if value not in OVERRIDE_CHOICES[name] :
+                raise ValueError("{} must be one of {}".format(name, ", ".join(OVERRIDE_CHOICES[name])))
+            # end if
+
+        elif name in OVERRIDE_RANGES :
+            low, high = OVERRIDE_RANGES[name]
+            try :
+                value = float(value)
+            except ValueError :
+                raise ValueError("{} must be a number".format(name))
+            # end try
+            if not low <= value <= high :
+                raise ValueError("{} must be between {:g} and {:g}".format(name, low, high))
+            # end if
+
+        elif name in OVERRIDE_BOOLEANS :
+            if value.lower() in ("1", "yes", "true", "on") :
+                value = True
+            elif value.lower() in ("0", "no", "false", "off") :
+                value = False
+            else :
+                raise ValueError("{} must be yes or no".format(name))
+            # end if
+
+        else :
+            raise ValueError("unknown parameter '{}'".format(name))
+
+        # end if
+
+        overrides[name] = value
+
+    # end for
+
+    return overrides
+
+
+#*************************************************************************************
+
+
+# groups of curves from flat arrays, for scripts drawing many arrows at once
+#   coordinates : coords of all the arrows one after the other (3n + 1 points each)
+#   offsets     : index in coordinates of the first value of each arrow
+#   styleIndices: index in styleTexts of each arrow's parameters, or empty (all 0)
+#   styleTexts  : parseOverrides texts, applied over baseParameters
+# returns [ (parameters, curves) ] like the groups of drawArrows, raises ValueError
+def groupsFromArrays(coordinates, offsets, styleIndices, styleTexts, baseParameters,
+                     invert=False, deltaT=DELTA_T) :
+
+    if len(offsets) == 0 :
+        raise ValueError("no arrow (offsets is empty)")
+    # end if
+
+    if len(styleIndices) not in (0, len(offsets)) :
+        raise ValueError("styleIndices must be empty or have one index per arrow")
+    # end if
+
+    if styleTexts == [] :
+        styleTexts = [""]
+    # end if
+
+    # one parameters dict per style
+    styles = []
+    for text in styleTexts :
+        parameters = dict(baseParameters)
+        overrides = parseOverrides(text)
+        styleInvert = overrides.pop("invertPath", invert)
+        parameters.update(overrides)
+        styles.append( (parameters, styleInvert) )
+    # end for
+
+    groups = {} # style index: (parameters, curves)
+    ends = list(offsets[1:]) + [len(coordinates)]
+
+    for i, (start, end) in enumerate(zip(offsets, ends)) :
+
+        pointsNumber = (end - start) // 2
+        if start < 0 or end > len(coordinates) or (end - start) % 2 != 0 \
+           or pointsNumber < 4 or (pointsNumber - 1) % 3 != 0 :
+            raise ValueError("arrow {}: needs 3n + 1 points (anchor, control, control, "
+                             "anchor...) between its offsets".format(i))
+        # end if
+
+        styleIndex = styleIndices[i] if len(styleIndices) > 0 else 0
+        if not 0 <= styleIndex < len(styles) :
+            raise ValueError("arrow {}: no style {}".format(i, styleIndex))
+        # end if
+
+        parameters, styleInvert = styles[styleIndex]
+        coords = list(coordinates[start:end])
+        if styleInvert :
+            coords = reversedCoords(coords)
+        # end if
+
+        if styleIndex not in groups :
+            groups[styleIndex] = (parameters, [])
+        # end if
+        groups[styleIndex][1].append(Curve(None, deltaT, coords))
+
+    # end for
+
+    return list(groups.values())
+
+
+
+#*************************************************************************************
+#*************************************************************************************
+
+
+# arrowhead of an ArrowheadSpec, axisLength: the one found by designPath
+def arrowheadElement(head, axisLength, anchorX, anchorY, tipAngle, endAngle) :
+
+    arrowStyle = head.arrowStyle
+    wingLength = head.wingLength
+
+    # construct the arrowhead
+    # -----------------------
+
+    tipX = anchorX + math.cos(endAngle) * axisLength
+    tipY = anchorY + math.sin(endAngle) * axisLength
+
+    point1X = tipX - wingLength * math.cos( endAngle + tipAngle/2 )
+    point1Y = tipY - wingLength * math.sin( endAngle + tipAngle/2 )
+    point2X = tipX - wingLength * math.cos( endAngle - tipAngle/2 )
+    point2Y = tipY - wingLength * math.sin( endAngle - tipAngle/2 )
+
+    if arrowStyle == "filled" or arrowStyle == "empty" :
+
+        arrowHeadPoints = [
+                    [tipX, tipY],
+                    [point1X, point1Y],
+                    [anchorX, anchorY],
+                    [point2X, point2Y]
+                    ]
+        closed = True
+
+    elif arrowStyle == "simple" :
+
+        arrowHeadPoints = [
+                    [point1X, point1Y],
+                    [tipX, tipY],
+                    [point2X, point2Y]
+                    ]
+        closed = False
+
+    # end if
+
+    return {"filled": arrowStyle == "filled", "lines": [(arrowHeadPoints, closed)], "circle": None}
+
+#*************************************************************************************
+
+
+def crossbarElement(oriX, oriY, tailAngle, tailSize) :
+
+    point1X = oriX + math.cos(tailAngle + math.pi * 0.5) * tailSize * 0.5
+    point1Y = oriY + math.sin(tailAngle + math.pi * 0.5) * tailSize * 0.5
+    point2X = oriX + math.cos(tailAngle - math.pi * 0.5) * tailSize * 0.5
+    point2Y = oriY + math.sin(tailAngle - math.pi * 0.5) * tailSize * 0.5
+
+    crossbarPoints = [
+                    [point1X, point1Y],
+                    [point2X, point2Y]
+                    ]
+
+    return {"filled": False, "lines": [(crossbarPoints, False)], "circle": None}
+
+
+#*************************************************************************************
+
+
+def bulletElement(tailStyle, oriX, oriY, tailSize) :
+
+    radius = tailSize / 2.0
+
+    return {"filled": tailStyle == "filled", "lines": [], "circle": (oriX, oriY, radius)}
+
+#*************************************************************************************
+
+
+def featherElement(tailStyle, tailWidth, anchorX, anchorY, tailAngle) :
+
+    tailWidth /= 2.0
+    wingAngle = math.pi / 4.0
+    lengthRatio = 2.0
+    tailLength = lengthRatio * tailWidth
+    wingLength = tailWidth / math.cos(wingAngle)
+
+    point1X = anchorX + wingLength * math.cos(tailAngle + wingAngle)
+    point1Y = anchorY + wingLength * math.sin(tailAngle + wingAngle)
+    point2X = point1X + tailLength * math.cos(tailAngle)
+    point2Y = point1Y + tailLength * math.sin(tailAngle)
+
+    point3X = anchorX + tailLength * math.cos(tailAngle)
+    point3Y = anchorY + tailLength * math.sin(tailAngle)
+
+    point5X = anchorX + wingLength * math.cos(tailAngle - wingAngle)
+    point5Y = anchorY + wingLength * math.sin(tailAngle - wingAngle)
+    point4X = point5X + tailLength * math.cos(tailAngle)
+    point4Y = point5Y + tailLength * math.sin(tailAngle)
+
+    featherPoints = [
+                    [anchorX, anchorY],
+                    [point1X, point1Y],
+                    [point2X, point2Y],
+                    [point3X, point3Y],
+                    [point4X, point4Y],
+                    [point5X, point5Y]
+                    ]
+
+    return {"filled": tailStyle == "filled", "lines": [(featherPoints, True)], "circle": None}
+
+
+#*************************************************************************************
+
+
+def simpleFeatherElement(tailWidth, anchorX, anchorY, tailLength, tailAngle, n) :
+
+    tailWidth /= 2.0
+    wingAngle = math.pi / 4.0
+    wingLength = tailWidth / math.sin(wingAngle)
+
+    lines = []
+
+    i = 0
+
+    while i <= n - 1 :
+
+        wingRatio = float(i) / float(n-1)
+        thisWingLength = wingLength * ( 0.8 - ( 0.75 * math.sqrt(float(n) / 4.0) * wingRatio )**2.0 + 0.2**2.0 ) # 0.775
+
+        point1X = anchorX + thisWingLength * math.cos(tailAngle + wingAngle)
+        point1Y = anchorY + thisWingLength * math.sin(tailAngle + wingAngle)
+        point2X = anchorX + thisWingLength * math.cos(tailAngle - wingAngle)
+        point2Y = anchorY + thisWingLength * math.sin(tailAngle - wingAngle)
+
+        featherPoints = [
+                        [point1X, point1Y],
+                        [anchorX, anchorY],
+                        [point2X, point2Y]
+                        ]
+
+        lines.append((featherPoints, False))
+
+        anchorX += math.cos(tailAngle) * tailLength / (float(n)-1)
+        anchorY += math.sin(tailAngle) * tailLength / (float(n)-1)
+
+
+        i += 1
+        # wingLength -= reduction * float(i)
+
+    # end while
+
+    return {"filled": False, "lines": lines, "circle": None}
+
+
+#*************************************************************************************
+
+
+# distance between two points
+def distance(p1, p2) :
+
+    dist = math.hypot(p2[1] - p1[1], p2[0] - p1[0])
+
+    return dist
+
+
+#*************************************************************************************
+
+
+# convert coords list to points list
+def listToPoints(flatPointsList) :
+
+    last = len(flatPointsList) / 2 - 1
+    i = 1
+    pointsList = []
+
+    while i < last :
+
+        thisPoint = [flatPointsList[2*i], flatPointsList[2*i+1]]
+        pointsList.append(thisPoint)
+        i += 1
+
+    # end while
+
+    return pointsList
+
+#*************************************************************************************
+
+
+# flatten points list to list of coordinates for GIMP path format
+def flattenPoints(pointsList) :
+
+    flatList = []
+
+    for thisPoint in pointsList :
+
+        flatList += thisPoint
+
+    # end for
+
+    return flatList
+
+
+#*************************************************************************************
+
+
+# coords to points list
+def coordsToPoints(coords) :
+
+    return [ [coords[i], coords[i+1]] for i in range(0, len(coords) - 1, 2) ]
+
+
+# coords of the points in reverse order, by slices (no loop over the points)
+def reversedCoords(coords) :
+
+    newCoords = coords[::-1]  # y, x, y, x...
+    newCoords[0::2], newCoords[1::2] = newCoords[1::2], newCoords[0::2]
+
+    return newCoords
+
+
+#*************************************************************************************
+
+
+# shaft coords to GIMP flat list, the end anchors get a control point on themselves
+def shaftToFlatList(coords) :
+
+    return coords[0:2] + coords + coords[-2:]
+
+
+#*************************************************************************************
+
+
+# vertices joined by straight lines to GIMP flat list (control points on the anchors)
+def linesToFlatList(vertices) :
+
+    flatList = []
+
+    for x, y in vertices :
+
+        flatList += [x, y, x, y, x, y]
+
+    # end for
+
+    return flatList
+
+
+#*************************************************************************************
+
+
+# box [x1, y1, x2, y2] holding everything drawn for an arrow: the control points hold
+# the shaft curve, the margin covers the stroke up to the longest miter of the corners
+# drawn (miters False: half the stroke width, miter spikes left out); None when
+# nothing is drawn
+def arrowBounds(arrowGeometry, markers, strokeWidth, miters=True) :
+
+    xs = []
+    ys = []
+    factor = 1.0 # longest miter, in half stroke widths
+    miterLimit = MITER_LIMIT if miters else 1.0 # limit 1.0: every corner beveled
+
+    if arrowGeometry.shaft is not None :
+        x1, y1, x2, y2 = arrowGeometry.shaftBox
+        xs += [x1, x2]
+        ys += [y1, y2]
+        if miters :
+            factor = arrowGeometry.shaftMiter
+        # end if
+    # end if
+
+    elements = [arrowGeometry.head, arrowGeometry.tail, arrowGeometry.outline]
+
+    for element in elements + list(markers) :
+
+        if element is None :
+            continue
+
+        for vertices, closed in element["lines"] :
+            xs += [ x for x, y in vertices ]
+            ys += [ y for x, y in vertices ]
+            factor = max(factor, miterFactor(vertices, closed, miterLimit))
+        # end for
+
+        if element["circle"] is not None :
+            oriX, oriY, radius = element["circle"]
+            xs += [oriX - radius, oriX + radius]
+            ys += [oriY - radius, oriY + radius]
+        # end if
+
+    # end for
+
+    if xs == [] :
+        return None
+    # end if
+
+    margin = 0.5 * strokeWidth * factor
+
+    return [min(xs) - margin, min(ys) - margin, max(xs) + margin, max(ys) + margin]
+
+
+# longest miter at the corners of a line, in half stroke widths: 1.0 without corners;
+# corners over the miter limit are beveled (GIMP and cairo), they count as 1.0
+def miterFactor(vertices, closed, miterLimit=MITER_LIMIT) :
+
+    points = [ vertex for i, vertex in enumerate(vertices)
+               if i == 0 or list(vertex) != list(vertices[i-1]) ]
+    if closed and len(points) > 1 and list(points[0]) == list(points[-1]) :
+        points.pop()
+    # end if
+
+    n = len(points)
+    corners = range(n) if closed and n > 2 else range(1, n - 1)
+    factor = 1.0
+
+    for i in corners :
+
+        bx, by = points[i]
+        ux, uy = points[i-1][0] - bx, points[i-1][1] - by
+        vx, vy = points[(i + 1) % n][0] - bx, points[(i + 1) % n][1] - by
+
+        cosine = (ux * vx + uy * vy) / ( math.hypot(ux, uy) * math.hypot(vx, vy) )
+        sinHalf = math.sqrt( max(0.0, (1.0 - cosine) / 2.0) ) # half the corner angle
+
+        if sinHalf > 0.0 and 1.0 / sinHalf <= miterLimit :
+            factor = max(factor, 1.0 / sinHalf)
+        # end if
+
+    # end for
+
+    return factor
+
+
+# control points box and longest miter of a shaft cut from the view of a curve: the
+# corners at the path anchors kept by the view come from the curve, read once for all
+# its arrows (see Curve.anchorCosines), the ends (patch, cut segment and the next one,
+# SHAFT_WINDOW coords) from the shaft
+def shaftExtent(shaft, view) :
+
+    box = [ min(shaft[0::2]), min(shaft[1::2]), max(shaft[0::2]), max(shaft[1::2]) ]
+
+    # path anchors strictly inside the view, anchor k at index k - 1
+    cosines = view.curve.anchorCosines()
+    first, last = int(view.uStart), int(math.ceil(view.uEnd)) - 1
+    maxCosine = max( cosines[first:last] if last > first else [], default=-1.0 )
+    factor = 1.0 / math.sqrt( (1.0 - maxCosine) / 2.0 )
+
+    ends = [shaft]
+    if len(shaft) > 2 * SHAFT_WINDOW :
+        ends = [ shaft[:SHAFT_WINDOW], shaft[-SHAFT_WINDOW:] ]
+    # end if
+
+    for coords in ends :
+        factor = max(factor, shaftMiterFactor(coords))
+    # end for
+
+    return box, factor
+
+
+# longest miter of a shaft (anchor, control, control, anchor... coords), in half
+# stroke widths
+def shaftMiterFactor(coords, miterLimit=MITER_LIMIT) :
+
+    maxCosine = max( anchorCosines(coords, miterLimit), default=-1.0 )
+
+    return 1.0 / math.sqrt( (1.0 - maxCosine) / 2.0 )
+
+
+# cosine of the corner at each inner anchor of a shaft (anchor, control, control,
+# anchor... coords), -1.0 (flat) where it is beveled (over the miter limit): the joins
+# are at the anchors only, the curves themselves are stroked smoothly; the anchors are
+# read by slices, a control point on its anchor sends back to the points around it
+def anchorCosines(coords, miterLimit=MITER_LIMIT) :
+
+    end = len(coords) - 2 # last anchor
+
+    # at the inner anchors: the point before (second control) and after (first control)
+    corners = zip(coords[6:end:6], coords[7:end:6], coords[4:end - 2:6], coords[5:end - 2:6],
+                  coords[8:end + 2:6], coords[9:end + 2:6])
+
+    cosines = []
+    lastCosine = 1.0 - 2.0 / (miterLimit * miterLimit) # sharper: beveled
+
+    for k, (x, y, inX, inY, outX, outY) in enumerate(corners) :
+
+        ux, uy, vx, vy = inX - x, inY - y, outX - x, outY - y
+        lengths = (ux * ux + uy * uy) * (vx * vx + vy * vy)
+
+        if lengths == 0.0 : # control point on the anchor
+            i = 6 * (k + 1)
+            anchor = coords[i:i+2]
+            before = next( (coords[j:j+2] for j in (i - 2, i - 4, i - 6) if coords[j:j+2] != anchor), None )
+            after = next( (coords[j:j+2] for j in (i + 2, i + 4, i + 6) if coords[j:j+2] != anchor), None )
+            if before is None or after is None :
+                cosines.append(-1.0)
+                continue
+            # end if
+            ux, uy, vx, vy = before[0] - x, before[1] - y, after[0] - x, after[1] - y
+            lengths = (ux * ux + uy * uy) * (vx * vx + vy * vy)
+        # end if
+
+        cosine = (ux * vx + uy * vy) / math.sqrt(lengths)
+        cosines.append(cosine if cosine <= lastCosine else -1.0)
+
+    # end for
+
+    return cosines
+
+
+# True when the boxes [x1, y1, x2, y2] share some area
+def boxesOverlap(box1, box2) :
+
+    if box1 is None or box2 is None :
+        return False
+    # end if
+
+    return box1[0] < box2[2] and box2[0] < box1[2] and box1[1] < box2[3] and box2[1] < box1[3]
+
+
+# common part of the boxes, None when they don't overlap
+def boxIntersection(box1, box2) :
+
+    if not boxesOverlap(box1, box2) :
+        return None
+    # end if
+
+    return [ max(box1[0], box2[0]), max(box1[1], box2[1]),
+             min(box1[2], box2[2]), min(box1[3], box2[3]) ]
+
+
+# pixels of a box [x1, y1, x2, y2] once rounded out, 0 for None
+def boxArea(box) :
+
+    if box is None :
+        return 0
+    # end if
+
+    return ( int(math.ceil(box[2])) - int(math.floor(box[0])) ) \
+           * ( int(math.ceil(box[3])) - int(math.floor(box[1])) )
+
+
+# box holding both boxes, either can be None
+def boxUnion(box1, box2) :
+
+    if box1 is None or box2 is None :
+        return box2 if box1 is None else box1
+    # end if
+
+    return [ min(box1[0], box2[0]), min(box1[1], box2[1]),
+             max(box1[2], box2[2]), max(box1[3], box2[3]) ]
+
+
+#*************************************************************************************
+
+
+# copy of an element moved by dx, dy (None stays None)
+def translatedElement(element, dx, dy) :
+
+    if element is None :
+        return None
+    # end if
+
+    circle = element["circle"]
+    if circle is not None :
+        circle = (circle[0] + dx, circle[1] + dy, circle[2])
+    # end if
+
+    return {"filled": element["filled"],
+            "lines": [ ([ [x + dx, y + dy] for x, y in vertices ], closed)
+                       for vertices, closed in element["lines"] ],
+            "circle": circle}
+
+
+# copy of an ArrowGeometry moved by dx, dy
+def translatedArrow(arrowGeometry, dx, dy) :
+
+    shaft = arrowGeometry.shaft
+    if shaft is not None :
+        shaft = [ value + dx if i % 2 == 0 else value + dy for i, value in enumerate(shaft) ]
+    # end if
+
+    shaftBox = arrowGeometry.shaftBox
+    if shaftBox is not None :
+        shaftBox = [shaftBox[0] + dx, shaftBox[1] + dy, shaftBox[2] + dx, shaftBox[3] + dy]
+    # end if
+
+    return arrowGeometry._replace(shaft=shaft, shaftBox=shaftBox,
+                                 head=translatedElement(arrowGeometry.head, dx, dy),
+                                 tail=translatedElement(arrowGeometry.tail, dx, dy),
+                                 outline=translatedElement(arrowGeometry.outline, dx, dy))
+
+
+#*************************************************************************************
+
+
+def shrinkArrowhead(style, strokeWidth, tipAngle, arrowLength, axisLength, wingLength) :
+
+    alpha = tipAngle / 2.0
+
+    if style == "simple" :
+
+        tipProtruding = strokeWidth * 0.5 / math.sin(alpha)
+        wingProtruding = 0.0
+        ratio = ratio = max(arrowLength - tipProtruding, 2.0) / arrowLength
+
+    elif style == "empty" :
+
+        tipProtruding = strokeWidth * 0.5 / math.sin(alpha)
+
+        # print("alpha", alpha, "axis", axisLength, "wing", wingLength) # debug
+
+        # wing / back protruding
+        if arrowLength == axisLength : # harpoon factor of 1.0
+            wingProtruding = 0.5 * strokeWidth
+
+        if arrowLength > axisLength :
+            gamma = math.atan(math.sin(alpha) / ( math.cos(alpha) - axisLength/wingLength ) )
+            wingProtruding = ( 0.5 * strokeWidth * math.cos( 0.5 * (gamma + alpha) )
+                                                 / math.sin( 0.5 * (gamma - alpha) ) )
+            ratio = max(arrowLength - tipProtruding - wingProtruding, 2.0) / arrowLength
+
+        else  : # arrowLength < axisLength
+            a = axisLength - arrowLength
+            b = wingLength * math.sin(alpha)
+            wingProtruding = strokeWidth * 0.5 * math.sqrt( pow(a / b, 2.0) + 1.0 )
+            ratio = max(axisLength - tipProtruding - wingProtruding, 2.0) / axisLength
+
+        # end if
+
+
+    else :
+        tipProtruding = 0.0
+        wingProtruding = 0.0
+        ratio = 1.0
+    # end if
+
+    # print("tip prot.", tipProtruding, "wing prot.", wingProtruding, "length", arrowLength * ratio) # debug
+
+    return tipProtruding, arrowLength * ratio, axisLength * ratio, wingLength * ratio
+
+#*************************************************************************************
+
+
+# cut the view for an arrowhead (ArrowheadSpec), returns a HeadPlacement
+def designPath(head, strokeWidth, view, harpoonFactor) :
+
+    arrowStyle = head.arrowStyle
+
+    # get the new spline cut at the right place
+    # -----------------------------------------
+
+    view, axisLength, cutDistance = shortenView(view, head.axisLength, head.cutDistance,
+                                                head.tipProtruding)
+
+    cutX, cutY = view.endPoint()
+
+    # determine the path angle at cut point
+    # ----------------------------------------
+
+    endAngle = view.endAngle()
+
+    # anchor point of the arrowhead
+
+    anchorX = cutX + math.cos(endAngle) * cutDistance
+    anchorY = cutY + math.sin(endAngle) * cutDistance
+
+    # add a patch at anchor point to remove visible spacing between head and body
+    # ----------------------------------------------------------------------------
+    # (todo: define function for that...)
+
+    if arrowStyle == "simple" :
+
+        patchLength = head.arrowLength / 2.0 - strokeWidth / 2.0 # changed from ... - strokeWidth
+        # todo: limit patch length
+
+    elif arrowStyle == "filled" :
+
+        patchLength = harpoonFactor**2 * strokeWidth
+
+    else :
+
+        patchLength = 0.0
+
+    # end if
+
+    patchLength += cutDistance
+
+    patchPoints = []
+
+    if patchLength > 0.0 :
+
+        patchPoints = buildPatch(patchPoints, patchLength, cutX, cutY, endAngle)
+
+    # end if
+
+    return HeadPlacement(view, axisLength, anchorX, anchorY, endAngle, patchPoints)
+
+
+#*************************************************************************************
+
+
+def buildPatch(pointsList, patchLength, cutX, cutY, endAngle) :
+
+    patchEndX   = cutX + math.cos(endAngle) * patchLength
+    patchEndY   = cutY + math.sin(endAngle) * patchLength
+
+    patchPathPoints = [
+                [cutX, cutY],
+                [patchEndX, patchEndY],
+                [patchEndX, patchEndY]
+                ]
+
+    pointsList.extend(patchPathPoints)
+
+    return pointsList
+
+
+#*************************************************************************************
+
+
+# cut the end of the view so that the arrowhead fits, shrink the arrowhead if the
+# curve is too short
+def shortenView(view, axisLength, cutDistance, tipProtruding) :
+
+    targetLength = axisLength + cutDistance + tipProtruding
+
+    view, cumulDist = view.cutEnd(targetLength)
+
+    if cumulDist < targetLength :  # reached the start point
+
+        if cutDistance > 0.0 and cumulDist <= cutDistance :
+            cutDistance -= targetLength - cumulDist  # then we shrink cutLength instead
+        else :
+            axisLength -= targetLength - cumulDist + cutDistance
+            cutDistance = 0.0
+
+    # end if
+
+    return view, axisLength, cutDistance
+
+
+#*************************************************************************************
+
+
+# same as shortenView, on a points list
+def shortenSpline(pointsList, axisLength, cutDistance, tipProtruding, deltaT) :
+
+    view, axisLength, cutDistance = shortenView(Curve(pointsList, deltaT).view(), axisLength,
+                                                cutDistance, tipProtruding)
+
+    return coordsToPoints(view.coords()), axisLength, cutDistance
+
+
+
+#*************************************************************************************
+
+
+# https://stackoverflow.com/questions/8369488/splitting-a-bezier-curve/8405756#8405756
+
+def sliceBezier(points, t): # 4 point sous forme [ [x1, y1], [x2, y2],... ]
+
+    p1, p2, p3, p4 = points
+    x1, y1 = p1
+    x2, y2 = p2
+    x3, y3 = p3
+    x4, y4 = p4
+
+    x12 = (x2-x1)*t+x1
+    y12 = (y2-y1)*t+y1
+
+    x23 = (x3-x2)*t+x2
+    y23 = (y3-y2)*t+y2
+
+    x34 = (x4-x3)*t+x3
+    y34 = (y4-y3)*t+y3
+
+    x123 = (x23-x12)*t+x12
+    y123 = (y23-y12)*t+y12
+
+    x234 = (x34-x23)*t+x23
+    y234 = (y34-y23)*t+y23
+
+    x1234 = (x234-x123)*t+x123
+    y1234 = (y234-y123)*t+y123
+
+    return [ [x1, y1], [x12, y12], [x123, y123], [x1234, y1234], [x234, y234], [x34, y34], [x4, y4] ]
+
+
+#*************************************************************************************
+
+
+# Outline
+# -------
+# The shaft stroke as a polygon (both sides offset by half the stroke width, miter
+# joins, butt ends), merged with the filled head and tail into one closed outline that
+# can be filled at once, without strokes overlapping. GIMP fills paths even-odd, so the
+# outline must not cross itself: each side stops where it enters the element, and the
+# outline goes around the outer part of the element.
+
+
+# polyline of the shaft coords, each segment split so that the polyline stays within
+# tolerance of the curve (Wang's formula)
+def flattenShaft(shaftCoords, tolerance=OUTLINE_TOLERANCE) :
+
+    c = shaftCoords
+    polyline = [ [c[0], c[1]] ]
+
+    i = 0
+    while i + 7 < len(c) :
+
+        x0, y0, x1, y1, x2, y2, x3, y3 = c[i:i+8]
+
+        ddx = max( abs(x0 - 2.0 * x1 + x2), abs(x1 - 2.0 * x2 + x3) )
+        ddy = max( abs(y0 - 2.0 * y1 + y2), abs(y1 - 2.0 * y2 + y3) )
+        steps = max( 1, int( math.ceil( math.sqrt( 0.75 * math.hypot(ddx, ddy) / tolerance ) ) ) )
+
+        for k in range(1, steps + 1) :
+            t = float(k) / float(steps)
+            u = 1.0 - t
+            a, b, d, e = u*u*u, 3.0*u*u*t, 3.0*u*t*t, t*t*t
+            polyline.append([ a*x0 + b*x1 + d*x2 + e*x3, a*y0 + b*y1 + d*y2 + e*y3 ])
+        # end for
+
+        i += 6
+
+    # end while
+
+    # drop repeated points, they have no direction
+    cleaned = [polyline[0]]
+    for thisPoint in polyline[1:] :
+        if abs(thisPoint[0] - cleaned[-1][0]) + abs(thisPoint[1] - cleaned[-1][1]) > 1e-9 :
+            cleaned.append(thisPoint)
+    # end for
+
+    return cleaned
+
+
+# both sides of the polyline at halfWidth, miter joins (bevel over the miter limit)
+def offsetPolyline(polyline, halfWidth) :
+
+    normals = []
+    for i in range(len(polyline) - 1) :
+        dx = polyline[i+1][0] - polyline[i][0]
+        dy = polyline[i+1][1] - polyline[i][1]
+        length = math.hypot(dx, dy)
+        normals.append( (-dy / length, dx / length) )
+    # end for
+
+    left = []
+    right = []
+
+    for i, (x, y) in enumerate(polyline) :
+
+        if i == 0 or i == len(polyline) - 1 :
+            nx, ny = normals[min(i, len(normals) - 1)]
+            left.append([x + nx * halfWidth, y + ny * halfWidth])
+            right.append([x - nx * halfWidth, y - ny * halfWidth])
+            continue
+        # end if
+
+        (ax, ay), (bx, by) = normals[i-1], normals[i]
+        mx, my = ax + bx, ay + by
+        mLength = math.hypot(mx, my)
+        cosine = (mx * ax + my * ay) / mLength if mLength > 1e-12 else 0.0
+
+        if cosine > 1.0 / MITER_LIMIT :
+            scale = halfWidth / cosine / mLength
+            left.append([x + mx * scale, y + my * scale])
+            right.append([x - mx * scale, y - my * scale])
+        else : # bevel
+            left += [ [x + ax * halfWidth, y + ay * halfWidth], [x + bx * halfWidth, y + by * halfWidth] ]
+            right += [ [x - ax * halfWidth, y - ay * halfWidth], [x - bx * halfWidth, y - by * halfWidth] ]
+        # end if
+
+    # end for
+
+    return left, right
+
+
+# polygon of a filled element that can be merged (a single closed line or a circle)
+def elementPolygon(element) :
+
+    if element is None or not element["filled"] :
+        return None
+    # end if
+
+    if element["circle"] is not None and element["lines"] == [] :
+        return circlePolygon(*element["circle"])
+    # end if
+
+    if element["circle"] is None and len(element["lines"]) == 1 and element["lines"][0][1] :
+        return element["lines"][0][0]
+    # end if
+
+    return None
+
+
+# circle as a polygon, chords of about 2 px
+def circlePolygon(oriX, oriY, radius) :
+
+    n = max( 24, int( math.pi * radius ) )
+
+    return [ [oriX + radius * math.cos(2.0 * math.pi * k / n),
+              oriY + radius * math.sin(2.0 * math.pi * k / n)] for k in range(n) ]
+
+
+# intersection of segments p1-p2 and q1-q2: (parameter on p, parameter on q) or None
+def segmentsCrossing(p1, p2, q1, q2) :
+
+    rx, ry = p2[0] - p1[0], p2[1] - p1[1]
+    sx, sy = q2[0] - q1[0], q2[1] - q1[1]
+
+    denominator = rx * sy - ry * sx
+    if abs(denominator) < 1e-12 :
+        return None
+    # end if
+
+    qpx, qpy = q1[0] - p1[0], q1[1] - p1[1]
+    t = (qpx * sy - qpy * sx) / denominator
+    u = (qpx * ry - qpy * rx) / denominator
+
+    if 0.0 <= t <= 1.0 and 0.0 <= u <= 1.0 :
+        return t, u
+    # end if
+
+    return None
+
+
+# cut a side where it enters the polygon, walking back from the end of the side
+# returns (side up to the crossing, (edge index, edge parameter, crossing)) or None
+def clipSide(side, polygon) :
+
+    xs = [ p[0] for p in polygon ]
+    ys = [ p[1] for p in polygon ]
+    minX, maxX, minY, maxY = min(xs), max(xs), min(ys), max(ys)
+    n = len(polygon)
+
+    entry = None
+
+    for i in range(len(side) - 2, -1, -1) :
+
+        p1, p2 = side[i], side[i+1]
+
+        if ( max(p1[0], p2[0]) < minX or min(p1[0], p2[0]) > maxX
+             or max(p1[1], p2[1]) < minY or min(p1[1], p2[1]) > maxY ) :
+            if entry is not None :
+                break # left the element after entering it
+            continue
+        # end if
+
+        # the crossing closest to the start of this segment
+        best = None
+        for k in range(n) :
+            crossing = segmentsCrossing(p1, p2, polygon[k], polygon[(k+1) % n])
+            if crossing is not None and ( best is None or crossing[0] < best[0] ) :
+                best = (crossing[0], k, crossing[1])
+        # end for
+
+        if best is not None :
+            t, k, u = best
+            point = [ p1[0] + (p2[0] - p1[0]) * t, p1[1] + (p2[1] - p1[1]) * t ]
+            entry = (i, (k, u, point))
+        # end if
+
+    # end for
+
+    if entry is None :
+        return None
+    # end if
+
+    i, crossing = entry
+
+    return side[:i+1] + [crossing[2]], crossing
+
+
+# polygon vertices between the crossings of both sides, around the outer part of the
+# element (the part not inside the shaft)
+def outerArc(polygon, crossing1, crossing2) :
+
+    n = len(polygon)
+    edge1, u1, point1 = crossing1
+    edge2, u2, point2 = crossing2
+
+    forward = []
+    k = (edge1 + 1) % n
+    if not ( edge1 == edge2 and u2 >= u1 ) :
+        while True :
+            forward.append(polygon[k])
+            if k == edge2 :
+                break
+            k = (k + 1) % n
+        # end while
+    # end if
+
+    backward = []
+    k = edge1
+    if not ( edge1 == edge2 and u2 <= u1 ) :
+        while True :
+            backward.append(polygon[k])
+            if k == (edge2 + 1) % n :
+                break
+            k = (k - 1) % n
+        # end while
+    # end if
+
+    if forward == [] :
+        return backward
+    if backward == [] :
+        return forward
+
+    # the inner arc holds the vertex where the shaft enters (closest to the crossings)
+    midX = (point1[0] + point2[0]) / 2.0
+    midY = (point1[1] + point2[1]) / 2.0
+    junction = min( polygon, key=lambda p : (p[0] - midX)**2 + (p[1] - midY)**2 )
+
+    if any( p is junction for p in forward ) :
+        return backward
+
+    return forward
+
+
+# one closed outline for the shaft and the filled head and tail of an arrow
+# returns (element, names of the merged elements) or (None, []) without stroke
+def arrowOutline(arrowGeometry, strokeWidth, tolerance=OUTLINE_TOLERANCE) :
+
+    if strokeWidth <= 0.0 :
+        return None, []
+    # end if
+
+    polyline = flattenShaft(arrowGeometry.shaft, tolerance)
+    if len(polyline) < 2 :
+        return None, []
+    # end if
+
+    left, right = offsetPolyline(polyline, strokeWidth / 2.0)
+    headArc = []
+    tailArc = []
+    merged = []
+
+    # head end
+    polygon = elementPolygon(arrowGeometry.head)
+    if polygon is not None :
+        clippedLeft = clipSide(left, polygon)
+        clippedRight = clipSide(right, polygon)
+        if clippedLeft is not None and clippedRight is not None :
+            left, leftCrossing = clippedLeft
+            right, rightCrossing = clippedRight
+            headArc = outerArc(polygon, leftCrossing, rightCrossing)
+            merged.append("head")
+        # end if
+    # end if
+
+    # tail end, the sides seen from the start
+    polygon = elementPolygon(arrowGeometry.tail)
+    if polygon is not None :
+        clippedLeft = clipSide(left[::-1], polygon)
+        clippedRight = clipSide(right[::-1], polygon)
+        if clippedLeft is not None and clippedRight is not None :
+            left, leftCrossing = clippedLeft[0][::-1], clippedLeft[1]
+            right, rightCrossing = clippedRight[0][::-1], clippedRight[1]
+            tailArc = outerArc(polygon, rightCrossing, leftCrossing)
+            merged.append("tail")
+        # end if
+    # end if
+
+    outline = left + headArc + right[::-1] + tailArc
+
+    return {"filled": True, "lines": [(outline, True)], "circle": None}, merged
+
+
+#*************************************************************************************
+
+
+# Cubic Bezier spline of a points list. The coefficients and the arc length table of
+# each segment are computed the first time they are needed, so that the head and tail
+# passes only pay for the segments they actually reach. The points are kept as coords
+# and only read segment by segment: a path of any length costs the same, except for
+# the slices copying its untouched middle.
+class Curve :
+
+    def __init__(self, pointsList, deltaT=DELTA_T, coords=None) :
+
+        if coords is None :
+            coords = flattenPoints(pointsList)
+        # end if
+
+        self.pointsCoords = coords
+        self.segmentsNumber = (len(coords) // 2 - 1) // 3
+        self.steps = max( 1, int( round(1.0 / deltaT) ) ) # samples per segment
+
+        self.coeffs = {}  # segmentID: (ax, bx, cx, dx, ay, by, cy, dy)
+        self.tables = {}  # segmentID: cumulated lengths at t = i / steps
+        self.lines = {}   # segmentID: (kind, chord length, chord angle), kind None for curves
+        self.cosines = None # corners at the anchors, see anchorCosines
+
+    # corners at the inner anchors (see anchorCosines), read once for all the arrows
+    # cut from this curve
+    def anchorCosines(self) :
+
+        if self.cosines is None :
+            self.cosines = anchorCosines(self.pointsCoords)
+        # end if
+
+        return self.cosines
+
+    # curve of a GIMP flat list (Gimp.Path.stroke_get_points), without converting it
+    @classmethod
+    def fromFlatList(cls, flatPointsList, deltaT=DELTA_T, invert=False) :
+
+        coords = flatPointsList[2:-2] # drop the outer control points
+        if invert :
+            coords = reversedCoords(coords)
+        # end if
+
+        return cls(None, deltaT, coords)
+
+    def view(self) :
+
+        return CurveView(self, 0.0, float(self.segmentsNumber), False)
+
+    # segments
+    # --------
+
+    def segmentPoints(self, segmentID) :
+
+        c = self.pointsCoords
+        i = 6 * segmentID
+
+        return [ [c[i], c[i+1]], [c[i+2], c[i+3]], [c[i+4], c[i+5]], [c[i+6], c[i+7]] ]
+
+    # segment of u, looking backwards (u on an anchor: segment ending there)
+    def segmentBefore(self, u) :
+
+        return min( max( math.ceil(u) - 1, 0 ), self.segmentsNumber - 1 )
+
+    # segment of u, looking forwards (u on an anchor: segment starting there)
+    def segmentAfter(self, u) :
+
+        return min( max( math.trunc(u), 0 ), self.segmentsNumber - 1 )
+
+    # straight segments, computed in closed form instead of sampled:
+    # "ends": control points on the anchors (GIMP polylines), length = chord * (3t² - 2t³)
+    # "uniform": control points at 1/3 and 2/3 of the chord, length = chord * t
+    def lineKind(self, segmentID) :
+
+        if segmentID not in self.lines :
+
+            (x0, y0), (x1, y1), (x2, y2), (x3, y3) = self.segmentPoints(segmentID)
+            chordX, chordY = x3 - x0, y3 - y0
+            chord = math.hypot(chordX, chordY)
+            epsilon = 1e-9 * ( 1.0 + chord )
+
+            kind = None
+            if ( abs(x1 - x0) + abs(y1 - y0) < epsilon and abs(x2 - x3) + abs(y2 - y3) < epsilon ) :
+                kind = "ends"
+            elif ( abs(x1 - x0 - chordX / 3.0) + abs(y1 - y0 - chordY / 3.0) < epsilon
+                   and abs(x2 - x0 - 2.0 * chordX / 3.0) + abs(y2 - y0 - 2.0 * chordY / 3.0) < epsilon ) :
+                kind = "uniform"
+            # end if
+
+            self.lines[segmentID] = (kind, chord, math.atan2(chordY, chordX))
+
+        # end if
+
+        return self.lines[segmentID]
+
+    def coefficients(self, segmentID) :
+
+        if segmentID not in self.coeffs :
+
+            (x0, y0), (x1, y1), (x2, y2), (x3, y3) = self.segmentPoints(segmentID)
+
+            self.coeffs[segmentID] = (
+                x3 - 3.0 * x2 + 3.0 * x1 - x0, 3.0 * (x2 - 2.0 * x1 + x0), 3.0 * (x1 - x0), x0,
+                y3 - 3.0 * y2 + 3.0 * y1 - y0, 3.0 * (y2 - 2.0 * y1 + y0), 3.0 * (y1 - y0), y0 )
+
+        # end if
+
+        return self.coeffs[segmentID]
+
+    def segmentPoint(self, segmentID, t) :
+
+        ax, bx, cx, dx, ay, by, cy, dy = self.coefficients(segmentID)
+
+        return [ ((ax * t + bx) * t + cx) * t + dx, ((ay * t + by) * t + cy) * t + dy ]
+
+    # direction of the curve at t, towards increasing t
+    # where the derivative vanishes (control point on the anchor), the next derivatives
+    # give the direction, fromLeft tells on which side of t the curve is looked at
+    def segmentTangent(self, segmentID, t, fromLeft=True) :
+
+        kind, chord, angle = self.lineKind(segmentID)
+        if kind is not None and chord > 0.0 :
+            return math.cos(angle), math.sin(angle)
+        # end if
+
+        ax, bx, cx, dx, ay, by, cy, dy = self.coefficients(segmentID)
+        side = -1.0 if fromLeft else 1.0
+
+        candidates = [
+            ( (3.0 * ax * t + 2.0 * bx) * t + cx, (3.0 * ay * t + 2.0 * by) * t + cy ),
+            ( side * (6.0 * ax * t + 2.0 * bx),   side * (6.0 * ay * t + 2.0 * by) ),
+            ( ax, ay ),
+        ]
+
+        for tanX, tanY in candidates :
+            if abs(tanX) + abs(tanY) > 1e-9 :
+                return tanX, tanY
+        # end for
+
+        return 1.0, 0.0 # all points on the same spot
+
+    # arc length
+    # ----------
+
+    def segmentTable(self, segmentID) :
+
+        if segmentID not in self.tables :
+
+            table = [0.0]
+            lastP = self.segmentPoint(segmentID, 0.0)
+            cumulDist = 0.0
+
+            for i in range(1, self.steps + 1) :
+                currentP = self.segmentPoint(segmentID, float(i) / float(self.steps))
+                cumulDist += distance(lastP, currentP)
+                table.append(cumulDist)
+                lastP = currentP
+            # end for
+
+            self.tables[segmentID] = table
+
+        # end if
+
+        return self.tables[segmentID]
+
+    def segmentLength(self, segmentID) :
+
+        kind, chord, angle = self.lineKind(segmentID)
+        if kind is not None :
+            return chord
+        # end if
+
+        return self.segmentTable(segmentID)[-1]
+
+    # arc length from the start of the segment to t
+    def lengthInSegment(self, segmentID, t) :
+
+        kind, chord, angle = self.lineKind(segmentID)
+        if kind == "ends" :
+            return chord * t * t * (3.0 - 2.0 * t)
+        elif kind == "uniform" :
+            return chord * t
+        # end if
+
+        table = self.segmentTable(segmentID)
+
+        position = t * self.steps
+        i = min( int(position), self.steps - 1 )
+
+        return table[i] + ( table[i+1] - table[i] ) * ( position - i )
+
+    # t at a given arc length from the start of the segment
+    def tInSegment(self, segmentID, length) :
+
+        kind, chord, angle = self.lineKind(segmentID)
+        if kind is not None :
+            if chord <= 0.0 :
+                return 0.0
+            ratio = min( max( length / chord, 0.0 ), 1.0 )
+            if kind == "uniform" :
+                return ratio
+            return 0.5 - math.sin( math.asin(1.0 - 2.0 * ratio) / 3.0 ) # inverse of 3t² - 2t³
+        # end if
+
+        table = self.segmentTable(segmentID)
+
+        i = bisect.bisect_left(table, length)
+
+        if i <= 0 :
+            return 0.0
+        if i > self.steps :
+            return 1.0
+
+        step = table[i] - table[i-1]
+        ratio = (length - table[i-1]) / step if step > 0.0 else 0.0
+
+        return ( float(i - 1) + ratio ) / float(self.steps)
+
+    def length(self) :
+
+        return sum( self.segmentLength(i) for i in range(self.segmentsNumber) )
+
+    # u of each length (from the start, in increasing order), in a single walk
+    def uAtLengths(self, lengths) :
+
+        segmentID = 0
+        segmentStart = 0.0
+
+        for length in lengths :
+
+            while ( segmentID < self.segmentsNumber - 1
+                    and segmentStart + self.segmentLength(segmentID) < length ) :
+                segmentStart += self.segmentLength(segmentID)
+                segmentID += 1
+            # end while
+
+            yield segmentID + self.tInSegment(segmentID, length - segmentStart)
+
+        # end for
+
+    # points
+    # ------
+
+    def point(self, u) :
+
+        segmentID = self.segmentAfter(u)
+
+        return self.segmentPoint(segmentID, u - segmentID)
+
+    def tangentAngle(self, u, fromLeft=True) :
+
+        if fromLeft :
+            segmentID = self.segmentBefore(u)
+        else :
+            segmentID = self.segmentAfter(u)
+        # end if
+
+        tanX, tanY = self.segmentTangent(segmentID, u - segmentID, fromLeft)
+
+        return math.atan2(tanY, tanX)
+
+    # coords of the curve between uStart and uEnd, the segments in between copied as a
+    # single slice
+    def coordsBetween(self, uStart, uEnd) :
+
+        if uEnd <= uStart :
+            return self.point(uStart) * 4
+        # end if
+
+        firstID = self.segmentAfter(uStart)
+        lastID = self.segmentBefore(uEnd)
+        tStart = uStart - firstID
+        tEnd = uEnd - lastID
+
+        if firstID == lastID :
+
+            segment = self.segmentPoints(firstID)
+            if tEnd < 1.0 :
+                segment = sliceBezier(segment, tEnd)[0:4]
+            if tStart > 0.0 :
+                segment = sliceBezier(segment, tStart / tEnd)[3:7]
+
+            return flattenPoints(segment)
+
+        # end if
+
+        firstSegment = self.segmentPoints(firstID)
+        if tStart > 0.0 :
+            firstSegment = sliceBezier(firstSegment, tStart)[3:7]
+
+        lastSegment = self.segmentPoints(lastID)
+        if tEnd < 1.0 :
+            lastSegment = sliceBezier(lastSegment, tEnd)[0:4]
+
+        middle = self.pointsCoords[6 * firstID + 8 : 6 * lastID + 2]
+
+        return flattenPoints(firstSegment) + middle + flattenPoints(lastSegment[1:])
+
+
+#*************************************************************************************
+
+
+# part of a curve between two u values, possibly seen backwards, without copying points
+class CurveView :
+
+    __slots__ = ("curve", "uStart", "uEnd", "isReversed")
+
+    def __init__(self, curve, uStart, uEnd, isReversed) :
+
+        self.curve = curve
+        self.uStart = uStart
+        self.uEnd = uEnd
+        self.isReversed = isReversed
+
+    def reversed(self) :
+
+        return CurveView(self.curve, self.uStart, self.uEnd, not self.isReversed)
+
+    def endPoint(self) :
+
+        if self.isReversed :
+            return self.curve.point(self.uStart)
+
+        return self.curve.point(self.uEnd)
+
+    # direction of the view at its end
+    def endAngle(self) :
+
+        if self.isReversed :
+            return self.curve.tangentAngle(self.uStart, fromLeft=False) + math.pi
+
+        return self.curve.tangentAngle(self.uEnd, fromLeft=True)
+
+    def coords(self) :
+
+        coords = self.curve.coordsBetween(self.uStart, self.uEnd)
+
+        if self.isReversed :
+            coords = reversedCoords(coords)
+
+        return coords
+
+    # remove length from the end of the view
+    # returns the new view and the length actually removed (less if the view is shorter)
+    def cutEnd(self, length) :
+
+        curve = self.curve
+        remaining = length
+
+        if self.isReversed : # the end is on the uStart side, walk forwards
+
+            u = self.uStart
+
+            while u < self.uEnd :
+
+                segmentID = curve.segmentAfter(u)
+                tCurrent = u - segmentID
+                tLimit = min( self.uEnd - segmentID, 1.0 )
+
+                lengthCurrent = curve.lengthInSegment(segmentID, tCurrent)
+                available = curve.lengthInSegment(segmentID, tLimit) - lengthCurrent
+
+                if available >= remaining :
+                    t = curve.tInSegment(segmentID, lengthCurrent + remaining)
+                    return CurveView(curve, segmentID + t, self.uEnd, True), length
+
+                remaining -= available
+                u = segmentID + tLimit
+
+            # end while
+
+            return CurveView(curve, self.uEnd, self.uEnd, True), length - remaining
+
+        # end if
+
+        u = self.uEnd
+
+        while u > self.uStart :
+
+            segmentID = curve.segmentBefore(u)
+            tCurrent = u - segmentID
+            tLimit = max( self.uStart - segmentID, 0.0 )
+
+            lengthCurrent = curve.lengthInSegment(segmentID, tCurrent)
+            available = lengthCurrent - curve.lengthInSegment(segmentID, tLimit)
+
+            if available >= remaining :
+                t = curve.tInSegment(segmentID, lengthCurrent - remaining)
+                return CurveView(curve, self.uStart, segmentID + t, False), length
+
+            remaining -= available
+            u = segmentID + tLimit
+
+        # end while
+
+        return CurveView(curve, self.uStart, self.uStart, False), length - remaining
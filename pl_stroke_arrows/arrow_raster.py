@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Antialiased scan conversion of the filled elements, for the raster fill of the plug-in
+#
+# Pure python, no GIMP needed: turns filled heads and tails into a coverage mask limited
+# to their bounding box, and composites the fill color over RGBA float pixels. The
+# plug-in reads the pixels of that box from the drawable buffer and writes the result
+# to its shadow buffer, so the cost follows the size of the arrow, not of the canvas.
+# Boxes over RASTER_MAX_AREA (and shaft outlines) are left to the selection fill, the
+# python loops would be slower than it.
+#
+# Coverage: SUBSAMPLES sub-scanlines per pixel row, exact horizontal coverage of the
+# spans, even-odd rule inside an element (as a path turned into a selection), elements
+# combined as successive fills.
+#
+# License: GPLv3 (see pl_stroke_arrows.py)
+
+import math
+
+from arrow_geometry import circlePolygon, boxUnion, boxArea
+
+
+SUBSAMPLES = 5 # sub-scanlines per pixel row
+
+RASTER_FORMAT = "RGBA float" # babl format of the pixels read and written
+
+RASTER_MAX_AREA = 128 * 128 # pixels of the largest box written as pixels (about 12 ms of
+                            # python loops), larger ones are filled through the selection
+
+
+#*************************************************************************************
+
+
+# closed polygons of a filled element, open lines are closed as in a selection
+def elementPolygons(element) :
+
+    polygons = [ vertices for vertices, closed in element["lines"] if len(vertices) > 2 ]
+
+    if element["circle"] is not None :
+        polygons.append(circlePolygon(*element["circle"]))
+    # end if
+
+    return polygons
+
+
+# box [x1, y1, x2, y2] of the polygons of an element, in image coordinates
+def elementBox(element) :
+
+    xs = [ x for polygon in elementPolygons(element) for x, y in polygon ]
+    ys = [ y for polygon in elementPolygons(element) for x, y in polygon ]
+
+    if xs == [] :
+        return None
+    # end if
+
+    return [min(xs), min(ys), max(xs), max(ys)]
+
+
+# True when a filled element is small enough to be written as pixels
+def fitsRaster(element, maxArea=RASTER_MAX_AREA) :
+
+    return element["filled"] and boxArea(elementBox(element)) <= maxArea
+
+
+# elements in runs whose common box stays within maxArea, one buffer update per run:
+# repeated heads far apart along a path don't make a box of the whole path
+def rasterBatches(elements, maxArea=RASTER_MAX_AREA) :
+
+    batches = []
+    batchBox = None
+
+    for element in elements :
+
+        box = elementBox(element)
+        union = boxUnion(batchBox, box)
+
+        if batches != [] and boxArea(union) <= maxArea :
+            batches[-1].append(element)
+            batchBox = union
+        else :
+            batches.append([element])
+            batchBox = box
+        # end if
+
+    # end for
+
+    return batches
+
+
+# pixel box (x, y, width, height) of the polygons inside a width x height drawable, or
+# None when nothing is inside; offsetX, offsetY: drawable offsets in the image
+def rasterBox(polygons, offsetX, offsetY, width, height) :
+
+    xs = [ x for polygon in polygons for x, y in polygon ]
+    ys = [ y for polygon in polygons for x, y in polygon ]
+
+    if xs == [] :
+        return None
+    # end if
+
+    left = max( 0, int( math.floor( min(xs) - offsetX ) ) )
+    top = max( 0, int( math.floor( min(ys) - offsetY ) ) )
+    right = min( width, int( math.ceil( max(xs) - offsetX ) ) )
+    bottom = min( height, int( math.ceil( max(ys) - offsetY ) ) )
+
+    if right <= left or bottom <= top :
+        return None
+    # end if
+
+    return left, top, right - left, bottom - top
+
+
+#*************************************************************************************
+
+
+# add weight * covered length of the span [left, right[ to a row of the mask
+def addSpan(coverage, rowStart, left, right, width, weight) :
+
+    left = max(left, 0.0)
+    right = min(right, float(width))
+
+    if right <= left :
+        return
+    # end if
+
+    first = int(left)
+    last = int(right)
+
+    if first == last :
+        coverage[rowStart + first] += (right - left) * weight
+        return
+    # end if
+
+    coverage[rowStart + first] += (first + 1 - left) * weight
+    for i in range(rowStart + first + 1, rowStart + last) :
+        coverage[i] += weight
+    # end for
+    if last < width :
+        coverage[rowStart + last] += (right - last) * weight
+    # end if
+
+
+# coverage (0.0 - 1.0) of the pixels of box by the polygons, even-odd rule; polygons in
+# image coordinates, box in drawable coordinates (see rasterBox)
+def polygonsCoverage(polygons, box, offsetX=0.0, offsetY=0.0, subsamples=SUBSAMPLES) :
+
+    boxX, boxY, width, height = box
+    originX = boxX + offsetX
+    originY = boxY + offsetY
+
+    # non horizontal edges, relative to the box: (top y, bottom y, x at top, dx / dy)
+    edges = []
+    for polygon in polygons :
+        n = len(polygon)
+        for i in range(n) :
+            ax, ay = polygon[i][0] - originX, polygon[i][1] - originY
+            bx, by = polygon[(i + 1) % n][0] - originX, polygon[(i + 1) % n][1] - originY
+            if ay == by :
+                continue
+            if ay > by :
+                ax, ay, bx, by = bx, by, ax, ay
+            edges.append((ay, by, ax, (bx - ax) / (by - ay)))
+        # end for
+    # end for
+
+    coverage = [0.0] * (width * height)
+    weight = 1.0 / subsamples
+
+    for row in range(height) :
+
+        rowEdges = [ edge for edge in edges if edge[0] < row + 1 and edge[1] > row ]
+        if rowEdges == [] :
+            continue
+
+        for sub in range(subsamples) :
+
+            y = row + (sub + 0.5) * weight
+            crossings = sorted( ax + (y - ay) * slope
+                                for ay, by, ax, slope in rowEdges if ay <= y < by )
+
+            for k in range(0, len(crossings) - 1, 2) :
+                addSpan(coverage, row * width, crossings[k], crossings[k + 1], width, weight)
+            # end for
+
+        # end for
+
+    # end for
+
+    return [ min(value, 1.0) for value in coverage ]
+
+
+# coverage of the box by several elements, combined as successive fills
+def elementsCoverage(elements, box, offsetX=0.0, offsetY=0.0, subsamples=SUBSAMPLES) :
+
+    total = None
+
+    for element in elements :
+
+        coverage = polygonsCoverage(elementPolygons(element), box, offsetX, offsetY, subsamples)
+
+        if total is None :
+            total = coverage
+        else :
+            total = [ a + b - a * b for a, b in zip(total, coverage) ]
+        # end if
+
+    # end for
+
+    return total
+
+
+#*************************************************************************************
+
+
+# composite the color (RGBA 0.0 - 1.0) with the coverage over pixels (flat RGBA float
+# sequence, not premultiplied, modified in place), normal mode
+def compositeCoverage(pixels, coverage, color) :
+
+    red, green, blue, alpha = color
+
+    for i, value in enumerate(coverage) :
+
+        if value <= 0.0 :
+            continue
+
+        sourceAlpha = value * alpha
+        k = 4 * i
+        kept = pixels[k + 3] * (1.0 - sourceAlpha)
+        outAlpha = sourceAlpha + kept
+
+        if outAlpha > 0.0 :
+            pixels[k]     = (red   * sourceAlpha + pixels[k]     * kept) / outAlpha
+            pixels[k + 1] = (green * sourceAlpha + pixels[k + 1] * kept) / outAlpha
+            pixels[k + 2] = (blue  * sourceAlpha + pixels[k + 2] * kept) / outAlpha
+            pixels[k + 3] = outAlpha
+        # end if
+
+    # end for
+
+    return pixels
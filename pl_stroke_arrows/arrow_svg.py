@@ -0,0 +1,486 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# SVG paths read as a stream, for the SVG procedure of the plug-in
+#
+# Pure python, no GIMP needed: the file is read with iterparse, each <path> element is
+# turned into cubic segments (lines with their control points on the anchors, as GIMP
+# does, quadratic curves raised, arcs split in quarter turns), transformed to image
+# pixels and handed over, then dropped from the tree. Memory stays the same whatever
+# the number of paths, nothing is added to the image.
+#
+# Coordinates: user units of the root viewBox scaled to its width and height (CSS
+# units, 96 px per inch), then the transforms of the groups and of the path.
+#
+# License: GPLv3 (see pl_stroke_arrows.py)
+
+import re
+import math
+import xml.etree.ElementTree as ElementTree
+
+from arrow_geometry import DELTA_T, Curve, parseOverrides, reversedCoords
+
+
+SVG_NAMESPACE = "{http://www.w3.org/2000/svg}"
+INKSCAPE_LABEL = "{http://www.inkscape.org/namespaces/inkscape}label"
+
+# px per unit, CSS
+CSS_UNITS = {"": 1.0, "px": 1.0, "in": 96.0, "cm": 96.0 / 2.54, "mm": 96.0 / 25.4,
+             "pt": 96.0 / 72.0, "pc": 16.0}
+
+# elements whose content isn't drawn by itself
+HIDDEN_ELEMENTS = {"defs", "clipPath", "mask", "marker", "pattern", "symbol"}
+
+IDENTITY = (1.0, 0.0, 0.0, 1.0, 0.0, 0.0) # a, b, c, d, e, f as in matrix()
+
+NUMBER = re.compile(r"[\s,]*([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)")
+FLAG = re.compile(r"[\s,]*([01])")
+COMMAND = re.compile(r"[\s,]*([MmLlHhVvCcSsQqTtAaZz])")
+END = re.compile(r"[\s,]*\Z") # nothing but separators left
+DISPLAY_NONE = re.compile(r"(?:^|;)\s*display\s*:\s*none\s*(?:;|$)")
+TRANSFORM = re.compile(r"(matrix|translate|scale|rotate|skewX|skewY)\s*\(([^)]*)\)")
+
+
+#*************************************************************************************
+
+
+# product of two matrices, m2 applied first
+def multiply(m1, m2) :
+
+    a1, b1, c1, d1, e1, f1 = m1
+    a2, b2, c2, d2, e2, f2 = m2
+
+    return (a1 * a2 + c1 * b2, b1 * a2 + d1 * b2,
+            a1 * c2 + c1 * d2, b1 * c2 + d1 * d2,
+            a1 * e2 + c1 * f2 + e1, b1 * e2 + d1 * f2 + f1)
+
+
+# matrix of a transform attribute, identity for an empty or unreadable one
+def parseTransform(text) :
+
+    matrix = IDENTITY
+
+    for name, arguments in TRANSFORM.findall(text or "") :
+
+        values = [ float(value) for value in NUMBER.findall(arguments) ]
+
+        if name == "matrix" and len(values) == 6 :
+            step = tuple(values)
+        elif name == "translate" and len(values) in (1, 2) :
+            step = (1.0, 0.0, 0.0, 1.0, values[0], values[1] if len(values) == 2 else 0.0)
+        elif name == "scale" and len(values) in (1, 2) :
+            step = (values[0], 0.0, 0.0, values[-1], 0.0, 0.0)
+        elif name == "rotate" and len(values) in (1, 3) :
+            angle = math.radians(values[0])
+            cos, sin = math.cos(angle), math.sin(angle)
+            step = (cos, sin, -sin, cos, 0.0, 0.0)
+            if len(values) == 3 : # around cx, cy
+                cx, cy = values[1], values[2]
+                step = multiply(multiply((1.0, 0.0, 0.0, 1.0, cx, cy), step),
+                                (1.0, 0.0, 0.0, 1.0, -cx, -cy))
+            # end if
+        elif name == "skewX" and len(values) == 1 :
+            step = (1.0, 0.0, math.tan(math.radians(values[0])), 1.0, 0.0, 0.0)
+        elif name == "skewY" and len(values) == 1 :
+            step = (1.0, math.tan(math.radians(values[0])), 0.0, 1.0, 0.0, 0.0)
+        else :
+            return IDENTITY
+        # end if
+
+        matrix = multiply(matrix, step)
+
+    # end for
+
+    return matrix
+
+
+# length in px, None for a missing, relative (%, em) or unreadable one
+def parseLength(text) :
+
+    match = re.match(r"\s*([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)\s*([a-z]*)\s*$", text or "")
+
+    if match is None or match.group(2) not in CSS_UNITS :
+        return None
+    # end if
+
+    return float(match.group(1)) * CSS_UNITS[match.group(2)]
+
+
+# matrix of the root element: viewBox to width and height (preserveAspectRatio
+# "none", or centered and uniform), then its own transform
+def rootMatrix(attributes) :
+
+    matrix = IDENTITY
+    viewBox = [ float(value) for value in NUMBER.findall(attributes.get("viewBox", "")) ]
+    width = parseLength(attributes.get("width"))
+    height = parseLength(attributes.get("height"))
+
+    if len(viewBox) == 4 and viewBox[2] > 0.0 and viewBox[3] > 0.0 :
+
+        x, y, boxWidth, boxHeight = viewBox
+        scaleX = width / boxWidth if width is not None else 1.0
+        scaleY = height / boxHeight if height is not None else scaleX
+
+        offsetX = offsetY = 0.0
+        if attributes.get("preserveAspectRatio", "").strip() != "none" :
+            scaleX = scaleY = min(scaleX, scaleY)
+            if width is not None :
+                offsetX = (width - boxWidth * scaleX) / 2.0
+            if height is not None :
+                offsetY = (height - boxHeight * scaleY) / 2.0
+        # end if
+
+        matrix = (scaleX, 0.0, 0.0, scaleY, offsetX - x * scaleX, offsetY - y * scaleY)
+
+    # end if
+
+    return multiply(matrix, parseTransform(attributes.get("transform")))
+
+
+# coords [x, y, x, y...] through the matrix
+def transformCoords(matrix, coords) :
+
+    a, b, c, d, e, f = matrix
+    xs = coords[0::2]
+    ys = coords[1::2]
+
+    newCoords = [0.0] * len(coords)
+    newCoords[0::2] = [ a * x + c * y + e for x, y in zip(xs, ys) ]
+    newCoords[1::2] = [ b * x + d * y + f for x, y in zip(xs, ys) ]
+
+    return newCoords
+
+
+#*************************************************************************************
+
+
+# cubic segments of an elliptical arc, as control, control, anchor coords, from the
+# endpoint parameters (SVG implementation notes, F.6.5), quarter turns at most
+def arcCoords(x1, y1, rx, ry, rotation, largeArc, sweep, x2, y2) :
+
+    if (x1, y1) == (x2, y2) :
+        return []
+    # end if
+
+    rx, ry = abs(rx), abs(ry)
+    if rx == 0.0 or ry == 0.0 : # straight line
+        return [x1, y1, x2, y2, x2, y2]
+    # end if
+
+    phi = math.radians(rotation)
+    cosPhi, sinPhi = math.cos(phi), math.sin(phi)
+
+    dx, dy = (x1 - x2) / 2.0, (y1 - y2) / 2.0
+    px = cosPhi * dx + sinPhi * dy
+    py = -sinPhi * dx + cosPhi * dy
+
+    # radii too small: scaled up
+    scale = (px * px) / (rx * rx) + (py * py) / (ry * ry)
+    if scale > 1.0 :
+        rx *= math.sqrt(scale)
+        ry *= math.sqrt(scale)
+    # end if
+
+    numerator = rx * rx * ry * ry - rx * rx * py * py - ry * ry * px * px
+    denominator = rx * rx * py * py + ry * ry * px * px
+    factor = math.sqrt( max(0.0, numerator / denominator) )
+    if largeArc == sweep :
+        factor = -factor
+    # end if
+
+    cxp = factor * rx * py / ry
+    cyp = -factor * ry * px / rx
+    cx = cosPhi * cxp - sinPhi * cyp + (x1 + x2) / 2.0
+    cy = sinPhi * cxp + cosPhi * cyp + (y1 + y2) / 2.0
+
+    startAngle = math.atan2( (py - cyp) / ry, (px - cxp) / rx )
+    deltaAngle = math.atan2( (-py - cyp) / ry, (-px - cxp) / rx ) - startAngle
+    if sweep and deltaAngle < 0.0 :
+        deltaAngle += 2.0 * math.pi
+    elif not sweep and deltaAngle > 0.0 :
+        deltaAngle -= 2.0 * math.pi
+    # end if
+
+    segmentsNumber = max( 1, int( math.ceil( abs(deltaAngle) / (math.pi / 2.0) - 1e-9 ) ) )
+    step = deltaAngle / segmentsNumber
+    handle = 4.0 / 3.0 * math.tan(step / 4.0)
+
+    # points of the unit circle, on the ellipse
+    def ellipsePoint(x, y) :
+        return [ cx + rx * cosPhi * x - ry * sinPhi * y, cy + rx * sinPhi * x + ry * cosPhi * y ]
+
+    coords = []
+    angle = startAngle
+    for i in range(segmentsNumber) :
+        cos1, sin1 = math.cos(angle), math.sin(angle)
+        angle += step
+        cos2, sin2 = math.cos(angle), math.sin(angle)
+        coords += ellipsePoint(cos1 - handle * sin1, sin1 + handle * cos1)
+        coords += ellipsePoint(cos2 + handle * sin2, sin2 - handle * cos2)
+        coords += ellipsePoint(cos2, sin2)
+    # end for
+
+    coords[-2:] = [x2, y2] # exact end
+
+    return coords
+
+
+# subpaths of a path "d" attribute, each as coords of cubic segments (anchor, control,
+# control, anchor...); read up to the first error, as SVG renderers do; subpaths
+# without a segment are left out
+def parsePathData(d) :
+
+    subpaths = []
+    coords = []
+    position = 0
+    command = None
+    x = y = startX = startY = 0.0
+    lastControl = None # (kind, x, y) of the last control point, for S and T
+
+    def number() :
+        nonlocal position
+        match = NUMBER.match(d, position)
+        if match is None :
+            raise ValueError("number expected at {}".format(position))
+        position = match.end()
+        return float(match.group(1))
+
+    def flag() :
+        nonlocal position
+        match = FLAG.match(d, position)
+        if match is None :
+            raise ValueError("flag expected at {}".format(position))
+        position = match.end()
+        return match.group(1) == "1"
+
+    try :
+
+        while True :
+
+            match = COMMAND.match(d, position)
+            if match is not None :
+                command = match.group(1)
+                position = match.end()
+            elif END.match(d, position) is not None :
+                break
+            elif command is None or command in "Zz" :
+                raise ValueError("command expected at {}".format(position))
+            elif command == "M" : # coordinates after a move: lines
+                command = "L"
+            elif command == "m" :
+                command = "l"
+            # end if
+
+            relative = command.islower()
+            kind = command.upper()
+            baseX, baseY = (x, y) if relative else (0.0, 0.0)
+
+            if kind == "Z" :
+                if coords != [] :
+                    if (x, y) != (startX, startY) :
+                        coords += [x, y, startX, startY, startX, startY]
+                    # end if
+                    if len(coords) >= 8 :
+                        subpaths.append(coords)
+                    # end if
+                    coords = []
+                # end if
+                x, y = startX, startY
+                lastControl = None
+                continue
+            # end if
+
+            if kind == "M" :
+                if len(coords) >= 8 :
+                    subpaths.append(coords)
+                # end if
+                x, y = baseX + number(), baseY + number()
+                startX, startY = x, y
+                coords = []
+                lastControl = None
+                continue
+            # end if
+
+            if coords == [] : # drawing after Z, or without M
+                coords = [x, y]
+            # end if
+
+            if kind in "LHV" :
+                if kind == "L" :
+                    newX, newY = baseX + number(), baseY + number()
+                elif kind == "H" :
+                    newX, newY = baseX + number(), y
+                else :
+                    newX, newY = x, baseY + number()
+                # end if
+                coords += [x, y, newX, newY, newX, newY]
+                lastControl = None
+            elif kind in "CS" :
+                if kind == "C" :
+                    x1, y1 = baseX + number(), baseY + number()
+                elif lastControl is not None and lastControl[0] == "C" :
+                    x1, y1 = 2.0 * x - lastControl[1], 2.0 * y - lastControl[2]
+                else :
+                    x1, y1 = x, y
+                # end if
+                x2, y2 = baseX + number(), baseY + number()
+                newX, newY = baseX + number(), baseY + number()
+                coords += [x1, y1, x2, y2, newX, newY]
+                lastControl = ("C", x2, y2)
+            elif kind in "QT" :
+                if kind == "Q" :
+                    qx, qy = baseX + number(), baseY + number()
+                elif lastControl is not None and lastControl[0] == "Q" :
+                    qx, qy = 2.0 * x - lastControl[1], 2.0 * y - lastControl[2]
+                else :
+                    qx, qy = x, y
+                # end if
+                newX, newY = baseX + number(), baseY + number()
+                coords += [x + 2.0 / 3.0 * (qx - x), y + 2.0 / 3.0 * (qy - y),
+                           newX + 2.0 / 3.0 * (qx - newX), newY + 2.0 / 3.0 * (qy - newY),
+                           newX, newY]
+                lastControl = ("Q", qx, qy)
+            else : # A
+                rx, ry, rotation = number(), number(), number()
+                largeArc, sweep = flag(), flag()
+                newX, newY = baseX + number(), baseY + number()
+                coords += arcCoords(x, y, rx, ry, rotation, largeArc, sweep, newX, newY)
+                lastControl = None
+            # end if
+
+            x, y = newX, newY
+
+        # end while
+
+    except ValueError :
+        pass # drawn up to the error
+    # end try
+
+    if len(coords) >= 8 :
+        subpaths.append(coords)
+    # end if
+
+    return subpaths
+
+
+#*************************************************************************************
+
+
+# True for the elements whose content isn't drawn: definitions, masks... and the ones
+# with display none (attribute or style)
+def notDrawn(tag, element) :
+
+    return tag in HIDDEN_ELEMENTS or element.get("display", "").strip() == "none" \
+           or DISPLAY_NONE.search(element.get("style", "")) is not None
+
+
+# the <path> elements of an SVG file, one after the other as the file is read:
+# (name, parameters text, subpaths), subpaths in image pixels (see parsePathData);
+# name: id or Inkscape label, parameters text: "data-arrow" attribute or label with
+# "arrow:" (see parseOverrides); the elements read are removed from the tree
+def svgPaths(source) :
+
+    matrices = []
+    elements = []
+    hidden = 0 # depth inside elements not drawn
+    number = 0
+
+    for event, element in ElementTree.iterparse(source, events=("start", "end")) :
+
+        tag = element.tag.replace(SVG_NAMESPACE, "")
+
+        if event == "start" :
+
+            if matrices == [] :
+                matrices.append(rootMatrix(element.attrib))
+            else :
+                matrices.append(multiply(matrices[-1], parseTransform(element.get("transform"))))
+            # end if
+            elements.append(element)
+            if notDrawn(tag, element) :
+                hidden += 1
+            # end if
+            continue
+
+        # end if
+
+        matrix = matrices.pop()
+        elements.pop()
+
+        if tag == "path" and hidden == 0 :
+
+            number += 1
+            label = element.get(INKSCAPE_LABEL, "")
+            name = element.get("id") or label or "path {}".format(number)
+            text = element.get("data-arrow", "")
+            if text == "" and "arrow:" in label :
+                text = label
+            # end if
+
+            subpaths = [ transformCoords(matrix, coords)
+                         for coords in parsePathData(element.get("d", "")) ]
+            yield name, text, subpaths
+
+        # end if
+
+        if notDrawn(tag, element) :
+            hidden -= 1
+        # end if
+
+        # done with it: out of its parent, nothing kept behind
+        element.clear()
+        if elements != [] :
+            elements[-1].remove(element)
+        # end if
+
+    # end for
+
+
+# groups of one path for groupedArrowGeometries, read from the SVG file as they are
+# needed: (parameters, [curve]) with the last subpath of each path (as the plug-in
+# uses the last stroke of a path); paths with wrong parameters are left out and
+# reported in errors, names (when given) get the name of each path drawn
+def svgGroups(fileName, userParameters, invert=False, deltaT=DELTA_T, names=None, errors=None) :
+
+    with open(fileName, "rb") as svgFile :
+
+        try :
+
+            for name, text, subpaths in svgPaths(svgFile) :
+
+                if subpaths == [] :
+                    continue
+                # end if
+
+                try :
+                    overrides = parseOverrides(text)
+                except ValueError as overrideError :
+                    if errors is not None :
+                        errors.append("{}: {}".format(name, overrideError))
+                    # end if
+                    continue
+                # end try
+
+                coords = subpaths[-1]
+                if overrides.pop("invertPath", invert) :
+                    coords = reversedCoords(coords)
+                # end if
+
+                parameters = dict(userParameters)
+                parameters.update(overrides)
+
+                if names is not None :
+                    names.append(name)
+                # end if
+
+                yield parameters, [ Curve(None, deltaT, coords) ]
+
+            # end for
+
+        except ElementTree.ParseError as parseError :
+            if errors is not None :
+                errors.append("not read after {}".format(parseError))
+            # end if
+        # end try
+
+    # end with
@@ -105,12 +105,62 @@
 # - minor UI adjustments
 # - added paths right-click menu entry
 # - corrected dialog box registration
+#
+# 0.9 :
+# - repeated arrowheads along the path, placed from a single arc length table
+# - Gimp.main only called when run as a script, the module can be imported by tools
+# - geometry moved to arrow_geometry.py (no GIMP needed), heads and tails built as
+#    elements (vertices or circle) turned into paths by the plug-in
+# - Curve object holding the segments coefficients and a lazily built arc length table,
+#    head and tail cut the same curve (the tail through a reversed view, no copy)
+# - corrected: division by zero for bar tails when the path starts vertically
+# - paths shorter than the arrow: the tail uses what is left of the curve after the head
+# - arrow_cli.py: command line geometry, JSON Lines in and out
+# - arrow_cairo.py: cairo rendering outside GIMP, parallel thumbnails rendering
+# - pipelined mode: the next arrows are computed in a thread while GIMP draws, all
+#    paths are read and checked before drawing
+# - per-path parameters from the path name ("arrow: style=empty wing=30") or an "arrow"
+#    parasite, paths drawn in groups sharing the same parameters
+# - long paths: the GIMP points list is used as it is, only the end segments are read,
+#    the middle of the shaft is sent back as one slice
+# - outline fill option: shaft, filled head and filled tail filled as a single outline,
+#    no overlapping strokes (solves the large stroke issue with plain arrowheads)
+# - animation frames: the arrow growing along its path, one layer per frame cropped to
+#    its content, all frames cut on one arc length table
+# - pl-stroke-arrows-bulk: arrows from coordinate arrays for scripts, no user paths
+# - straight segments (polylines) measured and cut in closed form, only real curves
+#    are sampled
+# - disable undo option for batch scripts, undo turned back on even when the run fails
+# - raster fill option: filled heads and tails scan converted with antialiasing in the
+#    plug-in, written through the shadow buffer of the drawable, only in their box
+# - arrows outside the canvas or the selection skipped before any GIMP call, numbers of
+#    drawn and culled arrows returned
+# - head only / tail only: the parts not drawn are neither computed nor turned into paths
+# - tools/check_geometry_accuracy.py: cuts, anchors, tips and angles compared with a
+#    high precision reference, to guard faster geometry engines
+# - dry run option: paths checked and arrows computed, the work of the run (paths,
+#    strokes, fills, selections, pixels, layer size) reported, the image untouched
+# - prepared styles and arrows as named tuples (ArrowSpec,
+#    ArrowheadSpec, HeadPlacement, ArrowGeometry), head and two-way tail share one
+#    arrowhead computation
+# - pl-stroke-arrows-sheet: style contact sheet of the selected path on a new image,
+#    every arrowhead style and tail, optionally swept over shape or tip angle; the
+#    curve measured once, head cuts shared between cells
+# - without a new layer, the arrows are drawn on all the selected drawables: computed
+#    and turned into paths once, then stroked and filled on each drawable
+# - resident mode: pl-stroke-arrows-service stays in memory and answers the served
+#    procedures (same arguments as pl-stroke-arrows and pl-stroke-arrows-bulk) without
+#    starting python for each call, prepared styles kept between calls
+# - staging layer option: without a new layer, the arrows drawn on a temporary layer
+#    the size of all of them, undo frozen, then pasted once on each target layer
+# - pl-stroke-arrows-svg: arrows along the paths of an SVG file, read as a stream
+#    (arrow_svg.py), never imported as paths: memory and item tree stay flat
 
 #
 # To do
 # -----
 # - bug: in some cases undo still un-selects the active layer (create layer unchecked)
-# - visual issue with plain arrowheads and very large stroke
+# - visual issue with plain arrowheads and very large stroke (not with outline fill)
 # - correct bullet position according to the tangent at contact, and straight line for simple
 # - select drawn / not drawn for each element
 # - examine visual bug with very short path and reversed-arrow tail (use the whole path 
@@ -138,22 +188,78 @@ gi.require_version('Gimp', '3.0')
 from gi.repository import Gimp
 gi.require_version('GimpUi', '3.0')
 from gi.repository import GimpUi
-# gi.require_version('Gegl', '0.4')
-# from gi.repository import Gegl
+gi.require_version('Gegl', '0.4')
+from gi.repository import Gegl
 from gi.repository import GObject
 from gi.repository import GLib
 
 import os
 import sys
 import math
-import time # for testing
 import gettext
+import json
+import queue
+import array
+import threading
+
+from arrow_geometry import (DELTA_T, OVERRIDE_CHOICES, Curve, StyleCache, prepareStyle,
+                            groupedArrowGeometries, groupsFromArrays, styleVariants,
+                            parseOverrides, shaftToFlatList, linesToFlatList, arrowBounds,
+                            boxesOverlap, boxIntersection, boxUnion, boxArea, translatedArrow,
+                            translatedElement)
+from arrow_raster import (RASTER_FORMAT, elementPolygons, rasterBox, elementsCoverage,
+                          compositeCoverage, fitsRaster, rasterBatches)
+from arrow_svg import svgGroups
 
 LOCALE_DIR = os.path.join(os.path.dirname(__file__), "locale")
 gettext.bindtextdomain("pl_stroke_arrows", LOCALE_DIR)
 gettext.textdomain("pl_stroke_arrows")
 _ = gettext.gettext
 
+PIPELINE_QUEUE_SIZE = 8 # arrows computed ahead of the drawing, in pipelined mode
+
+BULK_PROCEDURE = "pl-stroke-arrows-bulk" # arrows from coordinate arrays, for scripts
+
+SHEET_PROCEDURE = "pl-stroke-arrows-sheet" # all the styles on one path, new image
+
+SVG_PROCEDURE = "pl-stroke-arrows-svg" # arrows from the paths of an SVG file, not imported
+
+# resident mode: the service procedure stays in memory and adds temporary procedures
+# taking the same arguments as the plug-in ones, without starting python for each call
+SERVICE_PROCEDURE = "pl-stroke-arrows-service"
+SERVICE_STOP_PROCEDURE = "pl-stroke-arrows-service-stop"
+SERVED_PROCEDURES = {"pl-stroke-arrows-served": "pl-stroke-arrows",
+                     "pl-stroke-arrows-bulk-served": BULK_PROCEDURE}
+
+STYLE_CACHE_SIZE = 64 # prepared styles kept by the service, and in an SVG run
+
+# state of the service: running, and the styles prepared by the previous calls
+serviceState = {"running": False, "styles": StyleCache(STYLE_CACHE_SIZE)}
+
+# contact sheet: a row per head style (and swept value), a column per tail, with the
+# tail styles of the tail types that have one
+SHEET_STYLES = OVERRIDE_CHOICES["arrowStyle"]
+SHEET_TAILS = [ ("none", "default"), ("crossbar", "default") ] + \
+              [ (tailType, tailStyle) for tailType in ("bullet", "feathered", "arrowhead")
+                                      for tailStyle in ("filled", "empty", "simple") ]
+
+# arguments in the dialog of the contact sheet, the others are not used
+SHEET_DIALOG = ["arrowsColor", "wingLen", "tipAngle", "harpoonFactor", "strokeWidth",
+                "tailSize", "tailUnitRelative", "markerSpacing", "invertPath", "keepPaths",
+                "outlineFill", "rasterFill", "sweepParameter", "sweepValues", "cellSpacing",
+                "sheetLabels"]
+
+# arguments in the dialog of the other procedures, in reading order (new arguments are
+# added last to the procedures, see addArrowArguments)
+ARROW_DIALOG = ["arrowsColor", "arrowStyle", "wingLen", "tipAngle", "harpoonFactor",
+                "strokeWidth", "tailType", "tailStyle", "tailSize", "tailUnitRelative",
+                "markerSpacing", "createLayer", "invertPath", "arrowHeadOnly", "arrowTailOnly",
+                "keepPaths", "outlineFill", "animationFrames", "pipelined", "disableUndo",
+                "rasterFill", "stagingLayer", "dryRun"]
+
+SHEET_LABEL_SIZE = 14.0 # px
+SHEET_SWEEP_LABELS = {"harpoonFactor": _("shape"), "tipAngle": _("tip angle")}
+
 
 #*************************************************************************************
 
@@ -161,15 +267,116 @@ _ = gettext.gettext
 class strokeArrows (Gimp.PlugIn):
     ## GimpPlugIn virtual methods ##
     def do_query_procedures(self):
-        return [ "pl-stroke-arrows" ]
+        return [ "pl-stroke-arrows", BULK_PROCEDURE, SHEET_PROCEDURE, SVG_PROCEDURE,
+                 SERVICE_PROCEDURE ]
 
     def do_create_procedure(self, name):
+
+        # resident mode, started once by a script (see startService)
+        if name == SERVICE_PROCEDURE :
+
+            procedure = Gimp.Procedure.new(self, name, Gimp.PDBProcType.PERSISTENT,
+                                           startService, None)
+            procedure.set_documentation(_("Start the resident arrow service"),
+                                        _("Keep the plug-in in memory and add the procedures "
+                                          "pl-stroke-arrows-served and pl-stroke-arrows-bulk-served "
+                                          "(same arguments as pl-stroke-arrows and pl-stroke-arrows-bulk), "
+                                          "until pl-stroke-arrows-service-stop is called"),
+                                        name)
+            procedure.set_attribution("Pascal L.", "Pascal L.", "2025")
+            addRunModeArgument(procedure)
+
+            return procedure
+
+        # end if
+
         procedure = Gimp.ImageProcedure.new(self, name,
                                             Gimp.PDBProcType.PLUGIN,
                                             drawArrows, None)
 
         procedure.set_image_types("*")
 
+        # bulk procedure: no menu, the arrows come from the arrays, then same arguments
+        if name == BULK_PROCEDURE :
+
+            procedure.set_documentation(_("Stroke arrows from coordinate arrays"),
+                                        _("Stroke many arrows at once from flat arrays of "
+                                          "anchors and control points, no paths needed"),
+                                        name)
+            procedure.set_attribution("Pascal L.", "Pascal L.", "2025")
+
+            addBulkArguments(procedure)
+            addArrowArguments(procedure)
+
+            return procedure
+
+        # end if
+
+        # contact sheet: same arguments for the base values, then the grid
+        if name == SHEET_PROCEDURE :
+
+            procedure.set_menu_label(_("Stroke arrows style sheet ..."))
+            procedure.set_icon_name(GimpUi.ICON_GEGL)
+            procedure.add_menu_path('<Image>/Edit')
+            procedure.add_menu_path('<Paths>/Paths Menu')
+
+            procedure.set_documentation(_("Arrow styles contact sheet"),
+                                        _("Draw the selected path with every arrowhead style, "
+                                          "tail type and tail style, in a grid on a new image"),
+                                        name)
+            procedure.set_attribution("Pascal L.", "Pascal L.", "2025")
+
+            addArrowArguments(procedure)
+
+            choice = Gimp.Choice.new()
+            choice.add("none", 0, _("none"), "")
+            choice.add("harpoonFactor", 1, _("shape"), "")
+            choice.add("tipAngle", 2, _("tip angle"), "")
+            procedure.add_choice_argument("sweepParameter", _("Sweep"),
+                                    _("Parameter taking each of the sweep values, a row per value and head style"),
+                                    choice, "none", GObject.ParamFlags.READWRITE)
+            procedure.add_string_argument("sweepValues", _("Sweep values"),
+                                    _("Values of the swept parameter, separated by spaces"),
+                                    "-5 0 2.5", GObject.ParamFlags.READWRITE)
+            procedure.add_double_argument("cellSpacing", _("Cell spacing (px)"),
+                                    _("Space around the arrow of each cell"),
+                                    0.0, 500.0, 30.0, GObject.ParamFlags.READWRITE)
+            procedure.add_boolean_argument("sheetLabels", _("Labels"),
+                                    _("Name the rows and columns with text layers"),
+                                    True, GObject.ParamFlags.READWRITE)
+
+            procedure.add_image_return_value("sheetImage", _("Sheet image"),
+                                    _("New image holding the contact sheet"),
+                                    True, GObject.ParamFlags.READWRITE)
+
+            return procedure
+
+        # end if
+
+        # SVG file: its paths read one by one, never added to the image
+        if name == SVG_PROCEDURE :
+
+            procedure.set_menu_label(_("Stroke arrows from SVG ..."))
+            procedure.set_icon_name(GimpUi.ICON_GEGL)
+            procedure.add_menu_path('<Image>/Edit')
+
+            procedure.set_documentation(_("Stroke arrows from an SVG file"),
+                                        _("Stroke an arrow along each path of an SVG file, the "
+                                          "paths are read from the file as it goes and are not "
+                                          "imported in the image"),
+                                        name)
+            procedure.set_attribution("Pascal L.", "Pascal L.", "2025")
+
+            procedure.add_file_argument("svgFile", _("SVG file"),
+                                    _("SVG file whose paths are drawn as arrows"),
+                                    Gimp.FileChooserAction.OPEN, False, None,
+                                    GObject.ParamFlags.READWRITE)
+            addArrowArguments(procedure)
+
+            return procedure
+
+        # end if
+
         procedure.set_menu_label(_("Stroke arrows ..."))
         procedure.set_icon_name(GimpUi.ICON_GEGL)
         procedure.add_menu_path('<Image>/Edit')
@@ -180,61 +387,7 @@ class strokeArrows (Gimp.PlugIn):
                                     name)
         procedure.set_attribution("Pascal L.", "Pascal L.", "2025")
 
-        # dialog box parameters
-        # ---------------------
-        choice = Gimp.Choice.new()
-        choice.add("foreground", 0, _("foreground color"), "")
-        choice.add("black", 1, _("black"), "")
-        procedure.add_choice_argument("arrowsColor", _("Color"), _("Color"),
-                                       choice, "foreground", GObject.ParamFlags.READWRITE)
-        choice = Gimp.Choice.new()
-        choice.add("filled", 0, _("filled"), "")
-        choice.add("empty",  1, _("empty"), "")
-        choice.add("simple", 2, _("simple"), "")
-        procedure.add_choice_argument("arrowStyle", _("Arrowhead style"), _("Arrowhead style"),
-                                       choice, "filled", GObject.ParamFlags.READWRITE)
-        procedure.add_double_argument("wingLen", _("Wing length (px)"),
-                                    _("Length of the wing (px)"),
-                                    2.0, 500.0, 40.0, GObject.ParamFlags.READWRITE)
-        procedure.add_double_argument("tipAngle", _("Tip angle (°)"),
-                                    _("Tip angle (°)"),
-                                    10.0, 120.0, 35.0, GObject.ParamFlags.READWRITE)
-        procedure.add_double_argument("harpoonFactor", _("Shape (-◆ | ➤+)"),
-                                    _("positive: harpoon / negative: diamond"),
-                                    -10.0, 5.0, 0.0, GObject.ParamFlags.READWRITE)
-        procedure.add_double_argument("strokeWidth", _("Stroke width (px)"),
-                                    _("Stroke width (px)"),
-                                    0.0, 50.0, 4.0, GObject.ParamFlags.READWRITE)
-        choice = Gimp.Choice.new()
-        choice.add("none", 0, _("none"), "")
-        choice.add("crossbar", 1, _("bar"), "") # (transversal) line/stop? stroke? cross-line? crossbar?
-        choice.add("bullet", 2, _("bullet"), "")
-        choice.add("feathered", 3, _("feather"), "")
-        choice.add("arrowhead",  4, _("two-way arrow"), "") # opposite? backward? reversed? two-way?
-        procedure.add_choice_argument("tailType", _("Tail type"), _("Tail type"),
-                                       choice, "none", GObject.ParamFlags.READWRITE)
-        choice = Gimp.Choice.new()
-        choice.add("default", 0, _("same as arrowhead"), "")
-        choice.add("filled", 1, _("filled"), "")
-        choice.add("empty", 2, _("empty"), "")
-        choice.add("simple",  3, _("simple"), "")
-        procedure.add_choice_argument("tailStyle", _("Tail style"), _("Tail style"),
-                                       choice, "default", GObject.ParamFlags.READWRITE)
-        procedure.add_double_argument("tailSize", _("Tail width"),
-                                    _("Tail width"),
-                                    2.0, 500.0, 80.0, GObject.ParamFlags.READWRITE)
-        procedure.add_boolean_argument("tailUnitRelative", _("Tail width unit relative (%)"),
-                                    _("Tail width relative to arrowhead, otherwise value in pixels"), True, GObject.ParamFlags.READWRITE)
-        procedure.add_boolean_argument("createLayer", _("Create new layer"),
-                                    _("Create new layer"), True, GObject.ParamFlags.READWRITE)
-        procedure.add_boolean_argument("invertPath", _("Flip path direction"),
-                                    _("Flip the arrow direction"), False, GObject.ParamFlags.READWRITE)
-        procedure.add_boolean_argument("arrowHeadOnly", _("Remove shaft, draw head"),
-                                    _("Remove shaft, draw arrowhead"), False, GObject.ParamFlags.READWRITE)
-        procedure.add_boolean_argument("arrowTailOnly", _("Remove shaft, draw tail"),
-                                    _("Remove shaft, draw tail"), False, GObject.ParamFlags.READWRITE)
-        procedure.add_boolean_argument("keepPaths", _("Keep newly created paths"),
-                                    _("Keep newly created paths"), False, GObject.ParamFlags.READWRITE)
+        addArrowArguments(procedure)
 
         return procedure
 
@@ -242,6 +395,128 @@ class strokeArrows (Gimp.PlugIn):
 #*************************************************************************************
 
 
+# arrays of the bulk procedures
+def addBulkArguments(procedure) :
+    
+    procedure.add_double_array_argument("coordinates", _("Coordinates"),
+                            _("x, y of the points of all arrows (anchor, control, control, anchor...)"),
+                            GObject.ParamFlags.READWRITE)
+    procedure.add_int32_array_argument("offsets", _("Offsets"),
+                            _("Index in coordinates of the first value of each arrow"),
+                            GObject.ParamFlags.READWRITE)
+    procedure.add_int32_array_argument("styleIndices", _("Style indices"),
+                            _("Index in styles of each arrow, empty: style 0 for all"),
+                            GObject.ParamFlags.READWRITE)
+    procedure.add_string_argument("styles", _("Styles"),
+                            _("Per style parameters separated by ';', e.g. 'style=empty tail=bullet; wing=30'"),
+                            "", GObject.ParamFlags.READWRITE)
+
+
+# run mode of the procedures that are not image procedures
+def addRunModeArgument(procedure) :
+    
+    procedure.add_enum_argument("run-mode", _("Run mode"), _("The run mode"),
+                                Gimp.RunMode, Gimp.RunMode.NONINTERACTIVE,
+                                GObject.ParamFlags.READWRITE)
+
+
+# arguments shared by both procedures (dialog box parameters), and the run summary
+def addArrowArguments(procedure) :
+    
+    choice = Gimp.Choice.new()
+    choice.add("foreground", 0, _("foreground color"), "")
+    choice.add("black", 1, _("black"), "")
+    procedure.add_choice_argument("arrowsColor", _("Color"), _("Color"),
+                                   choice, "foreground", GObject.ParamFlags.READWRITE)
+    choice = Gimp.Choice.new()
+    choice.add("filled", 0, _("filled"), "")
+    choice.add("empty",  1, _("empty"), "")
+    choice.add("simple", 2, _("simple"), "")
+    procedure.add_choice_argument("arrowStyle", _("Arrowhead style"), _("Arrowhead style"),
+                                   choice, "filled", GObject.ParamFlags.READWRITE)
+    procedure.add_double_argument("wingLen", _("Wing length (px)"),
+                                _("Length of the wing (px)"),
+                                2.0, 500.0, 40.0, GObject.ParamFlags.READWRITE)
+    procedure.add_double_argument("tipAngle", _("Tip angle (°)"),
+                                _("Tip angle (°)"),
+                                10.0, 120.0, 35.0, GObject.ParamFlags.READWRITE)
+    procedure.add_double_argument("harpoonFactor", _("Shape (-◆ | ➤+)"),
+                                _("positive: harpoon / negative: diamond"),
+                                -10.0, 5.0, 0.0, GObject.ParamFlags.READWRITE)
+    procedure.add_double_argument("strokeWidth", _("Stroke width (px)"),
+                                _("Stroke width (px)"),
+                                0.0, 50.0, 4.0, GObject.ParamFlags.READWRITE)
+    choice = Gimp.Choice.new()
+    choice.add("none", 0, _("none"), "")
+    choice.add("crossbar", 1, _("bar"), "") # (transversal) line/stop? stroke? cross-line? crossbar?
+    choice.add("bullet", 2, _("bullet"), "")
+    choice.add("feathered", 3, _("feather"), "")
+    choice.add("arrowhead",  4, _("two-way arrow"), "") # opposite? backward? reversed? two-way?
+    procedure.add_choice_argument("tailType", _("Tail type"), _("Tail type"),
+                                   choice, "none", GObject.ParamFlags.READWRITE)
+    choice = Gimp.Choice.new()
+    choice.add("default", 0, _("same as arrowhead"), "")
+    choice.add("filled", 1, _("filled"), "")
+    choice.add("empty", 2, _("empty"), "")
+    choice.add("simple",  3, _("simple"), "")
+    procedure.add_choice_argument("tailStyle", _("Tail style"), _("Tail style"),
+                                   choice, "default", GObject.ParamFlags.READWRITE)
+    procedure.add_double_argument("tailSize", _("Tail width"),
+                                _("Tail width"),
+                                2.0, 500.0, 80.0, GObject.ParamFlags.READWRITE)
+    procedure.add_boolean_argument("tailUnitRelative", _("Tail width unit relative (%)"),
+                                _("Tail width relative to arrowhead, otherwise value in pixels"), True, GObject.ParamFlags.READWRITE)
+    procedure.add_boolean_argument("createLayer", _("Create new layer"),
+                                _("Create new layer"), True, GObject.ParamFlags.READWRITE)
+    procedure.add_boolean_argument("invertPath", _("Flip path direction"),
+                                _("Flip the arrow direction"), False, GObject.ParamFlags.READWRITE)
+    procedure.add_boolean_argument("arrowHeadOnly", _("Remove shaft, draw head"),
+                                _("Remove shaft, draw arrowhead"), False, GObject.ParamFlags.READWRITE)
+    procedure.add_boolean_argument("arrowTailOnly", _("Remove shaft, draw tail"),
+                                _("Remove shaft, draw tail"), False, GObject.ParamFlags.READWRITE)
+    procedure.add_boolean_argument("keepPaths", _("Keep newly created paths"),
+                                _("Keep newly created paths"), False, GObject.ParamFlags.READWRITE)
+    # added after the first release, in the order they came: last, scripts pass the
+    # arguments by position
+    procedure.add_double_argument("markerSpacing", _("Repeat heads every (px)"),
+                                _("Distance between repeated arrowheads along the path, 0: no repetition"),
+                                0.0, 5000.0, 0.0, GObject.ParamFlags.READWRITE)
+    procedure.add_boolean_argument("pipelined", _("Compute next arrows while drawing"),
+                                _("Compute the next arrows in a thread while GIMP draws, faster with many paths"),
+                                False, GObject.ParamFlags.READWRITE)
+    procedure.add_boolean_argument("outlineFill", _("Fill shaft and head as one outline"),
+                                _("Fill the shaft with the filled head and tail as a single shape instead of stroking it"),
+                                False, GObject.ParamFlags.READWRITE)
+    procedure.add_int_argument("animationFrames", _("Animation frames"),
+                                _("Draw each arrow growing along its path on this number of frame layers, 0: no animation"),
+                                0, 500, 0, GObject.ParamFlags.READWRITE)
+    procedure.add_boolean_argument("disableUndo", _("Disable undo (batch scripts)"),
+                                _("Turn undo off during the run, faster and lighter on big images; the undo history of the image is dropped"),
+                                False, GObject.ParamFlags.READWRITE)
+    procedure.add_boolean_argument("rasterFill", _("Draw filled heads and tails as pixels"),
+                                _("Fill heads and tails by writing their antialiased pixels instead of going through the selection, faster on big images"),
+                                False, GObject.ParamFlags.READWRITE)
+    procedure.add_boolean_argument("dryRun", _("Plan only, draw nothing"),
+                                _("Check the paths and compute the arrows, then report the paths, strokes, fills, selection operations and pixels a run would take; the image is not changed"),
+                                False, GObject.ParamFlags.READWRITE)
+    procedure.add_boolean_argument("stagingLayer", _("Draw on a temporary layer, pasted at the end"),
+                                _("Without a new layer: draw the arrows on a temporary layer the size of the arrows, then paste it on the selected layers, one write and one undo step for the run"),
+                                False, GObject.ParamFlags.READWRITE)
+    
+    procedure.add_int_return_value("drawnArrows", _("Drawn arrows"),
+                                _("Number of arrows (or animation frames) drawn"),
+                                0, 2147483647, 0, GObject.ParamFlags.READWRITE)
+    procedure.add_int_return_value("culledArrows", _("Culled arrows"),
+                                _("Number of arrows (or animation frames) not drawn, outside the canvas or the selection"),
+                                0, 2147483647, 0, GObject.ParamFlags.READWRITE)
+    procedure.add_string_return_value("plan", _("Plan"),
+                                _("Dry run: work per path and in total, as JSON text"),
+                                "", GObject.ParamFlags.READWRITE)
+
+
+#*************************************************************************************
+
+
 # main routine
 #--------------
 
@@ -251,17 +526,97 @@ def drawArrows(procedure, run_mode, monImage, drawables, config, data):
     # user dialog
     # ************
     
-    if run_mode == Gimp.RunMode.INTERACTIVE:
+    # served procedures (resident mode) run as the procedure they stand for, no dialog
+    isServed = procedure.get_name() in SERVED_PROCEDURES
+    baseName = SERVED_PROCEDURES.get(procedure.get_name(), procedure.get_name())
+    
+    isBulk = baseName == BULK_PROCEDURE
+    isSheet = baseName == SHEET_PROCEDURE
+    isSvg = baseName == SVG_PROCEDURE
+    
+    # styles prepared by the previous calls, kept by the service
+    styleCache = serviceState["styles"] if isServed else None
+    
+    if run_mode == Gimp.RunMode.INTERACTIVE and not isBulk and not isServed :
         GimpUi.init('pl_stroke_arrows') # nom du fichier
 
         dialog = GimpUi.ProcedureDialog(procedure=procedure, config=config)
-        dialog.fill(None)
+        if isSheet :
+            dialog.fill(SHEET_DIALOG)
+        elif isSvg :
+            dialog.fill(["svgFile"] + ARROW_DIALOG)
+        else :
+            dialog.fill(ARROW_DIALOG)
+        # end if
         if not dialog.run():
             dialog.destroy()
             return procedure.new_return_values(Gimp.PDBStatusType.CANCEL, GLib.Error())
         else:
             dialog.destroy()
 
+    # contact sheet: drawn on a new image, the image of the user is only read
+    if isSheet :
+        return drawSheet(procedure, run_mode, monImage, config)
+    # end if
+    
+    # dry run: nothing is changed, nothing to undo
+    if config.get_property("dryRun") == True :
+        return drawInImage(procedure, monImage, drawables, config, isBulk,
+                           run_mode == Gimp.RunMode.INTERACTIVE, styleCache, isSvg)
+    # end if
+    
+    # Undo
+    # ****
+    # batch scripts saving the image right away can run without undo: no copy of the
+    # tiles touched by each arrow; undo is back on whatever happens in the run
+    
+    disableUndo = config.get_property("disableUndo")
+    
+    if disableUndo == True :
+        monImage.undo_disable()
+    else :
+        monImage.undo_group_start()
+    # end if
+    
+    try :
+        return drawInImage(procedure, monImage, drawables, config, isBulk, False, styleCache,
+                           isSvg)
+    finally :
+        if disableUndo == True :
+            monImage.undo_enable()
+        else :
+            monImage.undo_group_end()
+        # end if
+    # end try
+
+
+# context and user selection saved around the run, and back as they were whatever
+# happens in it (wrong arguments, exception raised by the arrows computed in the thread)
+def drawInImage(procedure, monImage, drawables, config, isBulk, showPlan=False,
+                styleCache=None, isSvg=False) :
+    
+    Gimp.context_push()
+    
+    savedSelection = None # dry run: nothing to restore
+    if config.get_property("dryRun") == False :
+        savedSelection = monImage.get_selection().save(monImage)
+    # end if
+    
+    try :
+        return drawInContext(procedure, monImage, drawables, config, isBulk, showPlan,
+                             styleCache, isSvg, savedSelection)
+    finally :
+        if savedSelection is not None :
+            monImage.select_item(2, savedSelection)
+            monImage.remove_channel(savedSelection)
+        # end if
+        Gimp.context_pop()
+    # end try
+
+
+def drawInContext(procedure, monImage, drawables, config, isBulk, showPlan, styleCache,
+                  isSvg, savedSelection) :
+    
     # parameters list for user dialog
     # -------------------------------
     
@@ -275,11 +630,18 @@ def drawArrows(procedure, run_mode, monImage, drawables, config, data):
     tailStyle       = config.get_property("tailStyle")
     tailSize        = config.get_property("tailSize")
     tailUnitRelative = config.get_property("tailUnitRelative")
+    markerSpacing   = config.get_property("markerSpacing")
     createLayer     = config.get_property("createLayer")
     arrowHeadOnly   = config.get_property("arrowHeadOnly")
     arrowTailOnly   = config.get_property("arrowTailOnly")
     invertPath      = config.get_property("invertPath")
     keepPaths       = config.get_property("keepPaths")
+    outlineFill     = config.get_property("outlineFill")
+    animationFrames = config.get_property("animationFrames")
+    pipelined       = config.get_property("pipelined")
+    rasterFill      = config.get_property("rasterFill")
+    stagingLayer    = config.get_property("stagingLayer")
+    dryRun          = config.get_property("dryRun")
 
     # user dialog variables (for testing)
     # -----------------------------------
@@ -293,100 +655,75 @@ def drawArrows(procedure, run_mode, monImage, drawables, config, data):
     # tailStyle       = "default"
     # tailSize        = 20.0
     # tailUnitRelative = True
+    # markerSpacing   =  0.0
     # createLayer     = True
     # invertPath      = False
     # arrowHeadOnly   = False
     # arrowTailOnly   = False
     # keepPaths       = False
-    
-    # Undo and context
-    # ****************
-    
-    monImage.undo_group_start()
-    Gimp.context_push()
+    # outlineFill     = False
+    # animationFrames = 0
+    # pipelined       = False
+    # disableUndo     = False
+    # rasterFill      = False
+    # stagingLayer    = False
+    # dryRun          = False
+    
+    # Context
+    # *******
+    # pushed by drawInImage
     
     # Gimp.context_set_defaults()
     
-    if arrowsColor == "black" :
-        Gimp.context_set_foreground(Gimp.color_parse_name("black"))
-    
-    Gimp.context_set_antialias(True)
-    Gimp.context_set_feather(False)
-    
-    Gimp.context_set_line_width(strokeWidth)
-    Gimp.context_set_line_join_style(0) # MITER
-    Gimp.context_set_line_cap_style(0)  # BUTT
-    Gimp.context_set_stroke_method(0)   # LINE
-    Gimp.context_set_line_miter_limit(100.0) # max value accepted by GIMP: 100.0
+    setArrowContext(arrowsColor, strokeWidth)
     
     # Initialisations
     # ***************
     
     selectedPaths       = monImage.get_selected_paths()
-    thisSelection       = monImage.get_selection()
-    savedSelection      = thisSelection.save(monImage)
     
     # adjustments to user parameters
     # ------------------------------
     
-    if tailStyle == "default" :
-        tailStyle = arrowStyle
-    # end if
-    
-    tipAngle            = math.radians(tipAngle)       # convert from user friendly
-    harpoonFactor       = 1.0 - (harpoonFactor / 10.0) # convert from user friendly
+    # parameters of all paths, each path can override them (see pathOverrides)
+    userParameters = {"arrowStyle": arrowStyle, "strokeWidth": strokeWidth, "wingLen": wingLen,
+                      "tipAngle": tipAngle, "harpoonFactor": harpoonFactor, "tailType": tailType,
+                      "tailStyle": tailStyle, "tailSize": tailSize,
+                      "tailUnitRelative": tailUnitRelative, "markerSpacing": markerSpacing}
     
-    # get arrow length from wing length entered in the UI
-    arrowLen = math.cos( tipAngle / 2.0 ) * wingLen # arrowLen is used from here
+    deltaT        = DELTA_T # increment of t parameter used to scan segments
     
-    # for diamond shapes, we adjust the reference length
-    if harpoonFactor > 1.0 :
-        weight = 0.15
-        ratio = 1.0 + (harpoonFactor - 1.0) * weight
-        arrowLen = arrowLen / ratio # mitigated for optical reasons
-        tailSize *= ratio # we want to keep the same relative tail size
+    # filled elements written as pixels in this color (not for indexed images)
+    fillColor = None
+    if rasterFill == True and monImage.get_base_type() != 2 : # 2: indexed
+        fillColor = Gimp.context_get_foreground().get_rgba()
     # end if
     
-    # arrowLength can change, arrowLen stays constant from there
-    arrowLength = arrowLen
-    
-    if tailUnitRelative == True :
-        refSize = 2.0 * math.tan(0.5 * tipAngle) * arrowLength # reference size from arrowhead width
-        tailSize = tailSize / 100.0 * refSize
-    
-    # for feather types other than simple, we adjust the reference size (used as width)
-    # not active, keep just in case
-    # if tailType == "feathered" and tailStyle != "simple" :
-        # tailSize /= 1.25
-    
-    # CONSTANTS
-    harpThreshold = 0.7  # harpoon factor under which cut point and anchor point become distinct
-    
-    if arrowStyle == "simple" :
-        harpThreshold = 0.9
-    
-    deltaT        = 0.01 # increment of t parameter used to scan segments
-    
-    # get active layer
-    # ----------------
+    # get active layers
+    # -----------------
+    # without a new layer, the arrows are drawn on every selected drawable: paths built
+    # once, then stroked and filled on each drawable in turn
     
-    if createLayer == True :
+    if animationFrames > 0 :
         
-        sourceDrawable = Gimp.Layer.new(monImage, _("Arrow #1"), monImage.get_width(), monImage.get_height(), 
-                                    monImage.get_base_type() * 2 + 1, 100.0, 28) # 28:normal
-        monImage.insert_layer(sourceDrawable, None, 0)
+        targetDrawables = [] # a layer per frame
         
-    elif len(drawables) != 1:
+    elif createLayer == True :
         
-        Gimp.context_pop()
-        monImage.undo_group_end()
-        msg = _("Procedure '{}' only works with one drawable.").format(procedure.get_name())
+        targetDrawables = [] # dry run: planned, not created
+        if dryRun == False :
+            targetDrawables = [ newArrowLayer(monImage, _("Arrow #1")) ]
+        # end if
+        
+    elif len(drawables) == 0 :
+        
+        msg = _("Procedure '{}' needs at least one drawable.").format(procedure.get_name())
         error = GLib.Error.new_literal(Gimp.PlugIn.error_quark(), msg, 0)
         return procedure.new_return_values(Gimp.PDBStatusType.CALLING_ERROR, error)
         
     else:
         
-        sourceDrawable = drawables[0]
+        targetDrawables = list(drawables)
             
     # end if
     
@@ -398,320 +735,340 @@ def drawArrows(procedure, run_mode, monImage, drawables, config, data):
     
     # accumulatedCalcTime = 0 # debug
     
-    userPaths = monImage.get_selected_paths()
-    
-    # no path selected
-    if userPaths == [] :
-        
-        Gimp.context_pop()
-        monImage.undo_group_end()
-        msg = _("Procedure '{}' needs at least one path").format(procedure.get_name())
-        error = GLib.Error.new_literal(Gimp.PlugIn.error_quark(), msg, 0)
-        return procedure.new_return_values(Gimp.PDBStatusType.CALLING_ERROR, error)
-    # end if
-    
-    #--------------------------
-        
-    wingLength = arrowLength / math.cos( tipAngle / 2.0 )
-    axisLength = harpoonFactor * arrowLength
-    # find anchor placement of the head, curve cut point must not be past harpThreshold * arrowLength
-    cutDistance = max( 0.0, ( harpThreshold - harpoonFactor ) * arrowLength ) # added distance to cut point
-    
-    # for styles with contour, we reduce arrow size
-    tipProtruding, arrowLength, axisLength, wingLength = shrinkArrowhead(arrowStyle, strokeWidth, tipAngle, 
-                                                arrowLength, axisLength, wingLength)
-    
-    # same for arrow tail
-    if tailType == "arrowhead" :
+    if isBulk :
         
-        tailArrowLength = arrowLen
+        # arrows from the coordinate arrays, no paths
+        # -------------------------------------------
         
-        tailWingLength = tailArrowLength / math.cos( tipAngle / 2.0 )
-        tailAxisLength = harpoonFactor * tailArrowLength
-        tailCutDistance = max( 0.0, ( harpThreshold - harpoonFactor ) * tailArrowLength )
+        styles = config.get_property("styles")
+        styleTexts = styles.split(";") if styles.strip() != "" else []
         
-        tailTipProtruding, tailArrowLength, tailAxisLength, tailWingLength = shrinkArrowhead(tailStyle, 
-                                strokeWidth, tipAngle, tailArrowLength, tailAxisLength, tailWingLength)
-        
-    elif ( tailType == "bullet" and tailStyle != "filled" 
-        or tailType == "feathered" and tailStyle == "empty" ) :
-        
-        tailSize = max( tailSize - strokeWidth, 2.0 )
-        
-    #end if
-    
-    
-    
-    # MAIN LOOP - work on each selected path successively
-    # ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
-    
-    for thisPath in userPaths :
+        try :
+            groupsList = groupsFromArrays(list(config.get_property("coordinates") or []),
+                                          list(config.get_property("offsets") or []),
+                                          list(config.get_property("styleIndices") or []),
+                                          styleTexts, userParameters, invertPath, deltaT)
+        except ValueError as bulkError :
+            msg = _("Procedure '{}': {}").format(procedure.get_name(), bulkError)
+            error = GLib.Error.new_literal(Gimp.PlugIn.error_quark(), msg, 0)
+            return procedure.new_return_values(Gimp.PDBStatusType.CALLING_ERROR, error)
+        # end try
+        
+        # names for the plan, arrows in the order of their groups (see groupsFromArrays)
+        arrowNames = []
+        if dryRun == True :
+            indices = list(config.get_property("styleIndices") or []) \
+                      or [0] * len(config.get_property("offsets"))
+            groupArrows = {} # style index: arrow indices, in order of first use
+            for i, styleIndex in enumerate(indices) :
+                groupArrows.setdefault(styleIndex, []).append(i)
+            # end for
+            arrowNames = [ _("arrow {}").format(i) for arrows in groupArrows.values() for i in arrows ]
+        # end if
         
-        # time1 = time.perf_counter() # debug
+    elif isSvg :
         
-        # get last stroke and error handling
-        # ----------------------------------
+        # arrows from the paths of an SVG file, read as they are drawn
+        # ------------------------------------------------------------
+        # one group per path, the file is only read by the loop below (in the thread in
+        # pipelined mode); paths with wrong parameters are skipped and reported at the end
         
-        allStrokes = thisPath.get_strokes()
+        svgFile = config.get_property("svgFile")
+        svgName = svgFile.get_path() if svgFile is not None else None
         
-        if allStrokes == [] :
-            Gimp.context_pop()
-            monImage.undo_group_end()
-            msg = _("Paths must have at least one stroke").format(procedure.get_name())
+        if svgName is None or not os.path.isfile(svgName) :
+            msg = _("Procedure '{}' needs an SVG file").format(procedure.get_name())
             error = GLib.Error.new_literal(Gimp.PlugIn.error_quark(), msg, 0)
             return procedure.new_return_values(Gimp.PDBStatusType.CALLING_ERROR, error)
         # end if
         
-        thisStroke = allStrokes[-1]
+        if styleCache is None : # the paths share a few styles, prepared once each
+            styleCache = StyleCache(STYLE_CACHE_SIZE)
+        # end if
         
-        # get the path in GIMP format
-        flatPointsList = thisPath.stroke_get_points(thisStroke)[1]
+        arrowNames = [] if dryRun == True else None # filled as the paths are read
+        svgErrors = []
+        groupsList = svgGroups(svgName, userParameters, invertPath, deltaT, arrowNames, svgErrors)
         
-        if len(flatPointsList) == 6 :
-            Gimp.context_pop()
-            monImage.undo_group_end()
-            msg = _("The last point of this path is not connected").format(procedure.get_name())
+    else :
+        
+        userPaths = monImage.get_selected_paths()
+        
+        # no path selected
+        if userPaths == [] :
+        
+            msg = _("Procedure '{}' needs at least one path").format(procedure.get_name())
             error = GLib.Error.new_literal(Gimp.PlugIn.error_quark(), msg, 0)
             return procedure.new_return_values(Gimp.PDBStatusType.CALLING_ERROR, error)
         # end if
         
-        # convert coords list to points list
-        pointsList = listToPoints(flatPointsList)
+        #--------------------------
         
-        if invertPath == True :
-            pointsList.reverse()
-        # end if
         
-        # get the new shortened and prepared path for the arrowhead
-        # ---------------------------------------------------------
+        # read and check all the paths first (GIMP calls stay in this thread)
+        # -------------------------------------------------------------------
         
-        newPointsList, axisLength, anchorX, anchorY, endAngle = designPath(arrowStyle, 
-                                    strokeWidth, pointsList, arrowLength, axisLength, 
-                                    harpoonFactor, cutDistance, tipProtruding, deltaT)
-                                    
-        # print("cut distance", cutDistance) # debug
+        # paths grouped by their parameters: { parameters key : (parameters, curves) }
+        groups = {}
+        groupNames = {} # { parameters key : path names }
         
-        #*****************************************************************************
+        for thisPath in userPaths :
         
-        # arrow tail
-        # ----------
+            # get last stroke and error handling
+            # ----------------------------------
         
-        if tailType == "crossbar" :
-            
-            endX, endY = newPointsList[0]
-            tanX, tanY = newPointsList[1]
-            
-            if endX == tanX : # avoid division by 0, find a true tangent
-                tempPoints = newPointsList[0:4]
-                tempPoints = sliceBezier(tempPoints, 0.1)
-                tanX, tanY = tempPoints[2] # we take the third point!
-                # print(tempPoints) # debug
-            # end if
-            
-            tailAngle = math.atan( ( endY - tanY ) / ( endX - tanX ) )
-            if endX - tanX < 0.0 :
-                tailAngle += math.pi # invert from atan result
-            # end if
-            
-            tailPath = buildCrossbar(monImage, endX, endY, tailAngle, tailSize)
+            allStrokes = thisPath.get_strokes()
         
-        # bullet
-        elif tailType == "bullet" :
-            
-            oriX, oriY = newPointsList[0]
-            
-            if tailStyle == "empty" :
-                
-                reversdPointsList = newPointsList.copy()
-                reversdPointsList.reverse()
-                newPointsList, placeHolder, tailCutDistance = shortenSpline(reversdPointsList, 
-                                                            tailSize / 2.0, 0.0, 0.0, deltaT)
-                newPointsList.reverse()
-            
-            tailPath = buildBullet(monImage, oriX, oriY, tailSize)
-            
-        # feathered
-        elif tailType == "feathered" and ( tailStyle == "filled" or tailStyle == "empty" ) :
-            
-            reversdPointsList = newPointsList.copy()
-            reversdPointsList.reverse()
-            newPointsList, tailSize, tailCutDistance = shortenSpline(reversdPointsList, tailSize, 0.0, 0.0, deltaT)
-            
-            cutX, cutY = newPointsList[-1]
-            tanX, tanY = newPointsList[-2]
-            
-            tailAngle = math.atan( ( cutY - tanY ) / ( cutX - tanX ) )
-            if cutX - tanX < 0.0 :
-                tailAngle += math.pi # invert from atan result
-            # end if
-            
-            newPointsList = buildPatch(newPointsList, tailSize, cutX, cutY, tailAngle)
-            tailPath = buildFeather(monImage, tailSize, cutX, cutY, tailAngle)
-            newPointsList.reverse()
-            
-        # simple feather
-        elif tailType == "feathered" and tailStyle == "simple" :
-            
-            reversdPointsList = newPointsList.copy()
-            reversdPointsList.reverse()
-            
-            n = 2 # number of wings (2 - 5)
-            tailLength = (2.0 * strokeWidth + tailSize / 2.5 + 1.0) * float(n-1) / 2.0
-            
-            # tailCutDistance unused
-            newPointsList, tailLength, tailCutDistance = shortenSpline(reversdPointsList, tailLength, 0.0, 0.0, deltaT)
-            
-            cutX, cutY = newPointsList[-1]
-            tanX, tanY = newPointsList[-2]
-            
-            tailAngle = math.atan( ( cutY - tanY ) / ( cutX - tanX ) )
-            if cutX - tanX < 0.0 :
-                tailAngle += math.pi # invert from atan result
+            if allStrokes == [] :
+                msg = _("Paths must have at least one stroke").format(procedure.get_name())
+                error = GLib.Error.new_literal(Gimp.PlugIn.error_quark(), msg, 0)
+                return procedure.new_return_values(Gimp.PDBStatusType.CALLING_ERROR, error)
             # end if
-            
-            clearSegments = 1 # max: n-1, number of intervals not drawn between wings
-            patchReduction = 1.0 - float(clearSegments) / float(n-1)
-            patchSize = tailLength * patchReduction
-            
-            newPointsList = buildPatch(newPointsList, patchSize, cutX, cutY, tailAngle)
-            tailPath = buildSimpleFeather(monImage, tailSize, cutX, cutY, tailLength, tailAngle, n)
-            newPointsList.reverse()
-            
-        # backwards arrowhead
-        elif tailType == "arrowhead" :
-            
-            reversdPointsList = newPointsList.copy()
-            reversdPointsList.reverse()
-            
-            newPointsList, tailAxisLength, tailAnchorX, tailAnchorY, tailEndAngle = designPath(tailStyle, 
-                                    strokeWidth, reversdPointsList, tailArrowLength, tailAxisLength, 
-                                    harpoonFactor, tailCutDistance, tailTipProtruding, deltaT)
-            
-            # print("tail cut distance", tailCutDistance) # debug
-            
-            tailPath = buildArrowhead(monImage, tailStyle, tailAxisLength, tailArrowLength, 
-                                    tailWingLength, tailAnchorX, tailAnchorY, tipAngle, tailEndAngle)
-            
-            newPointsList.reverse()
-            
-        #end if
-        
-        #*****************************************************************************
         
-        # complete the path and prepare for GIMP format
-        # ---------------------------------------------
+            thisStroke = allStrokes[-1]
         
-        newFlatList = flattenPoints(newPointsList)
-        newFlatList.insert(0, newFlatList[0])
-        newFlatList.insert(1, newFlatList[2])
-        newFlatList.extend(newFlatList[-2:])
+            # get the path in GIMP format
+            flatPointsList = thisPath.stroke_get_points(thisStroke)[1]
         
-        # print(newFlatList) # debug
+            if len(flatPointsList) == 6 :
+                msg = _("The last point of this path is not connected").format(procedure.get_name())
+                error = GLib.Error.new_literal(Gimp.PlugIn.error_quark(), msg, 0)
+                return procedure.new_return_values(Gimp.PDBStatusType.CALLING_ERROR, error)
+            # end if
         
-        # create path
-        newPath = Gimp.Path.new(monImage, _("body path #1"))
-        newPath.stroke_new_from_points(0, newFlatList, False)
+            # per-path parameters
+            pathName = thisPath.get_name()
+            try :
+                overrides = pathOverrides(thisPath, pathName)
+            except ValueError as overrideError :
+                msg = _("Wrong arrow parameters in path '{}': {}").format(pathName, overrideError)
+                error = GLib.Error.new_literal(Gimp.PlugIn.error_quark(), msg, 0)
+                return procedure.new_return_values(Gimp.PDBStatusType.CALLING_ERROR, error)
+            # end try
+        
+            # the curve reads the GIMP list as it is (no conversion of long paths)
+            curve = Curve.fromFlatList(flatPointsList, deltaT, overrides.pop("invertPath", invertPath))
+        
+            pathParameters = dict(userParameters)
+            pathParameters.update(overrides)
+        
+            key = tuple(sorted(pathParameters.items()))
+            if key not in groups :
+                groups[key] = (pathParameters, [])
+                groupNames[key] = []
+            # end if
+            groups[key][1].append(curve)
+            if dryRun == True : # names only for the plan
+                groupNames[key].append(pathName)
+            # end if
         
-        monImage.insert_path(newPath, None, 0)
+        # end for
         
-        # ****************************************************************************
+        groupsList = list(groups.values())
+        arrowNames = [ name for key in groups for name in groupNames[key] ]
         
-        # build arrowhead
-        arrowPath = buildArrowhead(monImage, arrowStyle, axisLength, arrowLength, wingLength, 
-                                    anchorX, anchorY, tipAngle, endAngle)
+    # end if
+    
+    arrowsNumber = None # SVG file: not known before reading it
+    if not isSvg :
+        arrowsNumber = sum( len(curves) for parameters, curves in groupsList )
+    # end if
+    
+    # compute shaft, head and tail
+    # ----------------------------
+    # group after group, the style prepared once per group
+    # in pipelined mode the next arrows are computed while GIMP draws this one
+    
+    drawMarkers = not ( arrowHeadOnly == False and arrowTailOnly == True )
+    drawShaft = arrowHeadOnly == False and arrowTailOnly == False
+    drawHead = drawMarkers
+    drawTail = not ( arrowTailOnly == False and arrowHeadOnly == True )
+    
+    # only the drawn parts are computed and turned into paths
+    parts = [ part for part, drawn in (("shaft", drawShaft), ("head", drawHead),
+                                       ("tail", drawTail)) if drawn ]
+    
+    geometries = groupedArrowGeometries(groupsList, drawMarkers, deltaT,
+                                        outlineFill == True and drawShaft, animationFrames, parts,
+                                        styleCache)
+    
+    background = None # computing thread, closed after the main loop
+    if pipelined == True and ( arrowsNumber is None or arrowsNumber > 1 or animationFrames > 0 ) :
+        background = computeInBackground(geometries, PIPELINE_QUEUE_SIZE)
+        geometries = background
+    # end if
+    
+    lineWidth = strokeWidth
+    pathNumber = 0
+    
+    # arrows entirely outside the canvas or the user selection are not drawn
+    selectionBounds = Gimp.Selection.bounds(monImage)
+    if selectionBounds[1] :
+        drawingBox = list(selectionBounds[2:6])
+    else :
+        drawingBox = [0, 0, monImage.get_width(), monImage.get_height()]
+    # end if
+    
+    drawnArrows = 0
+    culledArrows = 0
+    
+    # staging layer: the arrows drawn once on a temporary layer holding all of them, then
+    # pasted on each target layer, the only write to the user's layers; drawn with
+    # the undo stack frozen, the paste keeps what was drawn (not with kept paths, their
+    # creation must stay in the undo stack); not for an SVG file, whose paths are read
+    # as they are drawn: the size of the layer would keep all of them in memory
+    staging = stagingLayer == True and createLayer == False and animationFrames == 0 \
+              and not isSvg \
+              and all( stagingTarget(thisDrawable) for thisDrawable in targetDrawables )
+    stagingBox = None
+    
+    if staging :
         
-        # ****************************************************************************
+        geometries = list(geometries) # the size of the layer needs all the arrows
+        for style, arrowGeometry, markerElements, frame in geometries :
+            stagingBox = boxUnion(stagingBox, arrowBounds(arrowGeometry, markerElements,
+                                                          style.strokeWidth))
+        # end for
+        stagingBox = boxIntersection(stagingBox, drawingBox) # None: nothing to draw
         
-        # stroke the body
-        # ---------------
+    # end if
+    
+    stagedLayers = [] # target layers under the staging layer
+    freezeUndo = False
+    
+    if stagingBox is not None and dryRun == False :
+        stagedLayers = targetDrawables
+        targetDrawables = [ newStagingLayer(monImage, stagedLayers[-1], stagingBox) ]
+        freezeUndo = keepPaths == False and monImage.undo_is_enabled()
+    # end if
+    
+    # dry run: work per path (see arrowWork) and box of the new layer
+    plan = []
+    layerBox = None
+    userSelection = selectionBounds[1]
+    targetsNumber = max(len(targetDrawables), 1) # new layers: planned as one
+    if stagingBox is not None :
+        targetsNumber = 1 # drawn once on the staging layer
+    # end if
+    
+    
+    # MAIN LOOP - work on each selected path successively
+    # ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+    
+    # the computing thread stopped and joined whatever happens in the loop
+    try :
         
-        if arrowHeadOnly == False and arrowTailOnly == False :
+        for style, arrowGeometry, markerElements, frame in geometries :
             
-            sourceDrawable.edit_stroke_item(newPath)
-        
-        # end if
-        
-        # ****************************************************************************
-        
-        # fill or stroke the arrowhead
-        # ----------------------------
-        
-        if not ( arrowHeadOnly == False and arrowTailOnly == True ) : # then we draw head
+            if frame == 1 :
+                pathNumber += 1
+            # end if
+            
+            if dryRun == True and frame <= 1 :
+                plan.append(newWork(arrowNames[len(plan)]))
+            # end if
+            
+            if not boxesOverlap(arrowBounds(arrowGeometry, markerElements, style.strokeWidth),
+                                drawingBox) :
+                culledArrows += 1
+                if dryRun == True :
+                    plan[-1]["culled"] += 1
+                # end if
+                continue
+            # end if
             
-            if arrowStyle == "filled" :
+            drawnArrows += 1
+            
+            if dryRun == True :
                 
-                # todo: function
-                if Gimp.Selection.is_empty(monImage) :
-                    monImage.select_item(2, arrowPath) # 2: replace
-                else :
-                    monImage.select_item(3, arrowPath) # 3: intersect
-                    
-                if Gimp.Selection.is_empty(monImage) == False :
-                    sourceDrawable.edit_fill(0) # 0: FG color
-                    
-                monImage.select_item(2, savedSelection)
+                work = arrowWork(arrowGeometry, markerElements, fillColor is not None, keepPaths,
+                                 userSelection, targetsNumber)
                 
-            else :
+                # what is drawn, half the stroke width around, inside the canvas or selection
+                box = boxIntersection(arrowBounds(arrowGeometry, markerElements,
+                                                  style.strokeWidth, False), drawingBox)
+                work["area"] = boxArea(box)
+                
+                if frame > 0 : # frame layer, cropped, then the selection restored
+                    work["layers"] += 1
+                    work["selectionOps"] += 2
+                    layerBox = max(layerBox, box, key=boxArea)
+                else :
+                    layerBox = boxUnion(layerBox, box)
+                # end if
                 
-                sourceDrawable.edit_stroke_item(arrowPath)
+                addWork(plan[-1], work)
+                continue
                 
             # end if
-        
-        # fill or stroke the arrow tail
-        # -----------------------------
-        
-        if tailType != "none" and not ( arrowTailOnly == False 
-                                        and arrowHeadOnly == True ) : # then we draw tail
             
-            if tailStyle == "filled" and tailType != "crossbar" :
+            if style.strokeWidth != lineWidth :
+                lineWidth = style.strokeWidth
+                Gimp.context_set_line_width(lineWidth)
+            # end if
+            
+            # animation: each frame on its own layer, cropped to what is drawn
+            if frame > 0 :
                 
-                if Gimp.Selection.is_empty(monImage) :
-                    monImage.select_item(2, tailPath) # 2: replace
-                else :
-                    monImage.select_item(3, tailPath) # 3: intersect
-                    
-                if Gimp.Selection.is_empty(monImage) == False :
-                    sourceDrawable.edit_fill(0) # 0: FG color
-                    
-                monImage.select_item(2, savedSelection)
+                frameLayer = newArrowLayer(monImage, _("Arrow #{} frame {}").format(pathNumber, frame))
+                drawArrow(monImage, [frameLayer], arrowGeometry, markerElements, savedSelection,
+                          keepPaths, fillColor)
+                cropLayer(monImage, frameLayer)
+                monImage.select_item(2, savedSelection) # back to the user selection
+                targetDrawables = [frameLayer]
+                
+            elif freezeUndo :
+                
+                drawArrowFrozen(monImage, targetDrawables, arrowGeometry, markerElements,
+                                savedSelection, keepPaths, fillColor)
                 
             else :
                 
-                sourceDrawable.edit_stroke_item(tailPath)
+                drawArrow(monImage, targetDrawables, arrowGeometry, markerElements, savedSelection,
+                          keepPaths, fillColor)
                 
             # end if
-        # end if
-        
-        # clean unwanted paths
-        # --------------------
-        if keepPaths == False :
-            
-            monImage.remove_path(newPath)
-            monImage.remove_path(arrowPath)
-            if tailType != "none" :
-                monImage.remove_path(tailPath)
-            # end if
             
-        # end if
+        # END OF MAIN LOOP
+        # ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
         
-    # END OF MAIN LOOP
-    # ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+    finally :
+        if background is not None :
+            background.close()
+        # end if
+    # end try
+    
     
+    # paths of the SVG file left out, the others are drawn
+    if isSvg and svgErrors != [] :
+        Gimp.message(_("Paths of the SVG file not drawn:\n{}").format("\n".join(svgErrors)))
+    # end if
+    
+    if dryRun == True :
+        merges = 0
+        if stagingBox is not None : # a staging layer pasted on each target
+            layerBox = stagingBox
+            merges = len(targetDrawables)
+        # end if
+        return planReturnValues(procedure, plan, layerBox,
+                                createLayer == True and animationFrames == 0,
+                                drawnArrows, culledArrows, showPlan, merges, userSelection)
+    # end if
+    
+    # paste the staging layer
+    # -----------------------
+    
+    if stagedLayers != [] :
+        targetDrawables = pasteStagingLayer(monImage, targetDrawables[0], stagedLayers,
+                                            userSelection)
+    # end if
     
     # crop if new layer
     # -----------------
     
-    if createLayer == True :
+    if createLayer == True and animationFrames == 0 :
         
-        monImage.select_item(2, sourceDrawable)
-        boundingBox = Gimp.Selection.bounds(monImage)
-        # print("bounds : " + str(boundingBox)) # debug
-        offsetX = -boundingBox[2] # no idea why negative
-        offsetY = -boundingBox[3]
-        width = boundingBox[4] - boundingBox[2]
-        height = boundingBox[5] - boundingBox[3]
-        
-        sourceDrawable.resize(width, height, offsetX, offsetY)
+        cropLayer(monImage, targetDrawables[0])
         
     # end if
     
@@ -720,574 +1077,916 @@ def drawArrows(procedure, run_mode, monImage, drawables, config, data):
     # Finalisations
     # *************
 
-    monImage.select_item(2, savedSelection)
-    monImage.remove_channel(savedSelection)
     monImage.set_selected_paths(selectedPaths)
     
-    if sourceDrawable.is_layer() :
-        monImage.set_selected_layers([sourceDrawable])
-    elif sourceDrawable.is_channel() or sourceDrawable.is_layer_mask() :
-        monImage.set_selected_channels([sourceDrawable])
-    
-    Gimp.context_pop()
-    monImage.undo_group_end()
+    # layers and channels (masks) selected together: each setter gets its own
+    selectedLayers = [ thisDrawable for thisDrawable in targetDrawables if thisDrawable.is_layer() ]
+    selectedChannels = [ thisDrawable for thisDrawable in targetDrawables
+                         if thisDrawable.is_channel() or thisDrawable.is_layer_mask() ]
+    if selectedLayers != [] : # none: animation, all frames culled
+        monImage.set_selected_layers(selectedLayers)
+    # end if
+    if selectedChannels != [] :
+        monImage.set_selected_channels(selectedChannels)
+    # end if
     
     
     # print("calc time:", accumulatedCalcTime) # debug
     
-    return procedure.new_return_values(Gimp.PDBStatusType.SUCCESS, GLib.Error())
-
+    # run summary
+    returnValues = procedure.new_return_values(Gimp.PDBStatusType.SUCCESS, GLib.Error())
+    returnValues.remove(1)
+    returnValues.insert(1, GObject.Value(GObject.TYPE_INT, drawnArrows))
+    returnValues.remove(2)
+    returnValues.insert(2, GObject.Value(GObject.TYPE_INT, culledArrows))
+    
+    return returnValues
 
-#*************************************************************************************
-#*************************************************************************************
 
+# contact sheet
+#---------------
+# the last stroke of the first selected path drawn in every head style (rows, times
+# the swept values) and tail (columns), on a new image; the curve and its arc length
+# table are made once, only the heads and tails are computed for each cell
 
-def buildArrowhead(monImage, arrowStyle, axisLength, arrowLength, wingLength, 
-                    anchorX, anchorY, tipAngle, endAngle) :
+def drawSheet(procedure, run_mode, monImage, config) :
     
-    # construct the arrowhead
-    # -----------------------
+    strokeWidth     = config.get_property("strokeWidth")
+    markerSpacing   = config.get_property("markerSpacing")
+    invertPath      = config.get_property("invertPath")
+    outlineFill     = config.get_property("outlineFill")
+    sweepParameter  = config.get_property("sweepParameter")
+    cellSpacing     = config.get_property("cellSpacing")
+    sheetLabels     = config.get_property("sheetLabels")
     
-    tipX = anchorX + math.cos(endAngle) * axisLength
-    tipY = anchorY + math.sin(endAngle) * axisLength
-    
-    point1X = tipX - wingLength * math.cos( endAngle + tipAngle/2 )
-    point1Y = tipY - wingLength * math.sin( endAngle + tipAngle/2 )
-    point2X = tipX - wingLength * math.cos( endAngle - tipAngle/2 )
-    point2Y = tipY - wingLength * math.sin( endAngle - tipAngle/2 )
-    
-    if arrowStyle == "filled" or arrowStyle == "empty" :
-        
-        arrowHeadPoints = [
-                    tipX,
-                    tipY,
-                    tipX,
-                    tipY,
-                    tipX,
-                    tipY,
-                    point1X,
-                    point1Y,
-                    point1X,
-                    point1Y,
-                    point1X,
-                    point1Y,
-                    anchorX,
-                    anchorY,
-                    anchorX,
-                    anchorY,
-                    anchorX,
-                    anchorY,
-                    point2X,
-                    point2Y,
-                    point2X,
-                    point2Y,
-                    point2X,
-                    point2Y
-                    ]
-        
-        arrowPath = Gimp.Path.new(monImage, _("arrow head #1"))
-        arrowPath.stroke_new_from_points(0, arrowHeadPoints, True)
-        
-    elif arrowStyle == "simple" :
-        
-        arrowHeadPoints = [
-                    point1X,
-                    point1Y,
-                    point1X,
-                    point1Y,
-                    point1X,
-                    point1Y,
-                    tipX,
-                    tipY,
-                    tipX,
-                    tipY,
-                    tipX,
-                    tipY,
-                    point2X,
-                    point2Y,
-                    point2X,
-                    point2Y,
-                    point2X,
-                    point2Y
-                    ]
-        
-        arrowPath = Gimp.Path.new(monImage, _("arrow head #1"))
-        arrowPath.stroke_new_from_points(0, arrowHeadPoints, False)
-        
+    # path and sweep values
+    # ---------------------
+    
+    userPaths = monImage.get_selected_paths()
+    
+    if userPaths == [] :
+        msg = _("Procedure '{}' needs at least one path").format(procedure.get_name())
+        error = GLib.Error.new_literal(Gimp.PlugIn.error_quark(), msg, 0)
+        return procedure.new_return_values(Gimp.PDBStatusType.CALLING_ERROR, error)
     # end if
     
-    monImage.insert_path(arrowPath, None, 0)
+    allStrokes = userPaths[0].get_strokes()
     
-    return arrowPath
+    if allStrokes == [] :
+        msg = _("Paths must have at least one stroke")
+        error = GLib.Error.new_literal(Gimp.PlugIn.error_quark(), msg, 0)
+        return procedure.new_return_values(Gimp.PDBStatusType.CALLING_ERROR, error)
+    # end if
     
-#*************************************************************************************
-
-
-def buildCrossbar(monImage, oriX, oriY, tailAngle, tailSize) :
+    flatPointsList = userPaths[0].stroke_get_points(allStrokes[-1])[1]
     
-    point1X = oriX + math.cos(tailAngle + math.pi * 0.5) * tailSize * 0.5
-    point1Y = oriY + math.sin(tailAngle + math.pi * 0.5) * tailSize * 0.5
-    point2X = oriX + math.cos(tailAngle - math.pi * 0.5) * tailSize * 0.5
-    point2Y = oriY + math.sin(tailAngle - math.pi * 0.5) * tailSize * 0.5
+    if len(flatPointsList) == 6 :
+        msg = _("The last point of this path is not connected")
+        error = GLib.Error.new_literal(Gimp.PlugIn.error_quark(), msg, 0)
+        return procedure.new_return_values(Gimp.PDBStatusType.CALLING_ERROR, error)
+    # end if
     
-    crossbarPoints = [
-                    point1X,
-                    point1Y,
-                    point1X,
-                    point1Y,
-                    point1X,
-                    point1Y,
-                    point2X,
-                    point2Y,
-                    point2X,
-                    point2Y,
-                    point2X,
-                    point2Y
-                    ]
+    try :
+        sweepValues = sheetSweepValues(sweepParameter, config.get_property("sweepValues"))
+    except ValueError as sweepError :
+        msg = _("Procedure '{}': {}").format(procedure.get_name(), sweepError)
+        error = GLib.Error.new_literal(Gimp.PlugIn.error_quark(), msg, 0)
+        return procedure.new_return_values(Gimp.PDBStatusType.CALLING_ERROR, error)
+    # end try
     
-    tailPath = Gimp.Path.new(monImage, _("arrow tail #1"))
-    tailPath.stroke_new_from_points(0, crossbarPoints, False)
-    monImage.insert_path(tailPath, None, 0)
+    curve = Curve.fromFlatList(flatPointsList, DELTA_T, invertPath)
     
-    return tailPath
-
-
-#*************************************************************************************
-
-
-def buildBullet(monImage, oriX, oriY, tailSize) :
+    # styles of the cells, row after row
+    # ----------------------------------
     
-    radius = tailSize / 2.0
+    userParameters = {"strokeWidth": strokeWidth, "wingLen": config.get_property("wingLen"),
+                      "tipAngle": config.get_property("tipAngle"),
+                      "harpoonFactor": config.get_property("harpoonFactor"),
+                      "tailSize": config.get_property("tailSize"),
+                      "tailUnitRelative": config.get_property("tailUnitRelative")}
     
-    tailPath = Gimp.Path.new(monImage, _("arrow tail #1"))
-    tailPath.bezier_stroke_new_ellipse(oriX, oriY, radius, radius, 0.0)
+    rows = [ (arrowStyle, value) for value in sweepValues for arrowStyle in SHEET_STYLES ]
+    styles = []
     
-    monImage.insert_path(tailPath, None, 0)
+    for arrowStyle, value in rows :
+        for tailType, tailStyle in SHEET_TAILS :
+            parameters = dict(userParameters, arrowStyle=arrowStyle, tailType=tailType,
+                              tailStyle=tailStyle)
+            if value is not None :
+                parameters[sweepParameter] = value
+            # end if
+            styles.append(prepareStyle(**parameters))
+        # end for
+    # end for
     
-    return tailPath
-
-#*************************************************************************************
-
-
-def buildFeather(monImage, tailWidth, anchorX, anchorY, tailAngle) :
-    
-    tailWidth /= 2.0
-    wingAngle = math.pi / 4.0
-    lengthRatio = 2.0
-    tailLength = lengthRatio * tailWidth
-    wingLength = tailWidth / math.cos(wingAngle)
-    
-    point1X = anchorX + wingLength * math.cos(tailAngle + wingAngle)
-    point1Y = anchorY + wingLength * math.sin(tailAngle + wingAngle)
-    point2X = point1X + tailLength * math.cos(tailAngle)
-    point2Y = point1Y + tailLength * math.sin(tailAngle)
-    
-    point3X = anchorX + tailLength * math.cos(tailAngle)
-    point3Y = anchorY + tailLength * math.sin(tailAngle)
-    
-    point5X = anchorX + wingLength * math.cos(tailAngle - wingAngle)
-    point5Y = anchorY + wingLength * math.sin(tailAngle - wingAngle)
-    point4X = point5X + tailLength * math.cos(tailAngle)
-    point4Y = point5Y + tailLength * math.sin(tailAngle)
-    
-    featherPoints = [
-                    anchorX,
-                    anchorY,
-                    anchorX,
-                    anchorY,
-                    anchorX,
-                    anchorY,
-                    point1X,
-                    point1Y,
-                    point1X,
-                    point1Y,
-                    point1X,
-                    point1Y,
-                    point2X,
-                    point2Y,
-                    point2X,
-                    point2Y,
-                    point2X,
-                    point2Y,
-                    point3X,
-                    point3Y,
-                    point3X,
-                    point3Y,
-                    point3X,
-                    point3Y,
-                    point4X,
-                    point4Y,
-                    point4X,
-                    point4Y,
-                    point4X,
-                    point4Y,
-                    point5X,
-                    point5Y,
-                    point5X,
-                    point5Y,
-                    point5X,
-                    point5Y
-                    ]
-                    
-    tailPath = Gimp.Path.new(monImage, _("arrow tail #1"))
-    tailPath.stroke_new_from_points(0, featherPoints, True)
-    monImage.insert_path(tailPath, None, 0)
-    
-    return tailPath
+    variants = list(styleVariants(curve, styles, markerSpacing, DELTA_T, outlineFill == True))
     
-
-#*************************************************************************************
-
-
-def buildSimpleFeather(monImage, tailWidth, anchorX, anchorY, tailLength, tailAngle, n) :
+    # grid: every cell holds the union of the boxes of all the arrows
+    # ---------------------------------------------------------------
+    
+    cellBox = None
+    for style, arrowGeometry, markerElements in variants :
+        cellBox = boxUnion(cellBox, arrowBounds(arrowGeometry, markerElements,
+                                                style.strokeWidth, False))
+    # end for
+    
+    cellWidth = int(math.ceil(cellBox[2] - cellBox[0] + cellSpacing))
+    cellHeight = int(math.ceil(cellBox[3] - cellBox[1] + cellSpacing))
+    
+    labelWidth = 0
+    labelHeight = 0
+    if sheetLabels == True :
+        labelWidth = int(SHEET_LABEL_SIZE * 10)
+        labelHeight = int(SHEET_LABEL_SIZE * 3)
+    # end if
     
-    tailWidth /= 2.0
-    wingAngle = math.pi / 4.0
-    wingLength = tailWidth / math.sin(wingAngle)
-    reduction = 0.1 * wingLength
+    sheetWidth = labelWidth + len(SHEET_TAILS) * cellWidth + int(math.ceil(cellSpacing))
+    sheetHeight = labelHeight + len(rows) * cellHeight + int(math.ceil(cellSpacing))
     
-    tailPath = Gimp.Path.new(monImage, _("arrow tail #1"))
+    # new image, white background and a layer for the arrows, undo off until the end
+    # -------------------------------------------------------------------------------
     
-    i = 0
+    sheetImage = Gimp.Image.new(sheetWidth, sheetHeight, 0) # 0: RGB
+    sheetImage.undo_disable() # nothing to undo in a new image
     
-    while i <= n - 1 :
+    try :
+        
+        background = Gimp.Layer.new(sheetImage, _("Background"), sheetWidth, sheetHeight,
+                                    0, 100.0, 28) # 0: RGB, 28: normal
+        sheetImage.insert_layer(background, None, 0)
+        background.fill(Gimp.FillType.WHITE)
+        
+        arrowLayer = newArrowLayer(sheetImage, _("Arrows"))
+        
+        drawSheetCells(sheetImage, arrowLayer, config, variants, rows, cellBox, cellWidth,
+                       cellHeight, labelWidth, labelHeight)
         
-        wingRatio = float(i) / float(n-1)
-        thisWingLength = wingLength * ( 0.8 - ( 0.75 * math.sqrt(float(n) / 4.0) * wingRatio )**2.0 + 0.2**2.0 ) # 0.775
+        sheetImage.set_selected_layers([arrowLayer])
+        
+    finally :
+        sheetImage.undo_enable()
+    # end try
+    
+    if run_mode == Gimp.RunMode.INTERACTIVE :
+        Gimp.Display.new(sheetImage)
+    # end if
+    
+    returnValues = procedure.new_return_values(Gimp.PDBStatusType.SUCCESS, GLib.Error())
+    returnValues.remove(1)
+    returnValues.insert(1, GObject.Value(GObject.TYPE_INT, len(variants)))
+    returnValues.remove(4)
+    returnValues.insert(4, GObject.Value(Gimp.Image, sheetImage))
+    
+    return returnValues
+
+
+# cells and labels of the contact sheet on arrowLayer, context and selection saved
+# around them and back as they were whatever happens (as in drawInImage)
+def drawSheetCells(sheetImage, arrowLayer, config, variants, rows, cellBox, cellWidth,
+                   cellHeight, labelWidth, labelHeight) :
+    
+    strokeWidth     = config.get_property("strokeWidth")
+    keepPaths       = config.get_property("keepPaths")
+    sweepParameter  = config.get_property("sweepParameter")
+    cellSpacing     = config.get_property("cellSpacing")
+    
+    Gimp.context_push()
+    savedSelection = sheetImage.get_selection().save(sheetImage)
+    
+    try :
         
-        point1X = anchorX + thisWingLength * math.cos(tailAngle + wingAngle)
-        point1Y = anchorY + thisWingLength * math.sin(tailAngle + wingAngle)
-        point2X = anchorX + thisWingLength * math.cos(tailAngle - wingAngle)
-        point2Y = anchorY + thisWingLength * math.sin(tailAngle - wingAngle)
+        setArrowContext(config.get_property("arrowsColor"), strokeWidth)
         
-        featherPoints = [
-                        point1X,
-                        point1Y,
-                        point1X,
-                        point1Y,
-                        point1X,
-                        point1Y,
-                        anchorX,
-                        anchorY,
-                        anchorX,
-                        anchorY,
-                        anchorX,
-                        anchorY,
-                        point2X,
-                        point2Y,
-                        point2X,
-                        point2Y,
-                        point2X,
-                        point2Y
-                        ]
+        fillColor = None
+        if config.get_property("rasterFill") == True :
+            fillColor = Gimp.context_get_foreground().get_rgba()
+        # end if
         
-        tailPath.stroke_new_from_points(0, featherPoints, False)
+        # cells
+        # -----
         
-        anchorX += math.cos(tailAngle) * tailLength / (float(n)-1)
-        anchorY += math.sin(tailAngle) * tailLength / (float(n)-1)
+        lineWidth = strokeWidth
         
+        for index, (style, arrowGeometry, markerElements) in enumerate(variants) :
+            
+            row, column = divmod(index, len(SHEET_TAILS))
+            dx = labelWidth + cellSpacing + column * cellWidth - cellBox[0]
+            dy = labelHeight + cellSpacing + row * cellHeight - cellBox[1]
+            
+            if style.strokeWidth != lineWidth :
+                lineWidth = style.strokeWidth
+                Gimp.context_set_line_width(lineWidth)
+            # end if
+            
+            drawArrow(sheetImage, [arrowLayer], translatedArrow(arrowGeometry, dx, dy),
+                      [ translatedElement(element, dx, dy) for element in markerElements ],
+                      savedSelection, keepPaths, fillColor)
+            
+        # end for
         
-        i += 1
-        # wingLength -= reduction * float(i)
+        # labels: tails above the columns, head styles (and swept values) left of the rows
+        if config.get_property("sheetLabels") == True :
+            
+            font = Gimp.context_get_font()
+            
+            for column, (tailType, tailStyle) in enumerate(SHEET_TAILS) :
+                text = tailType if tailStyle == "default" else "{}\n{}".format(tailType, tailStyle)
+                addSheetLabel(sheetImage, text, font,
+                              labelWidth + cellSpacing + column * cellWidth, cellSpacing / 2.0)
+            # end for
+            
+            for row, (arrowStyle, value) in enumerate(rows) :
+                text = arrowStyle
+                if value is not None :
+                    text += "\n{} {:g}".format(SHEET_SWEEP_LABELS[sweepParameter], value)
+                # end if
+                addSheetLabel(sheetImage, text, font,
+                              cellSpacing / 2.0, labelHeight + cellSpacing + row * cellHeight)
+            # end for
+            
+        # end if
         
-    # end while
+    finally :
+        sheetImage.remove_channel(savedSelection)
+        Gimp.context_pop()
+    # end try
     
-    monImage.insert_path(tailPath, None, 0)
     
-    return tailPath
+# values of the swept parameter from a text like "-5 0 2.5", checked as the per-path
+# parameters; [None] when nothing is swept
+def sheetSweepValues(sweepParameter, text) :
     
-
-#*************************************************************************************
+    if sweepParameter == "none" :
+        return [None]
+    # end if
+    
+    values = [ parseOverrides("{}={}".format(sweepParameter, item))[sweepParameter]
+               for item in text.replace(",", " ").split() ]
+    
+    if values == [] :
+        raise ValueError(_("no value to sweep"))
+    # end if
+    
+    return values
 
 
-# distance between two points
-def distance(p1, p2) :
+# text layer of the contact sheet, its top left corner at x, y
+def addSheetLabel(sheetImage, text, font, x, y) :
     
-    dist = math.hypot(p2[1] - p1[1], p2[0] - p1[0])
+    textLayer = Gimp.TextLayer.new(sheetImage, text, font, SHEET_LABEL_SIZE, Gimp.Unit.pixel())
+    sheetImage.insert_layer(textLayer, None, 0)
+    textLayer.set_offsets(int(x), int(y))
     
-    return dist
+    return textLayer
 
 
 #*************************************************************************************
+#*************************************************************************************
 
 
-# convert coords list to points list
-def listToPoints(flatPointsList) :
+# resident mode
+#---------------
+# the service adds the served procedures (temporary procedures of this plug-in), then
+# answers their calls until it is stopped; the modules, the plug-in process and the
+# prepared styles stay in memory between the calls
+
+def startService(procedure, config, data) :
     
-    last = len(flatPointsList) / 2 - 1
-    i = 1
-    pointsList = []
+    plugIn = procedure.get_plug_in()
     
-    while i < last :
+    for name, baseName in SERVED_PROCEDURES.items() :
+        
+        served = Gimp.ImageProcedure.new(plugIn, name, Gimp.PDBProcType.TEMPORARY,
+                                         drawArrows, None)
+        served.set_image_types("*")
+        served.set_documentation(_("Resident {}").format(baseName),
+                                 _("Same as {}, answered by the arrow service").format(baseName),
+                                 name)
+        served.set_attribution("Pascal L.", "Pascal L.", "2025")
         
-        thisPoint = [flatPointsList[2*i], flatPointsList[2*i+1]]
-        pointsList.append(thisPoint)
-        i += 1
+        if baseName == BULK_PROCEDURE :
+            addBulkArguments(served)
+        # end if
+        addArrowArguments(served)
+        
+        plugIn.add_temp_procedure(served)
         
+    # end for
+    
+    stop = Gimp.Procedure.new(plugIn, SERVICE_STOP_PROCEDURE, Gimp.PDBProcType.TEMPORARY,
+                              stopService, None)
+    stop.set_documentation(_("Stop the resident arrow service"),
+                           _("Remove the served procedures and end the service"),
+                           SERVICE_STOP_PROCEDURE)
+    stop.set_attribution("Pascal L.", "Pascal L.", "2025")
+    addRunModeArgument(stop)
+    plugIn.add_temp_procedure(stop)
+    
+    # the caller gets the control back, the calls are answered in this loop
+    serviceState["running"] = True
+    plugIn.persistent_enable()
+    
+    while serviceState["running"] :
+        plugIn.persistent_process(0) # 0: wait for the next call
     # end while
+    
+    for name in list(SERVED_PROCEDURES) + [SERVICE_STOP_PROCEDURE] :
+        plugIn.remove_temp_procedure(name)
+    # end for
+    serviceState["styles"].clear()
+    
+    return procedure.new_return_values(Gimp.PDBStatusType.SUCCESS, GLib.Error())
+
+
+def stopService(procedure, config, data) :
+    
+    serviceState["running"] = False
+    
+    return procedure.new_return_values(Gimp.PDBStatusType.SUCCESS, GLib.Error())
 
-    return pointsList
 
 #*************************************************************************************
 
 
-# flatten points list to list of coordinates for GIMP path format
-def flattenPoints(pointsList) :
-    
-    flatList = []
+# run a generator in a thread, its items computed ahead while the caller works on the
+# previous ones (at most queueSize of them); exceptions are raised in the caller; the
+# thread is stopped and joined when the items run out or the caller closes it
+def computeInBackground(generator, queueSize) :
+    
+    results = queue.Queue(queueSize)
+    stop = threading.Event()
+    done = object()
+    
+    # False when the caller stopped reading
+    def send(entry) :
+        while not stop.is_set() :
+            try :
+                results.put(entry, timeout=0.1)
+                return True
+            except queue.Full :
+                pass
+        # end while
+        return False
+    
+    def produce() :
+        try :
+            for item in generator :
+                if not send((item, None)) :
+                    return
+            # end for
+            send((done, None))
+        except Exception as error :
+            send((done, error))
+        # end try
+    
+    worker = threading.Thread(target=produce, daemon=True)
+    worker.start()
+    
+    try :
+        while True :
+            item, error = results.get()
+            if error is not None :
+                raise error
+            if item is done :
+                break
+            yield item
+        # end while
+    finally :
+        stop.set()
+        worker.join()
+    # end try
     
-    for thisPoint in pointsList :
-        
-        flatList += thisPoint
-        
-    # end for
     
-    return flatList
-
-
 #*************************************************************************************
 
 
-def shrinkArrowhead(style, strokeWidth, tipAngle, arrowLength, axisLength, wingLength) :
+# parameters of one path, from its name ("... arrow: style=empty wing=30") and from an
+# "arrow" parasite (same text), the parasite wins; only the paths whose name has the
+# "arrow:" mark are looked at (no GIMP call for the others); raises ValueError on
+# wrong values
+def pathOverrides(thisPath, pathName) :
     
-    alpha = tipAngle / 2.0
+    overrides = {}
     
-    if style == "simple" :
-        
-        tipProtruding = strokeWidth * 0.5 / math.sin(alpha)
-        wingProtruding = 0.0
-        ratio = ratio = max(arrowLength - tipProtruding, 2.0) / arrowLength
-        
-    elif style == "empty" :
-        
-        tipProtruding = strokeWidth * 0.5 / math.sin(alpha)
-        
-        # print("alpha", alpha, "axis", axisLength, "wing", wingLength) # debug
-        
-        # wing / back protruding
-        if arrowLength == axisLength : # harpoon factor of 1.0
-            wingProtruding = 0.5 * strokeWidth
-            
-        if arrowLength > axisLength :
-            gamma = math.atan(math.sin(alpha) / ( math.cos(alpha) - axisLength/wingLength ) )
-            wingProtruding = ( 0.5 * strokeWidth * math.cos( 0.5 * (gamma + alpha) ) 
-                                                 / math.sin( 0.5 * (gamma - alpha) ) )
-            ratio = max(arrowLength - tipProtruding - wingProtruding, 2.0) / arrowLength
-            
-        else  : # arrowLength < axisLength
-            a = axisLength - arrowLength
-            b = wingLength * math.sin(alpha)
-            wingProtruding = strokeWidth * 0.5 * math.sqrt( pow(a / b, 2.0) + 1.0 )
-            ratio = max(axisLength - tipProtruding - wingProtruding, 2.0) / axisLength
-            
-        # end if
-        
-        
-    else :
-        tipProtruding = 0.0
-        wingProtruding = 0.0
-        ratio = 1.0
+    if "arrow:" not in pathName :
+        return overrides
     # end if
     
-    # print("tip prot.", tipProtruding, "wing prot.", wingProtruding, "length", arrowLength * ratio) # debug
+    overrides.update(parseOverrides(pathName))
+    
+    parasite = thisPath.get_parasite("arrow")
+    if parasite is not None :
+        overrides.update(parseOverrides(bytes(parasite.get_data()).decode("utf-8")))
+    # end if
+    
+    return overrides
+    
     
-    return tipProtruding, arrowLength * ratio, axisLength * ratio, wingLength * ratio
-
 #*************************************************************************************
 
 
-def designPath(arrowStyle, strokeWidth, pointsList, arrowLength, axisLength, harpoonFactor, 
-                cutDistance, tipProtruding, deltaT) :
+# draw one arrow on a drawable: shaft, head, tail and repeated heads
+# draw the parts present in arrowGeometry (see computeArrow), nothing is built for the
+# missing ones
+def drawArrow(monImage, targetDrawables, arrowGeometry, markerElements, savedSelection,
+              keepPaths, fillColor=None) :
     
-    # print("arrow style:", arrowStyle) # debug
+    # build the paths
+    # ---------------
+    # once for all the target drawables
+    # in outline mode the shaft outline includes the merged head and tail
+    # with a fill color, small filled elements are rasterised: paths only built to be
+    # kept; the outline (as long as the arrow) is filled through the selection
     
-    # get the new spline cut at the right place
-    # -----------------------------------------
+    outline = arrowGeometry.outline
+    merged = arrowGeometry.merged
     
-    newPointsList, axisLength, cutDistance = shortenSpline(pointsList, axisLength, 
-                                                        cutDistance, tipProtruding, deltaT)
+    headElement = arrowGeometry.head if "head" not in merged else None
+    tailElement = arrowGeometry.tail if "tail" not in merged else None
     
-    cutX, cutY = newPointsList[-1]
-    tanX, tanY = newPointsList[-2]
-    # print(newPointsList) # debug
+    newPath = None
+    if outline is not None :
+        newPath = buildElementPath(monImage, _("arrow outline #1"), outline)
+    elif arrowGeometry.shaft is not None :
+        newPath = buildShaftPath(monImage, arrowGeometry.shaft)
+    # end if
     
-    # determine the path angle at cut point
-    # ----------------------------------------
+    arrowPath = None
+    if headElement is not None :
+        arrowPath = optionalElementPath(monImage, _("arrow head #1"), headElement,
+                                        fillColor, keepPaths)
+    # end if
     
-    if cutX == tanX and cutY > tanY :
-        endAngle = math.pi * 0.5
-    elif cutX == tanX and cutY < tanY :
-        endAngle = math.pi * 1.5
-    else :
-        endAngle = math.atan( ( cutY - tanY ) / ( cutX - tanX ) )
+    tailPath = None
+    if tailElement is not None :
+        tailPath = optionalElementPath(monImage, _("arrow tail #1"), tailElement,
+                                       fillColor, keepPaths)
+    # end if
+    
+    rasterElements = [] if fillColor is not None else None
+    
+    # stroke the body
+    # ---------------
+    
+    if outline is not None :
+        drawElementPath(monImage, targetDrawables, newPath, outline, savedSelection)
+    elif newPath is not None :
+        for thisDrawable in targetDrawables :
+            thisDrawable.edit_stroke_item(newPath)
+        # end for
     # end if
     
-    if cutX < tanX :
-        endAngle += math.pi # invert from atan result
+    # fill or stroke the arrowhead and the arrow tail
+    # -----------------------------------------------
+    
+    if headElement is not None :
+        drawElementPath(monImage, targetDrawables, arrowPath, headElement, savedSelection,
+                        rasterElements)
     # end if
     
-    # anchor point of the arrowhead
+    if tailElement is not None :
+        drawElementPath(monImage, targetDrawables, tailPath, tailElement, savedSelection,
+                        rasterElements)
+    # end if
     
-    anchorX = cutX + math.cos(endAngle) * cutDistance
-    anchorY = cutY + math.sin(endAngle) * cutDistance
+    # repeated arrowheads along the path
+    # ----------------------------------
     
-    # add a patch at anchor point to remove visible spacing between head and body
-    # ----------------------------------------------------------------------------
-    # (todo: define function for that...)
+    markerPaths = []
     
-    if arrowStyle == "simple" :
-        
-        patchLength = arrowLength / 2.0 - strokeWidth / 2.0 # changed from ... - strokeWidth
-        # todo: limit patch length
-        
-    elif arrowStyle == "filled" : 
-        
-        patchLength = harpoonFactor**2 * strokeWidth
+    for markerElement in markerElements :
         
-    else :
+        markerPath = optionalElementPath(monImage, _("arrow head #1"), markerElement,
+                                         fillColor, keepPaths)
+        drawElementPath(monImage, targetDrawables, markerPath, markerElement, savedSelection,
+                        rasterElements)
+        markerPaths.append(markerPath)
         
-        patchLength = 0.0
+    # end for
     
+    # the rasterised elements in as few buffer updates as their boxes allow
+    if rasterElements :
+        for elements in rasterBatches(rasterElements) :
+            fillPixels(monImage, targetDrawables, elements, fillColor, savedSelection)
+        # end for
     # end if
     
-    patchLength += cutDistance
+    # clean unwanted paths
+    # --------------------
     
-    if patchLength > 0.0 :
+    if keepPaths == False :
         
-        newPointsList = buildPatch(newPointsList, patchLength, cutX, cutY, endAngle)
+        for thisPath in [newPath, arrowPath, tailPath] + markerPaths :
+            if thisPath is not None :
+                monImage.remove_path(thisPath)
+        # end for
+        
+    # end if
+    
+    
+# drawArrow with the undo stack frozen (staging layer, see drawInImage), thawed
+# whatever happens
+def drawArrowFrozen(monImage, *arguments) :
+    
+    monImage.undo_freeze()
+    try :
+        drawArrow(monImage, *arguments)
+    finally :
+        monImage.undo_thaw()
+    # end try
+    
     
+#*************************************************************************************
+
+
+# dry run
+#---------
+
+# counted for each path: arrows (or frames) drawn and culled, paths created, strokes,
+# fills through the selection, raster fills, selection operations, new layers, pastes
+# of the staging layer, area
+PLAN_COUNTS = ("arrows", "culled", "paths", "strokes", "fills", "pixelWrites",
+               "selectionOps", "layers", "merges", "area")
+
+
+def newWork(name=None) :
+
+    work = dict.fromkeys(PLAN_COUNTS, 0)
+    if name is not None :
+        work["name"] = name
     # end if
     
-    return newPointsList, axisLength, anchorX, anchorY, endAngle
+    return work
 
 
-#*************************************************************************************
+def addWork(total, work) :
 
+    for count in PLAN_COUNTS :
+        total[count] += work[count]
+    # end for
+
+
+# what drawArrow does for one arrow, without GIMP: same parts, same path, stroke, fill
+# and selection calls (rasterised: filled elements written as pixels); targets: number
+# of drawables stroked and filled with the same paths
+def arrowWork(arrowGeometry, markerElements, rasterised, keepPaths, userSelection, targets=1) :
+
+    work = newWork()
+    work["arrows"] = 1
+    
+    outline = arrowGeometry.outline
+    merged = arrowGeometry.merged
+    
+    elements = []
+    if outline is not None : # never rasterised
+        work["paths"] += 1
+        work["fills"] += targets
+        work["selectionOps"] += 2
+    elif arrowGeometry.shaft is not None :
+        work["paths"] += 1
+        work["strokes"] += targets
+    # end if
+    
+    for part in ("head", "tail") :
+        if getattr(arrowGeometry, part) is not None and part not in merged :
+            elements.append(getattr(arrowGeometry, part))
+    # end for
+    
+    rasterElements = []
+    
+    for element in list(elements) + list(markerElements) :
+    
+        if rasterised and fitsRaster(element) :
+            rasterElements.append(element)
+            if keepPaths == True :
+                work["paths"] += 1
+            # end if
+        elif element["filled"] : # selection from the path, then back to the user's
+            work["paths"] += 1
+            work["fills"] += targets
+            work["selectionOps"] += 2
+        else :
+            work["paths"] += 1
+            work["strokes"] += targets
+        # end if
+    
+    # end for
+    
+    # per batch, one buffer write per drawable, inside a rectangle selection (intersected
+    # with the user's), then back to the user's
+    for batch in rasterBatches(rasterElements) :
+        work["pixelWrites"] += targets
+        work["selectionOps"] += targets * (2 if userSelection else 1) + 1
+    # end for
+    
+    return work
 
-def buildPatch(pointsList, patchLength, cutX, cutY, endAngle) :
+
+# return values of a dry run: the plan as JSON text, shown in a message when interactive
+# merges: pastes of the staging layer on the target layers (see drawInImage),
+# userSelection: True when the selection is cleared for them
+def planReturnValues(procedure, plan, layerBox, newLayer, drawnArrows, culledArrows,
+                     showPlan, merges=0, userSelection=False) :
+    
+    total = newWork()
+    for work in plan :
+        addWork(total, work)
+    # end for
+    
+    if newLayer :
+        total["layers"] += 1
+        total["selectionOps"] += 1 # crop
+    # end if
+    if merges > 0 :
+        total["layers"] += 1 # staging layer
+        total["selectionOps"] += int(userSelection) # selection cleared for its copy
+    # end if
+    total["merges"] += merges
+    total["selectionOps"] += 1 # user selection restored
+    
+    layerSize = None
+    if layerBox is not None :
+        layerSize = [ int(math.ceil(layerBox[2])) - int(math.floor(layerBox[0])),
+                      int(math.ceil(layerBox[3])) - int(math.floor(layerBox[1])) ]
+    # end if
     
-    patchEndX   = cutX + math.cos(endAngle) * patchLength
-    patchEndY   = cutY + math.sin(endAngle) * patchLength
+    result = {"paths": plan, "total": total, "layerSize": layerSize}
     
-    patchPathPoints = [
-                [cutX, cutY],
-                [patchEndX, patchEndY],
-                [patchEndX, patchEndY]
-                ]
+    if showPlan :
+        Gimp.message(planText(result))
+    # end if
+    
+    returnValues = procedure.new_return_values(Gimp.PDBStatusType.SUCCESS, GLib.Error())
+    returnValues.remove(1)
+    returnValues.insert(1, GObject.Value(GObject.TYPE_INT, drawnArrows))
+    returnValues.remove(2)
+    returnValues.insert(2, GObject.Value(GObject.TYPE_INT, culledArrows))
+    returnValues.remove(3)
+    returnValues.insert(3, GObject.Value(GObject.TYPE_STRING, json.dumps(result)))
+    
+    return returnValues
+
 
-    pointsList.extend(patchPathPoints)
+def planText(result) :
+
+    line = _("{arrows} arrows ({culled} culled), {paths} paths, {strokes} strokes, {fills} fills, "
+             "{pixelWrites} pixel writes, {selectionOps} selection operations, {layers} layers, "
+             "{merges} merges, {area} px touched")
+    
+    lines = [ _("Dry run, nothing drawn.") ]
+    lines += [ "{}: {}".format(work["name"], line.format(**work)) for work in result["paths"] ]
+    lines.append( _("Total: {}").format(line.format(**result["total"])) )
+    
+    if result["layerSize"] is not None :
+        lines.append( _("Largest new layer: {} x {} px").format(*result["layerSize"]) )
+    # end if
     
-    return pointsList
+    return "\n".join(lines)
 
 
 #*************************************************************************************
 
 
-def shortenSpline(pointsList, axisLength, cutDistance, tipProtruding, deltaT) :
+# context of the arrows (the caller pushes and pops it)
+def setArrowContext(arrowsColor, strokeWidth) :
     
-    n = (len(pointsList) - 1) / 3 # segments number of spline
-    u = float(n)          # intitial u, parameter used to find points along the spline
-    cumulDist = 0.0
-    lastP = pointsList[-1]
-    targetLength = axisLength + cutDistance + tipProtruding
+    if arrowsColor == "black" :
+        Gimp.context_set_foreground(Gimp.color_parse_name("black"))
     
-    counter = 0                 # debug
-    time1 = time.perf_counter() # time debug
+    Gimp.context_set_antialias(True)
+    Gimp.context_set_feather(False)
     
-    # deltaL = 0.0 # fallback
+    Gimp.context_set_line_width(strokeWidth)
+    Gimp.context_set_line_join_style(0) # MITER
+    Gimp.context_set_line_cap_style(0)  # BUTT
+    Gimp.context_set_stroke_method(0)   # LINE
+    Gimp.context_set_line_miter_limit(100.0) # max value accepted by GIMP: 100.0
     
-    while cumulDist < targetLength and u > deltaT :
-        
-        u -= deltaT
-        currentP = getCutSegmt(pointsList, u)[-1]
-        deltaL = distance(lastP, currentP)
-        cumulDist += deltaL
-        lastP = currentP
-        counter += 1
-        
-    # end while
     
-    # print("deltaL:", deltaL) # debug
+# new transparent layer of the image size, on top
+def newArrowLayer(monImage, name) :
     
-    if u <= deltaT :  # u too close from the start point
-        
-        if cumulDist <= cutDistance :   
-            cutDistance -= targetLength - cumulDist  # then we shrink cutLength instead
-        else :
-            axisLength -= targetLength - cumulDist + cutDistance
-            cutDistance = 0.0
-            
-    else :
-        ratioOvershoot = (cumulDist - targetLength) / deltaL # by how much targetLength is overshot
-        u += deltaT * ratioOvershoot                         # correct u by this small bit
+    newLayer = Gimp.Layer.new(monImage, name, monImage.get_width(), monImage.get_height(), 
+                              monImage.get_base_type() * 2 + 1, 100.0, 28) # 28:normal
+    monImage.insert_layer(newLayer, None, 0)
+    
+    return newLayer
+    
+    
+# True for the layers the staging layer can be pasted on as drawing on them would:
+# plain layers, no lock on alpha or pixels (groups have no pixels of their own)
+def stagingTarget(thisDrawable) :
+    
+    return thisDrawable.is_layer() and not thisDrawable.is_group() \
+           and not thisDrawable.get_lock_alpha() and not thisDrawable.get_lock_content()
+    
+    
+# staging layer covering box (rounded out), just above targetLayer
+def newStagingLayer(monImage, targetLayer, box) :
+    
+    x = int(math.floor(box[0]))
+    y = int(math.floor(box[1]))
+    width = int(math.ceil(box[2])) - x
+    height = int(math.ceil(box[3])) - y
+    
+    stagingLayer = Gimp.Layer.new(monImage, _("Arrows staging"), width, height,
+                                  monImage.get_base_type() * 2 + 1, 100.0, 28) # 28:normal
+    stagingLayer.set_offsets(x, y)
+    monImage.insert_layer(stagingLayer, targetLayer.get_parent(),
+                          monImage.get_item_position(targetLayer))
+    
+    return stagingLayer
+    
+    
+# paste the staging layer on each target layer, at its place, then delete it: the
+# target layers stay the same items (ID, parasites, properties), returns them; the
+# whole staging layer is copied in a named buffer, the clipboard is left alone;
+# userSelection: True when the user selection (restored by drawInImage) must be
+# cleared for the copy
+def pasteStagingLayer(monImage, stagingLayer, targetLayers, userSelection) :
+    
+    if userSelection :
+        Gimp.Selection.none(monImage)
     # end if
+    bufferName = Gimp.edit_named_copy([stagingLayer], "pl-stroke-arrows staging")
+    _, offsetX, offsetY = stagingLayer.get_offsets()
+    
+    for targetLayer in targetLayers :
+        floatingLayer = Gimp.edit_named_paste(targetLayer, bufferName, False)
+        floatingLayer.set_offsets(offsetX, offsetY)
+        Gimp.floating_sel_anchor(floatingLayer)
+    # end for
+    
+    Gimp.buffer_delete(bufferName)
+    monImage.remove_layer(stagingLayer)
+    
+    return targetLayers
     
-    # print("iterations:", counter)        # debug
-    # time2 = time.perf_counter()     # time debug
-    # print("time:", time2 - time1)   # time debug
     
-    # we get the last segment
-    lastSegment = getCutSegmt(pointsList, u)
+# crop a layer to its drawn pixels (replaces the selection)
+def cropLayer(monImage, thisLayer) :
     
-    segmentID = math.trunc(u) # int
-    newPointsList = pointsList[0 : segmentID * 3] + lastSegment
+    monImage.select_item(2, thisLayer)
+    boundingBox = Gimp.Selection.bounds(monImage)
+    # print("bounds : " + str(boundingBox)) # debug
+    offsetX = -boundingBox[2] # no idea why negative
+    offsetY = -boundingBox[3]
+    width = boundingBox[4] - boundingBox[2]
+    height = boundingBox[5] - boundingBox[3]
     
-    return newPointsList, axisLength, cutDistance
+    thisLayer.resize(width, height, offsetX, offsetY)
     
     
 #*************************************************************************************
 
 
-# returns the segment cut at u position
-def getCutSegmt(pointsList, u) :
+# fill a closed path with the FG color, inside the user selection if there is one
+# one selection from the path for all the drawables
+def fillPath(monImage, targetDrawables, thisPath, savedSelection) :
     
-    segmentID = math.trunc(u) # int
-    t = u - float(segmentID) # other sol: = u % 1
+    if Gimp.Selection.is_empty(monImage) :
+        monImage.select_item(2, thisPath) # 2: replace
+    else :
+        monImage.select_item(3, thisPath) # 3: intersect
+    # end if
+    
+    if Gimp.Selection.is_empty(monImage) == False :
+        for thisDrawable in targetDrawables :
+            thisDrawable.edit_fill(0) # 0: FG color
+        # end for
+    # end if
     
-    segStart = 3 * segmentID
-    segment = pointsList[segStart : segStart + 4] # segment of interest
+    monImage.select_item(2, savedSelection)
     
-    splitSeg = sliceBezier(segment, t)[0:4]
     
-    return splitSeg
-
-
 #*************************************************************************************
 
 
-# https://stackoverflow.com/questions/8369488/splitting-a-bezier-curve/8405756#8405756
-
-def sliceBezier(points, t): # 4 point sous forme [ [x1, y1], [x2, y2],... ]
+# fill or stroke the path of a head or tail element, small filled elements are only
+# added to rasterElements when it is given (see fillPixels)
+def drawElementPath(monImage, targetDrawables, thisPath, element, savedSelection,
+                    rasterElements=None) :
     
-    p1, p2, p3, p4 = points
-    x1, y1 = p1
-    x2, y2 = p2
-    x3, y3 = p3
-    x4, y4 = p4
-
-    x12 = (x2-x1)*t+x1
-    y12 = (y2-y1)*t+y1
-
-    x23 = (x3-x2)*t+x2
-    y23 = (y3-y2)*t+y2
-
-    x34 = (x4-x3)*t+x3
-    y34 = (y4-y3)*t+y3
+    if rasterElements is not None and fitsRaster(element) :
+        rasterElements.append(element)
+    elif element["filled"] :
+        fillPath(monImage, targetDrawables, thisPath, savedSelection)
+    else :
+        for thisDrawable in targetDrawables :
+            thisDrawable.edit_stroke_item(thisPath)
+        # end for
+    # end if
+    
+    
+#*************************************************************************************
 
-    x123 = (x23-x12)*t+x12
-    y123 = (y23-y12)*t+y12
 
-    x234 = (x34-x23)*t+x23
-    y234 = (y34-y23)*t+y23
+# antialiased pixels of filled elements written through the shadow buffer, in one merge
+# per drawable limited to their bounding box (and to the user selection if there is
+# one); drawables with the same offsets and size share the coverage
+def fillPixels(monImage, targetDrawables, elements, fillColor, savedSelection) :
+    
+    polygons = [ polygon for element in elements for polygon in elementPolygons(element) ]
+    
+    userSelection = None # read once, before the first box selection
+    coverages = {} # { (box, offsetX, offsetY) : coverage }
+    
+    for thisDrawable in targetDrawables :
+        
+        ok, offsetX, offsetY = thisDrawable.get_offsets()
+        box = rasterBox(polygons, offsetX, offsetY,
+                        thisDrawable.get_width(), thisDrawable.get_height())
+        
+        if box is None :
+            continue
+        # end if
+        
+        x, y, width, height = box
+        
+        # the merge only touches the selection: the box, inside the user selection
+        if userSelection is None :
+            userSelection = not Gimp.Selection.is_empty(monImage)
+        # end if
+        monImage.select_rectangle(2, x + offsetX, y + offsetY, width, height) # 2: replace
+        if userSelection :
+            monImage.select_item(3, savedSelection) # 3: intersect
+        # end if
+        
+        rectangle = Gegl.Rectangle.new(x, y, width, height)
+        pixels = array.array("f")
+        pixels.frombytes(thisDrawable.get_buffer().get(rectangle, 1.0, RASTER_FORMAT,
+                                                       Gegl.AbyssPolicy.NONE))
+        
+        key = (box, offsetX, offsetY)
+        if key not in coverages :
+            coverages[key] = elementsCoverage(elements, box, offsetX, offsetY)
+        # end if
+        compositeCoverage(pixels, coverages[key], fillColor)
+        
+        shadow = thisDrawable.get_shadow_buffer()
+        shadow.set(rectangle, RASTER_FORMAT, pixels.tobytes())
+        shadow.flush()
+        
+        thisDrawable.merge_shadow(True)
+        thisDrawable.update(x, y, width, height)
+        
+    # end for
+    
+    if userSelection is not None : # a box was selected
+        monImage.select_item(2, savedSelection)
+    # end if
+    
+    
+#*************************************************************************************
 
-    x1234 = (x234-x123)*t+x123
-    y1234 = (y234-y123)*t+y123
 
-    return [ [x1, y1], [x12, y12], [x123, y123], [x1234, y1234], [x234, y234], [x34, y34], [x4, y4] ]
+# create and insert the path of the body
+def buildShaftPath(monImage, shaftCoords) :
+    
+    newPath = Gimp.Path.new(monImage, _("body path #1"))
+    newPath.stroke_new_from_points(0, shaftToFlatList(shaftCoords), False)
+    
+    monImage.insert_path(newPath, None, 0)
+    
+    return newPath
+    
+    
+#*************************************************************************************
 
 
+# path of an element, None when it is rasterised and not kept
+def optionalElementPath(monImage, name, element, fillColor, keepPaths) :
+    
+    if fillColor is not None and fitsRaster(element) and keepPaths == False :
+        return None
+    # end if
+    
+    return buildElementPath(monImage, name, element)
+    
+    
+# create and insert the path of a head or tail element
+def buildElementPath(monImage, name, element) :
+    
+    elementPath = Gimp.Path.new(monImage, name)
+    
+    for vertices, closed in element["lines"] :
+        elementPath.stroke_new_from_points(0, linesToFlatList(vertices), closed)
+    # end for
+    
+    if element["circle"] is not None :
+        oriX, oriY, radius = element["circle"]
+        elementPath.bezier_stroke_new_ellipse(oriX, oriY, radius, radius, 0.0)
+    # end if
+    
+    monImage.insert_path(elementPath, None, 0)
+    
+    return elementPath
+    
+    
 #*************************************************************************************
 
 
-Gimp.main(strokeArrows.__gtype__, sys.argv)
+
+if __name__ == "__main__" :
+    Gimp.main(strokeArrows.__gtype__, sys.argv)
 
@@ -0,0 +1,462 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# End-to-end benchmark of pl-stroke-arrows inside GIMP
+#
+# For each case of the matrix (arrowhead style x tail type x createLayer x keepPaths),
+# starts gimp-console in batch mode on a synthetic white image with N paths, runs the
+# plug-in, and records:
+#   - the time of the plug-in run measured inside GIMP (best of --repeat runs)
+#   - the wall time of the whole gimp-console process
+#   - the peak RSS of gimp-console and of the plug-ins it waited for
+# The flattened result is exported as PPM and compared with the golden image of the
+# case, so that a speedup can't silently change the rendering.
+#
+# With --service, the latency of single calls instead: pl-stroke-arrows called --calls
+# times on one path (python started for each call), then the same calls answered by the
+# resident service (pl-stroke-arrows-served).
+#
+# The plug-in must be installed in the GIMP used (see README).
+#
+# usage:
+#   python3 tools/benchmark_gimp.py --update-golden     create the golden images
+#   python3 tools/benchmark_gimp.py                     benchmark and compare
+#   python3 tools/benchmark_gimp.py --size 4000x3000 --paths 200 --styles filled
+#            --tails none,bullet --json results.json
+#   python3 tools/benchmark_gimp.py --service --calls 100
+#
+# License: GPLv3 (see pl_stroke_arrows.py)
+
+import os
+import sys
+import json
+import time
+import shutil
+import statistics
+import argparse
+import tempfile
+import subprocess
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+GOLDEN_DIR = os.path.join(TOOLS_DIR, "benchmark_golden")
+
+STYLES = ["filled", "empty", "simple"]
+TAIL_TYPES = ["none", "crossbar", "bullet", "feathered", "arrowhead"]
+
+GIMP_CANDIDATES = ["gimp-console-3.0", "gimp-console-3", "gimp-console"]
+
+
+#*************************************************************************************
+
+
+# script run by python-fu-eval inside GIMP, the case is read from a JSON file
+GIMP_SCRIPT = '''
+import json, time
+import gi
+gi.require_version("Gimp", "3.0")
+from gi.repository import Gimp, Gio
+
+with open(CASE_FILE) as caseFile :
+    case = json.load(caseFile)
+
+def newImage() :
+    image = Gimp.Image.new(case["width"], case["height"], Gimp.ImageBaseType.RGB)
+    layer = Gimp.Layer.new(image, "background", case["width"], case["height"],
+                           Gimp.ImageType.RGB_IMAGE, 100.0, Gimp.LayerMode.NORMAL)
+    image.insert_layer(layer, None, 0)
+    layer.fill(Gimp.FillType.WHITE)
+    paths = []
+    for i, flatList in enumerate(case["paths"]) :
+        path = Gimp.Path.new(image, "path {}".format(i))
+        path.stroke_new_from_points(Gimp.PathStrokeType.BEZIER, flatList, False)
+        image.insert_path(path, None, 0)
+        paths.append(path)
+    image.set_selected_paths(paths)
+    return image, layer
+
+procedure = Gimp.get_pdb().lookup_procedure("pl-stroke-arrows")
+times = []
+
+for repetition in range(case["repeat"]) :
+    image, layer = newImage()
+    config = procedure.create_config()
+    config.set_property("run-mode", Gimp.RunMode.NONINTERACTIVE)
+    config.set_property("image", image)
+    config.set_core_object_array("drawables", [layer])
+    for name, value in case["settings"].items() :
+        config.set_property(name, value)
+    start = time.perf_counter()
+    result = procedure.run(config)
+    times.append(time.perf_counter() - start)
+    if result.index(0) != Gimp.PDBStatusType.SUCCESS :
+        print("BENCH-ERROR", result.index(0))
+    if repetition < case["repeat"] - 1 :
+        image.delete()
+
+image.merge_visible_layers(Gimp.MergeType.CLIP_TO_IMAGE)
+Gimp.file_save(Gimp.RunMode.NONINTERACTIVE, image, Gio.File.new_for_path(case["output"]), None)
+image.delete()
+
+print("BENCH-TIME", min(times))
+'''
+
+# latency of single calls, cold (a python process per call) and served by the service
+SERVICE_SCRIPT = '''
+import json, time
+import gi
+gi.require_version("Gimp", "3.0")
+from gi.repository import Gimp
+
+with open(CASE_FILE) as caseFile :
+    case = json.load(caseFile)
+
+image = Gimp.Image.new(case["width"], case["height"], Gimp.ImageBaseType.RGB)
+layer = Gimp.Layer.new(image, "background", case["width"], case["height"],
+                       Gimp.ImageType.RGB_IMAGE, 100.0, Gimp.LayerMode.NORMAL)
+image.insert_layer(layer, None, 0)
+path = Gimp.Path.new(image, "path")
+path.stroke_new_from_points(Gimp.PathStrokeType.BEZIER, case["paths"][0], False)
+image.insert_path(path, None, 0)
+image.set_selected_paths([path])
+
+pdb = Gimp.get_pdb()
+
+def runProcedure(name, image=None) :
+    procedure = pdb.lookup_procedure(name)
+    config = procedure.create_config()
+    config.set_property("run-mode", Gimp.RunMode.NONINTERACTIVE)
+    if image is not None :
+        config.set_property("image", image)
+        config.set_core_object_array("drawables", [layer])
+        config.set_property("createLayer", False)
+    start = time.perf_counter()
+    result = procedure.run(config)
+    if result.index(0) != Gimp.PDBStatusType.SUCCESS :
+        print("BENCH-ERROR", name, result.index(0))
+    return time.perf_counter() - start
+
+cold = [ runProcedure("pl-stroke-arrows", image) for i in range(case["calls"]) ]
+startup = runProcedure("pl-stroke-arrows-service")
+served = [ runProcedure("pl-stroke-arrows-served", image) for i in range(case["calls"]) ]
+runProcedure("pl-stroke-arrows-service-stop")
+image.delete()
+
+print("BENCH-SERVICE", json.dumps({"cold": cold, "startup": startup, "served": served}))
+'''
+
+
+#*************************************************************************************
+
+
+# a three segments curve in GIMP format, spread on a grid over the image
+def syntheticPath(index, pathsNumber, width, height) :
+
+    columns = max( 1, int( round( (pathsNumber * width / float(height)) ** 0.5 ) ) )
+    rows = (pathsNumber + columns - 1) // columns
+    cellW = width / float(columns)
+    cellH = height / float(rows)
+
+    x0 = (index % columns) * cellW + 0.1 * cellW
+    y0 = (index // columns) * cellH + 0.1 * cellH
+    w = 0.8 * cellW
+    h = 0.8 * cellH
+
+    anchors = [
+        (x0,           y0 + 0.2 * h, x0 + 0.1 * w,  y0 + 0.4 * h),
+        (x0 + 0.3 * w, y0 + 0.9 * h, x0 + 0.5 * w,  y0 + h),
+        (x0 + 0.7 * w, y0 + 0.6 * h, x0 + 0.8 * w,  y0 + 0.4 * h),
+        (x0 + w,       y0 + 0.1 * h, x0 + w,        y0 + 0.1 * h),
+    ]
+
+    flatList = []
+    for x, y, outX, outY in anchors :
+        inX = 2.0 * x - outX
+        inY = 2.0 * y - outY
+        flatList += [inX, inY, x, y, outX, outY]
+    # end for
+
+    return flatList
+
+
+def caseName(arrowStyle, tailType, createLayer, keepPaths) :
+
+    return "{}-{}{}{}".format(arrowStyle, tailType, "" if createLayer else "-onLayer",
+                              "-keepPaths" if keepPaths else "")
+
+
+#*************************************************************************************
+
+
+# (width, height, maxval, bytes) of a PPM file, P6 or P3
+def readPPM(fileName) :
+
+    with open(fileName, "rb") as ppmFile :
+        data = ppmFile.read()
+    # end with
+
+    fields = []
+    position = 0
+    while len(fields) < 4 :
+        while data[position:position+1].isspace() :
+            position += 1
+        if data[position:position+1] == b"#" :
+            position = data.index(b"\n", position) + 1
+            continue
+        end = position
+        while not data[end:end+1].isspace() :
+            end += 1
+        fields.append(data[position:end])
+        position = end
+    # end while
+
+    magic, width, height, maxval = fields[0], int(fields[1]), int(fields[2]), int(fields[3])
+
+    if magic == b"P6" :
+        pixels = data[position + 1 : position + 1 + width * height * 3]
+    elif magic == b"P3" :
+        pixels = bytes( int(value) for value in data[position:].split() )
+    else :
+        raise ValueError("{}: not a PPM file".format(fileName))
+    # end if
+
+    return width, height, maxval, pixels
+
+
+# number of pixels differing by more than tolerance on any channel, None if the sizes differ
+def comparePPM(fileName1, fileName2, tolerance) :
+
+    width1, height1, maxval1, pixels1 = readPPM(fileName1)
+    width2, height2, maxval2, pixels2 = readPPM(fileName2)
+
+    if (width1, height1) != (width2, height2) or len(pixels1) != len(pixels2) :
+        return None
+    # end if
+
+    if pixels1 == pixels2 :
+        return 0
+    # end if
+
+    differences = 0
+    for i in range(0, len(pixels1), 3) :
+        if ( abs(pixels1[i] - pixels2[i]) > tolerance
+             or abs(pixels1[i+1] - pixels2[i+1]) > tolerance
+             or abs(pixels1[i+2] - pixels2[i+2]) > tolerance ) :
+            differences += 1
+    # end for
+
+    return differences
+
+
+#*************************************************************************************
+
+
+def findGimp(requested) :
+
+    if requested :
+        return requested
+    # end if
+
+    for name in GIMP_CANDIDATES :
+        if shutil.which(name) :
+            return name
+    # end for
+
+    raise RuntimeError("gimp-console not found, use --gimp")
+
+
+# one gimp-console run of a script on a case, returns (output, wall time, rusage)
+def runGimp(gimp, script, case, workDir) :
+
+    caseFile = os.path.join(workDir, "case.json")
+    scriptFile = os.path.join(workDir, "bench.py")
+
+    with open(caseFile, "w") as f :
+        json.dump(case, f)
+    # end with
+    with open(scriptFile, "w") as f :
+        f.write("CASE_FILE = {!r}\n".format(caseFile) + script)
+    # end with
+
+    command = [gimp, "-i", "-d", "-f", "--batch-interpreter", "python-fu-eval",
+               "-b", "exec(open({!r}).read())".format(scriptFile), "--quit"]
+
+    start = time.perf_counter()
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    output = process.stdout.read().decode("utf-8", "replace")
+    pid, status, usage = os.wait4(process.pid, 0) # rusage of gimp and its waited children
+    wallTime = time.perf_counter() - start
+    process.returncode = os.waitstatus_to_exitcode(status)
+
+    return output, wallTime, usage
+
+
+# one gimp-console run, returns (plug-in time, wall time, peak RSS in MB)
+def runCase(gimp, case, workDir) :
+
+    output, wallTime, usage = runGimp(gimp, GIMP_SCRIPT, case, workDir)
+
+    plugInTime = None
+    for line in output.splitlines() :
+        if line.startswith("BENCH-TIME") :
+            plugInTime = float(line.split()[1])
+        elif line.startswith("BENCH-ERROR") :
+            raise RuntimeError("pl-stroke-arrows failed:\n" + output)
+    # end for
+
+    if plugInTime is None or not os.path.exists(case["output"]) :
+        raise RuntimeError("gimp-console run failed:\n" + output)
+    # end if
+
+    return plugInTime, wallTime, usage.ru_maxrss / 1024.0 # ru_maxrss in kB on Linux
+
+
+# per call latency, cold and served: prints it, returns the times
+def runService(gimp, case, workDir) :
+
+    output, wallTime, usage = runGimp(gimp, SERVICE_SCRIPT, case, workDir)
+
+    times = None
+    for line in output.splitlines() :
+        if line.startswith("BENCH-SERVICE") :
+            times = json.loads(line.split(None, 1)[1])
+        elif line.startswith("BENCH-ERROR") :
+            raise RuntimeError("call failed:\n" + output)
+    # end for
+
+    if times is None :
+        raise RuntimeError("gimp-console run failed:\n" + output)
+    # end if
+
+    print("{:24s} {:>10s} {:>10s} {:>10s}".format("{} calls".format(case["calls"]),
+          "mean ms", "median ms", "best ms"))
+    for name in ("cold", "served") :
+        print("{:24s} {:10.2f} {:10.2f} {:10.2f}".format(name,
+              1000.0 * statistics.mean(times[name]), 1000.0 * statistics.median(times[name]),
+              1000.0 * min(times[name])))
+    # end for
+    print("{:24s} {:10.2f}".format("service start", 1000.0 * times["startup"]))
+
+    return times
+
+
+#*************************************************************************************
+
+
+def main() :
+
+    parser = argparse.ArgumentParser(description="Benchmark pl-stroke-arrows in gimp-console.")
+    parser.add_argument("--gimp", help="gimp-console executable (default: first found)")
+    parser.add_argument("--size", default="2000x1500", help="image size WIDTHxHEIGHT")
+    parser.add_argument("--paths", type=int, default=50, help="number of paths per image")
+    parser.add_argument("--repeat", type=int, default=3, help="plug-in runs per case, best kept")
+    parser.add_argument("--styles", default=",".join(STYLES), help="arrowhead styles")
+    parser.add_argument("--tails", default=",".join(TAIL_TYPES), help="tail types")
+    parser.add_argument("--golden", default=GOLDEN_DIR, help="golden images folder")
+    parser.add_argument("--update-golden", action="store_true", help="store the outputs as golden")
+    parser.add_argument("--tolerance", type=int, default=0, help="channel difference ignored")
+    parser.add_argument("--max-pixels", type=int, default=0, help="differing pixels accepted")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--service", action="store_true",
+                        help="latency of single calls, with and without the resident service")
+    parser.add_argument("--calls", type=int, default=50, help="calls of each kind, --service")
+    args = parser.parse_args()
+
+    gimp = findGimp(args.gimp)
+    width, height = [ int(value) for value in args.size.lower().split("x") ]
+    paths = [ syntheticPath(i, args.paths, width, height) for i in range(args.paths) ]
+
+    if args.service :
+
+        case = {"width": width, "height": height, "paths": paths, "calls": max(1, args.calls)}
+        with tempfile.TemporaryDirectory() as workDir :
+            times = runService(gimp, case, workDir)
+        # end with
+
+        if args.json :
+            with open(args.json, "w") as jsonFile :
+                json.dump({"size": [width, height], "service": times}, jsonFile, indent=1)
+            # end with
+        # end if
+
+        return 0
+
+    # end if
+
+    results = []
+    failures = []
+
+    print("{:36s} {:>10s} {:>9s} {:>8s}  {}".format("case", "plug-in s", "wall s", "RSS MB", "pixels"))
+
+    with tempfile.TemporaryDirectory() as workDir :
+
+        for arrowStyle in args.styles.split(",") :
+            for tailType in args.tails.split(",") :
+                for createLayer in (True, False) :
+                    for keepPaths in (False, True) :
+
+                        name = caseName(arrowStyle, tailType, createLayer, keepPaths)
+                        output = os.path.join(workDir, name + ".ppm")
+                        golden = os.path.join(args.golden, "{}x{}-{}-{}.ppm".format(width,
+                                              height, args.paths, name))
+
+                        case = {
+                            "width": width, "height": height, "paths": paths,
+                            "repeat": max( 1, args.repeat ), "output": output,
+                            "settings": {"arrowStyle": arrowStyle, "tailType": tailType,
+                                         "createLayer": createLayer, "keepPaths": keepPaths,
+                                         "arrowsColor": "black"},
+                        }
+
+                        plugInTime, wallTime, peakRSS = runCase(gimp, case, workDir)
+
+                        if args.update_golden :
+                            os.makedirs(args.golden, exist_ok=True)
+                            shutil.copyfile(output, golden)
+                            pixels = "golden written"
+                        elif not os.path.exists(golden) :
+                            pixels = "no golden"
+                        else :
+                            differences = comparePPM(output, golden, args.tolerance)
+                            if differences is None :
+                                pixels = "SIZE DIFFERS"
+                                failures.append(name)
+                            elif differences > args.max_pixels :
+                                pixels = "{} DIFFER".format(differences)
+                                failures.append(name)
+                            else :
+                                pixels = "ok"
+                            # end if
+                        # end if
+
+                        print("{:36s} {:10.3f} {:9.2f} {:8.1f}  {}".format(name, plugInTime,
+                              wallTime, peakRSS, pixels))
+                        sys.stdout.flush()
+
+                        results.append({"case": name, "plugInTime": plugInTime,
+                                        "wallTime": wallTime, "peakRSS": peakRSS,
+                                        "pixels": pixels})
+
+                    # end for
+                # end for
+            # end for
+        # end for
+
+    # end with
+
+    if args.json :
+        with open(args.json, "w") as jsonFile :
+            json.dump({"size": [width, height], "paths": args.paths, "results": results},
+                      jsonFile, indent=1)
+        # end with
+    # end if
+
+    if failures :
+        print("\nrendering changed: " + ", ".join(failures))
+        return 1
+    # end if
+
+    return 0
+
+
+if __name__ == "__main__" :
+    sys.exit(main())
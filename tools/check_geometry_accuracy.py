@@ -0,0 +1,563 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Accuracy guard for the geometry engines: cut points, anchors, tips and end angles
+# compared with a high precision reference
+#
+# The reference works on the Bezier segments directly: arc length by Gauss-Legendre
+# quadrature on 64 sub-intervals per segment, points at a given arc length found by
+# bisection, direction of travel from the derivatives at that point. It shares no code
+# with the Curve.
+#
+# Each engine is run on fixtures (known edge cases: straight segments with the control
+# points on the anchors, vertical tangents, control point on the end anchor, loop,
+# zero length segment, paths shorter than the arrow) and on random cubic paths, for
+# several arrow styles. Positions are compared in pixels, angles as the pixels they move
+# the end of a wing by. Fails when one difference goes over the tolerance: 0.25 px on the
+# fixtures, 1 px on the random paths, which include tight curves the Curve tables
+# (DELTA_T 0.01) follow within about 0.5 px only; --delta-t 0.001 keeps the Curve under
+# 0.05 px away from cusps. Other seeds can find paths with a cusp near a cut, where the
+# direction turns around within a pixel and the Curve is further off: --dump them.
+#
+# usage:
+#   python3 tools/check_geometry_accuracy.py                   fixtures and 300 random paths
+#   python3 tools/check_geometry_accuracy.py --paths 2000 --seed 7
+#   python3 tools/check_geometry_accuracy.py --delta-t 0.001 --tolerance 0.05 --random-tolerance 0.05
+#   python3 tools/check_geometry_accuracy.py --delta-t 0.05    coarser table for the Curve
+#   python3 tools/check_geometry_accuracy.py --dump failures.json   failing paths, to add
+#                                                                   them to the fixtures
+#
+# A new engine (lookup tables, root finding, numpy...) is added to ENGINES: a function
+# of (pointsList, deltaT) returning an object with length() and view(), the view having
+# the CurveView methods used by designPath (cutEnd, endPoint, endAngle, reversed).
+#
+# License: GPLv3 (see pl_stroke_arrows.py)
+
+import os
+import sys
+import json
+import math
+import random
+import bisect
+import argparse
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+PLUGIN_DIR = os.path.join(os.path.dirname(TOOLS_DIR), "pl_stroke_arrows")
+
+sys.path.insert(0, PLUGIN_DIR)
+
+from arrow_geometry import (DEFAULT_STYLE, DELTA_T, prepareStyle, designPath, shortenView,
+                            arrowheadElement, sliceBezier, Curve)
+
+
+#*************************************************************************************
+
+
+ENGINES = {
+    "curve" : lambda pointsList, deltaT : Curve(pointsList, deltaT),
+}
+
+# arrow styles checked on every path (plug-in argument names over DEFAULT_STYLE)
+STYLE_CASES = [
+    {},
+    {"arrowStyle": "empty", "tailType": "arrowhead"},
+    {"arrowStyle": "simple", "tailType": "arrowhead", "tailStyle": "simple"},
+    {"harpoonFactor": 4.0, "tailType": "arrowhead", "tailStyle": "filled"},
+    {"harpoonFactor": -6.0, "tailType": "arrowhead"},
+    {"wingLen": 120.0, "strokeWidth": 12.0, "tailType": "arrowhead", "tailStyle": "empty"},
+    {"tailType": "feathered", "tailStyle": "filled"},
+    {"tailType": "bullet", "tailStyle": "empty"},
+]
+
+THIRD = 1.0 / 3.0
+
+FIXTURES = {
+    "polyline, controls on anchors" : [[0, 0], [0, 0], [100, 0], [100, 0],
+                                       [100, 0], [100, 80], [100, 80]],
+    "straight, uniform controls"    : [[0, 0], [100 * THIRD, 50 * THIRD],
+                                       [200 * THIRD, 100 * THIRD], [100, 50]],
+    "vertical end tangent"          : [[0, 0], [80, 0], [100, 20], [100, 100]],
+    "vertical start tangent"        : [[0, 0], [0, 60], [40, 100], [120, 100]],
+    "control on end anchor"         : [[0, 0], [60, 0], [100, 100], [100, 100]],
+    "control on start anchor"       : [[0, 0], [0, 0], [40, 100], [100, 100]],
+    "S curve"                       : [[0, 0], [100, 0], [0, 100], [100, 100]],
+    "loop"                          : [[0, 0], [150, 100], [-50, 100], [100, 0]],
+    "zero length segment"           : [[0, 0], [30, 0], [60, 30], [60, 60], [60, 60],
+                                       [60, 60], [60, 60], [60, 90], [90, 120], [120, 120]],
+    "shorter than the arrow"        : [[0, 0], [5, 0], [10, 2], [15, 2]],
+    "very short"                    : [[0, 0], [1, 0], [2, 0], [3, 0]],
+    "sharp corner"                  : [[0, 0], [50, 0], [100, 0], [100, 0],
+                                       [100, 0], [50, 10], [0, 20]],
+}
+
+REACH = DEFAULT_STYLE["wingLen"] # angle errors of the plain cuts measured at this distance
+
+
+#*************************************************************************************
+
+
+# 8 points Gauss-Legendre on [-1, 1]
+GAUSS = [
+    (-0.9602898564975363, 0.1012285362903763), (-0.7966664774136267, 0.2223810344533745),
+    (-0.5255324099163290, 0.3137066458778873), (-0.1834346424956498, 0.3626837833783620),
+    ( 0.1834346424956498, 0.3626837833783620), ( 0.5255324099163290, 0.3137066458778873),
+    ( 0.7966664774136267, 0.2223810344533745), ( 0.9602898564975363, 0.1012285362903763),
+]
+
+
+class ReferencePath :
+
+    def __init__(self, pointsList, subdivisions=64) :
+
+        self.segments = [ pointsList[3*i:3*i+4] for i in range((len(pointsList) - 1) // 3) ]
+        self.subdivisions = subdivisions
+
+        # cumulated lengths: per segment at t = k / subdivisions, and at segment starts
+        self.tables = []
+        self.starts = [0.0]
+
+        for segment in self.segments :
+            table = [0.0]
+            for k in range(subdivisions) :
+                table.append(table[-1] + self.quadrature(segment, float(k) / subdivisions,
+                                                         float(k + 1) / subdivisions))
+            # end for
+            self.tables.append(table)
+            self.starts.append(self.starts[-1] + table[-1])
+        # end for
+
+        self.length = self.starts[-1]
+
+    @staticmethod
+    def point(segment, t) :
+
+        (x0, y0), (x1, y1), (x2, y2), (x3, y3) = segment
+        s = 1.0 - t
+
+        return (s*s*s*x0 + 3.0*s*s*t*x1 + 3.0*s*t*t*x2 + t*t*t*x3,
+                s*s*s*y0 + 3.0*s*s*t*y1 + 3.0*s*t*t*y2 + t*t*t*y3)
+
+    @staticmethod
+    def speed(segment, t) :
+
+        (x0, y0), (x1, y1), (x2, y2), (x3, y3) = segment
+        s = 1.0 - t
+
+        dx = 3.0 * ( s*s*(x1 - x0) + 2.0*s*t*(x2 - x1) + t*t*(x3 - x2) )
+        dy = 3.0 * ( s*s*(y1 - y0) + 2.0*s*t*(y2 - y1) + t*t*(y3 - y2) )
+
+        return math.hypot(dx, dy)
+
+    def quadrature(self, segment, t1, t2) :
+
+        half = 0.5 * (t2 - t1)
+        middle = 0.5 * (t1 + t2)
+
+        return half * sum( weight * self.speed(segment, middle + half * node )
+                           for node, weight in GAUSS )
+
+    def lengthInSegment(self, segmentID, t) :
+
+        k = min( int(t * self.subdivisions), self.subdivisions - 1 )
+
+        return self.tables[segmentID][k] + self.quadrature(self.segments[segmentID],
+                                                           float(k) / self.subdivisions, t)
+
+    # (segmentID, t) at arc length s from the start (clamped to the path), at a joint
+    # the segment before it (leftSide) or after it
+    def locate(self, s, leftSide=True) :
+
+        s = min( max(s, 0.0), self.length )
+
+        if leftSide :
+            segmentID = bisect.bisect_left(self.starts, s) - 1
+        else :
+            segmentID = bisect.bisect_right(self.starts, s) - 1
+        # end if
+        segmentID = min( max( segmentID, 0 ), len(self.segments) - 1 )
+
+        target = s - self.starts[segmentID]
+        low, high = 0.0, 1.0
+        for i in range(60) :
+            middle = 0.5 * (low + high)
+            if self.lengthInSegment(segmentID, middle) < target :
+                low = middle
+            else :
+                high = middle
+        # end for
+
+        return segmentID, 0.5 * (low + high)
+
+    def pointAt(self, s) :
+
+        segmentID, t = self.locate(s)
+
+        return self.point(self.segments[segmentID], t)
+
+    # direction of travel arriving at s (forwards), or arriving at s going backwards;
+    # where the speed is zero, the first derivative that isn't gives the direction; at
+    # the ends of the path, the side that exists
+    def angleAt(self, s, forwards=True) :
+
+        arriving = forwards # from the left side of s
+        if s <= 0.0 :
+            arriving = False
+        elif s >= self.length :
+            arriving = True
+        # end if
+
+        segmentID, t = self.locate(s, arriving)
+        (x0, y0), (x1, y1), (x2, y2), (x3, y3) = self.segments[segmentID]
+        u = 1.0 - t
+        epsilon = 1e-9 * ( 1.0 + math.hypot(x3 - x0, y3 - y0) )
+
+        derivatives = [
+            ( 3.0 * ( u*u*(x1 - x0) + 2.0*u*t*(x2 - x1) + t*t*(x3 - x2) ),
+              3.0 * ( u*u*(y1 - y0) + 2.0*u*t*(y2 - y1) + t*t*(y3 - y2) ), 1.0 ),
+            ( 6.0 * ( u*(x2 - 2.0*x1 + x0) + t*(x3 - 2.0*x2 + x1) ),
+              6.0 * ( u*(y2 - 2.0*y1 + y0) + t*(y3 - 2.0*y2 + y1) ), -1.0 if arriving else 1.0 ),
+            ( 6.0 * (x3 - 3.0*x2 + 3.0*x1 - x0), 6.0 * (y3 - 3.0*y2 + 3.0*y1 - y0), 1.0 ),
+        ]
+
+        # B(t) - B(t - h) and B(t + h) - B(t) follow the sign of each derivative order
+        for dx, dy, sign in derivatives :
+            if math.hypot(dx, dy) > epsilon :
+                angle = math.atan2(sign * dy, sign * dx)
+                return angle if forwards else angle + math.pi
+        # end for
+
+        return 0.0
+
+    # the direction within spread of s closest to angle: a cusp turns the direction
+    # around in less than a pixel, where a sub-pixel cut difference is not an error;
+    # samples, then finer ones around the closest (near a cusp the direction turns
+    # between two samples)
+    def closestAngle(self, s, forwards, angle, spread=0.5) :
+
+        step = spread / 4.0
+
+        for i in range(4) :
+            s = min( ( s + step * k for k in range(-4, 5) ),
+                     key=lambda position : angleDifference(self.angleAt(position, forwards), angle) )
+            if angleDifference(self.angleAt(s, forwards), angle) < 1e-4 :
+                break
+            step /= 4.0
+        # end for
+
+        return self.angleAt(s, forwards)
+
+
+#*************************************************************************************
+
+
+# same shortening rule as shortenView, on lengths: (removed length, axisLength, cutDistance)
+# (cutDistance is negative when the arrowhead is shrunk past the start of the path)
+def referenceShortening(available, axisLength, cutDistance, tipProtruding) :
+
+    targetLength = axisLength + cutDistance + tipProtruding
+    removed = min( targetLength, available )
+
+    if removed < targetLength :
+        if cutDistance > 0.0 and removed <= cutDistance :
+            cutDistance -= targetLength - removed
+        else :
+            axisLength -= targetLength - removed + cutDistance
+            cutDistance = 0.0
+        # end if
+    # end if
+
+    return removed, axisLength, cutDistance
+
+
+def angleDifference(angle1, angle2) :
+
+    return abs( (angle1 - angle2 + math.pi) % (2.0 * math.pi) - math.pi )
+
+
+def pointsDifference(points1, points2) :
+
+    return max( math.hypot(x1 - x2, y1 - y2) for (x1, y1), (x2, y2) in zip(points1, points2) )
+
+
+# cut point, anchor and vertices of an arrowhead
+def headPoints(head, axisLength, tipAngle, cutX, cutY, anchorX, anchorY, endAngle) :
+
+    element = arrowheadElement(head, axisLength, anchorX, anchorY, tipAngle, endAngle)
+
+    return [[cutX, cutY], [anchorX, anchorY]] + element["lines"][0][0]
+
+
+#*************************************************************************************
+
+
+class Report :
+
+    def __init__(self, tolerance) :
+        self.tolerance = tolerance
+        self.worst = {} # check: (error, case)
+        self.failures = []
+
+    def add(self, check, error, case, pointsList) :
+
+        if check not in self.worst or error > self.worst[check][0] :
+            self.worst[check] = (error, case)
+        # end if
+
+        if error > self.tolerance :
+            self.failures.append({"check": check, "error": error, "case": case,
+                                  "points": pointsList})
+        # end if
+
+
+# head and tail of one arrow style on one path
+def checkArrow(report, engine, reference, pointsList, userStyle, case) :
+
+    style = prepareStyle(**userStyle)
+
+    # head: engine
+    placement = designPath(style.head, style.strokeWidth, engine.view(), style.harpoonFactor)
+    view = placement.view
+    endAngle = placement.endAngle
+    cutX, cutY = view.endPoint()
+    engineHead = headPoints(style.head, placement.axisLength, style.tipAngle, cutX, cutY,
+                            placement.anchorX, placement.anchorY, endAngle)
+
+    # head: reference
+    removed, refAxisLength, refCutDistance = referenceShortening(reference.length,
+                    style.head.axisLength, style.head.cutDistance, style.head.tipProtruding)
+    headPosition = reference.length - removed
+    refCutX, refCutY = reference.pointAt(headPosition)
+    refEndAngle = reference.closestAngle(headPosition, True, endAngle)
+    referenceHead = headPoints(style.head, refAxisLength, style.tipAngle, refCutX, refCutY,
+                               refCutX + math.cos(refEndAngle) * refCutDistance,
+                               refCutY + math.sin(refEndAngle) * refCutDistance, refEndAngle)
+
+    report.add("head cut, anchor, tip, wings (px)", pointsDifference(engineHead, referenceHead),
+               case, pointsList)
+    report.add("head endAngle (px at wing end)",
+               angleDifference(endAngle, refEndAngle) * style.head.wingLength, case, pointsList)
+
+    # tail, on what is left after the head cut
+    tailView = view.reversed()
+
+    if style.tailType == "arrowhead" :
+
+        tail = style.tail
+        placement = designPath(tail, style.strokeWidth, tailView, style.harpoonFactor)
+        tailAngle = placement.endAngle
+        tailCutX, tailCutY = placement.view.endPoint()
+        engineTail = headPoints(tail, placement.axisLength, style.tipAngle, tailCutX, tailCutY,
+                                placement.anchorX, placement.anchorY, tailAngle)
+
+        removed, refTailAxisLength, refTailCutDistance = referenceShortening(headPosition,
+                    tail.axisLength, tail.cutDistance, tail.tipProtruding)
+        refTailCutX, refTailCutY = reference.pointAt(removed)
+        refTailAngle = reference.closestAngle(removed, False, tailAngle)
+        referenceTail = headPoints(tail, refTailAxisLength, style.tipAngle, refTailCutX, refTailCutY,
+                                   refTailCutX + math.cos(refTailAngle) * refTailCutDistance,
+                                   refTailCutY + math.sin(refTailAngle) * refTailCutDistance,
+                                   refTailAngle)
+
+        report.add("tail cut, anchor, tip, wings (px)", pointsDifference(engineTail, referenceTail),
+                   case, pointsList)
+        report.add("tail endAngle (px at wing end)",
+                   angleDifference(tailAngle, refTailAngle) * tail.wingLength, case, pointsList)
+
+    elif style.tailType == "feathered" or style.tailType == "bullet" :
+
+        # feathers cut the tail size, empty bullets half of it
+        tailLength = style.tailSize
+        if style.tailType == "bullet" :
+            tailLength = style.tailSize / 2.0
+        # end if
+
+        tailView, placeHolder, tailCutDistance = shortenView(tailView, tailLength, 0.0, 0.0)
+        tailCut = tailView.endPoint()
+        tailAngle = tailView.endAngle()
+
+        removed = min( tailLength, headPosition )
+        report.add("tail cut (px)", pointsDifference([tailCut], [reference.pointAt(removed)]),
+                   case, pointsList)
+        report.add("tail endAngle (px at wing end)",
+                   angleDifference(tailAngle, reference.closestAngle(removed, False, tailAngle)) * REACH,
+                   case, pointsList)
+
+    # end if
+
+
+# plain cuts at random lengths from both ends, and the total length
+def checkCuts(report, engine, reference, pointsList, case, generator, cutsNumber=8) :
+
+    report.add("path length (px)", abs(engine.length() - reference.length), case, pointsList)
+
+    for i in range(cutsNumber) :
+
+        length = generator.uniform(0.0, 1.05 * reference.length)
+
+        view, removed = engine.view().cutEnd(length)
+        position = max( reference.length - length, 0.0 )
+        report.add("cut from the end (px)",
+                   pointsDifference([view.endPoint()], [reference.pointAt(position)]), case, pointsList)
+        angle = view.endAngle()
+        report.add("cut angle (px at {:g} px)".format(REACH),
+                   angleDifference(angle, reference.closestAngle(position, True, angle)) * REACH,
+                   case, pointsList)
+
+        view, removed = engine.view().reversed().cutEnd(length)
+        position = min( length, reference.length )
+        report.add("cut from the start (px)",
+                   pointsDifference([view.endPoint()], [reference.pointAt(position)]), case, pointsList)
+
+    # end for
+
+
+# sliceBezier: the split point is on the curve, both halves follow it
+def checkSlice(report, pointsList, case, generator) :
+
+    segment = pointsList[0:4]
+    t = generator.uniform(0.0, 1.0)
+
+    points = sliceBezier(segment, t) # both halves, sharing the split point
+    first, second = points[0:4], points[3:7]
+
+    error = max( pointsDifference([first[3]], [ReferencePath.point(segment, t)]),
+                 pointsDifference([ReferencePath.point(first, 0.5)],
+                                  [ReferencePath.point(segment, 0.5 * t)]),
+                 pointsDifference([ReferencePath.point(second, 0.5)],
+                                  [ReferencePath.point(segment, t + 0.5 * (1.0 - t))]) )
+
+    report.add("sliceBezier (px)", error, case, pointsList)
+
+
+#*************************************************************************************
+
+
+# random cubic path, control points within half the chord of their anchor (like drawn
+# paths), some straight segments, some vertical or horizontal tangents
+def randomPath(generator, size=1000.0) :
+
+    segmentsNumber = generator.randint(1, 6)
+    scale = generator.choice([0.02, 0.1, 0.3, 1.0]) * size # some paths shorter than arrows
+
+    x, y = generator.uniform(0.0, size), generator.uniform(0.0, size)
+    pointsList = [[x, y]]
+
+    for i in range(segmentsNumber) :
+
+        kind = generator.random()
+        endX = x + generator.uniform(-scale, scale)
+        endY = y + generator.uniform(-scale, scale)
+        reach = 0.5 * math.hypot(endX - x, endY - y)
+
+        if kind < 0.15 : # straight, controls on the anchors
+            pointsList += [[x, y], [endX, endY], [endX, endY]]
+        elif kind < 0.25 : # vertical start, horizontal end
+            pointsList += [[x, y + generator.uniform(-reach, reach)],
+                           [endX + generator.uniform(-reach, reach), endY], [endX, endY]]
+        else :
+            pointsList += [[x + generator.uniform(-reach, reach), y + generator.uniform(-reach, reach)],
+                           [endX + generator.uniform(-reach, reach), endY + generator.uniform(-reach, reach)],
+                           [endX, endY]]
+        # end if
+
+        x, y = endX, endY
+
+    # end for
+
+    return pointsList
+
+
+def runChecks(report, engineName, deltaT, cases, seed) :
+
+    generator = random.Random(seed)
+    makeEngine = ENGINES[engineName]
+
+    for case, pointsList in cases :
+
+        reference = ReferencePath(pointsList)
+
+        checkCuts(report, makeEngine(pointsList, deltaT), reference, pointsList, case, generator)
+        checkSlice(report, pointsList, case, generator)
+
+        for userStyle in STYLE_CASES :
+
+            parameters = dict(DEFAULT_STYLE)
+            parameters.update(userStyle)
+            checkArrow(report, makeEngine(pointsList, deltaT), reference, pointsList, parameters,
+                       "{} {}".format(case, json.dumps(userStyle)))
+
+        # end for
+
+    # end for
+
+
+#*************************************************************************************
+
+
+def main() :
+
+    parser = argparse.ArgumentParser(description="Compare the geometry engines with a high "
+                                                 "precision reference.")
+    parser.add_argument("--engine", choices=sorted(ENGINES), default=None,
+                        help="engine to check (default: all)")
+    parser.add_argument("--paths", type=int, default=300, help="number of random paths")
+    parser.add_argument("--seed", type=int, default=1, help="seed of the random paths")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="max difference on the fixtures (px)")
+    parser.add_argument("--random-tolerance", type=float, default=1.0,
+                        help="max difference on the random paths (px)")
+    parser.add_argument("--delta-t", type=float, default=DELTA_T, help="t step of the Curve tables")
+    parser.add_argument("--dump", metavar="FILE", help="write the failing paths as JSON")
+    args = parser.parse_args()
+
+    generator = random.Random(args.seed)
+    groups = [ ("fixtures", args.tolerance, list(FIXTURES.items())),
+               ("random paths", args.random_tolerance,
+                [ ("random #{} (seed {})".format(i, args.seed), randomPath(generator))
+                  for i in range(args.paths) ]) ]
+
+    failures = []
+
+    for engineName in ( [args.engine] if args.engine else sorted(ENGINES) ) :
+
+        for group, tolerance, cases in groups :
+
+            if cases == [] :
+                continue
+
+            report = Report(tolerance)
+            runChecks(report, engineName, args.delta_t, cases, args.seed)
+
+            print("engine {} (delta t {:g}), {} {}, tolerance {:g} px".format(engineName,
+                  args.delta_t, len(cases), group, tolerance))
+            for check, (error, case) in sorted(report.worst.items()) :
+                print("  {:4s} {:36s} {:10.2e}  {}".format("ok" if error <= tolerance else "FAIL",
+                      check, error, case))
+            # end for
+
+            for failure in report.failures :
+                failure["engine"] = engineName
+                failure["tolerance"] = tolerance
+            # end for
+            failures += report.failures
+
+        # end for
+
+    # end for
+
+    if args.dump :
+        with open(args.dump, "w") as dumpFile :
+            json.dump(failures, dumpFile, indent=1)
+        # end with
+    # end if
+
+    if failures :
+        print("\n{} difference(s) over the tolerance".format(len(failures)))
+        return 1
+    # end if
+
+    return 0
+
+
+if __name__ == "__main__" :
+    sys.exit(main())
@@ -0,0 +1,857 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Count the GIMP round trips made by drawArrows, per arrow, for every arrowhead style
+# and tail combination
+#
+# The plug-in runs against the Gimp stand-in (gimp_stand_in.py), no GIMP needed.
+# Each combination is run with 1 and with N paths: the difference gives the calls
+# made per arrow, the rest is the fixed cost of a run.
+#
+# usage:
+#   python3 tools/count_pdb_calls.py                 print the table
+#   python3 tools/count_pdb_calls.py --check         compare with tools/pdb_budget.json
+#   python3 tools/count_pdb_calls.py --write-budget  store the current counts as budget
+#   python3 tools/count_pdb_calls.py --detail        list the calls of one arrow
+#   python3 tools/count_pdb_calls.py --undo          undo memory with and without the
+#                                                    disable undo option
+#   python3 tools/count_pdb_calls.py --plan          dry run: no change to the image, and
+#                                                    the planned work matches a real run
+#   python3 tools/count_pdb_calls.py --sheet         style contact sheet: calls, and time
+#                                                    with and without the shared geometry
+#   python3 tools/count_pdb_calls.py --service       resident mode: served calls against
+#                                                    the plug-in procedure
+#   python3 tools/count_pdb_calls.py --svg           SVG file: same drawing as the paths,
+#                                                    no path read, memory while reading
+#
+# License: GPLv3 (see pl_stroke_arrows.py)
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+import tracemalloc
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+PLUGIN_DIR = os.path.join(os.path.dirname(TOOLS_DIR), "pl_stroke_arrows")
+BUDGET_FILE = os.path.join(TOOLS_DIR, "pdb_budget.json")
+
+sys.path.insert(0, TOOLS_DIR)
+sys.path.insert(0, PLUGIN_DIR)
+
+import gimp_stand_in
+gimp_stand_in.install()
+
+import pl_stroke_arrows as plugin
+import arrow_geometry
+
+Gimp = gimp_stand_in
+
+
+#*************************************************************************************
+
+
+STYLES = ["filled", "empty", "simple"]
+TAIL_TYPES = ["none", "crossbar", "bullet", "feathered", "arrowhead"]
+TAIL_STYLES = ["default", "filled", "empty", "simple"]
+
+
+def combinations() :
+
+    for arrowStyle in STYLES :
+        for tailType in TAIL_TYPES :
+            if tailType in ("none", "crossbar") :
+                yield arrowStyle, tailType, "default"
+            else :
+                for tailStyle in TAIL_STYLES :
+                    yield arrowStyle, tailType, tailStyle
+                # end for
+            # end if
+        # end for
+    # end for
+
+
+#*************************************************************************************
+
+
+# a three segments curve in GIMP format (control, anchor, control, ...)
+def syntheticPath(index) :
+
+    x0 = 50.0 + 30.0 * (index % 20)
+    y0 = 50.0 + 40.0 * (index // 20)
+
+    anchors = [
+        (x0,         y0,         x0 + 10.0,  y0 + 20.0),
+        (x0 + 60.0,  y0 + 150.0, x0 + 120.0, y0 + 160.0),
+        (x0 + 200.0, y0 + 100.0, x0 + 230.0, y0 + 60.0),
+        (x0 + 300.0, y0 + 40.0,  x0 + 300.0, y0 + 40.0),
+    ]
+
+    flatList = []
+    for x, y, outX, outY in anchors :
+        inX = 2.0 * x - outX
+        inY = 2.0 * y - outY
+        flatList += [inX, inY, x, y, outX, outY]
+    # end for
+
+    return flatList
+
+
+def newProcedure() :
+
+    plugIn = plugin.strokeArrows()
+
+    return plugIn.do_create_procedure("pl-stroke-arrows")
+
+
+def runArrows(procedure, pathsNumber, settings) :
+
+    image = Gimp.Image(2000, 2000)
+    layer = image.addLayer()
+
+    for i in range(pathsNumber) :
+        image.addUserPath(syntheticPath(i), "path {}".format(i))
+    # end for
+
+    config = procedure.create_config()
+    for name, value in settings.items() :
+        config.set_property(name, value)
+    # end for
+
+    Gimp.log.clear()
+    returnValues = procedure.runFunc(procedure, Gimp.RunMode.NONINTERACTIVE, image,
+                                     [layer], config, None)
+    status, error = returnValues[0], returnValues.error
+
+    if status != Gimp.PDBStatusType.SUCCESS :
+        raise RuntimeError(error.message)
+    # end if
+
+    return len(Gimp.log.pdbCalls()), len(Gimp.log.fullImageCalls())
+
+
+# run the plug-in and keep its return values, the image and the calls made;
+# drawablesNumber: layers selected, drawn on without "Create new layer", with the
+# attributes of layerProperties (see gimp_stand_in.Layer)
+def runPlugIn(procedure, pathsNumber, settings, drawablesNumber=1, layerProperties={},
+              channelsNumber=0, selection=None) :
+
+    image = Gimp.Image(2000, 2000)
+    image.selectionBounds = selection
+    layers = [ image.addLayer("layer {}".format(i)) for i in range(drawablesNumber) ]
+    for layer in layers :
+        layer.__dict__.update(layerProperties)
+    # end for
+    layers += [ Gimp.Channel(image, "channel {}".format(i), image.width, image.height)
+                for i in range(channelsNumber) ]
+
+    for i in range(pathsNumber) :
+        image.addUserPath(syntheticPath(i), "path {}".format(i))
+    # end for
+
+    config = procedure.create_config()
+    for name, value in settings.items() :
+        config.set_property(name, value)
+    # end for
+
+    Gimp.log.clear()
+    returnValues = procedure.runFunc(procedure, Gimp.RunMode.NONINTERACTIVE, image,
+                                     layers, config, None)
+
+    return returnValues, image, list(Gimp.log.calls)
+
+
+def measure(procedure, settings, pathsNumber) :
+
+    calls1, fullImage1 = runArrows(procedure, 1, settings)
+    callsN, fullImageN = runArrows(procedure, pathsNumber, settings)
+
+    perArrow = (callsN - calls1) / float(pathsNumber - 1)
+    fullImagePerArrow = (fullImageN - fullImage1) / float(pathsNumber - 1)
+
+    return {
+        "perArrow": perArrow,
+        "fixed": calls1 - perArrow,
+        "fullImagePerArrow": fullImagePerArrow,
+        "fullImageFixed": fullImage1 - fullImagePerArrow,
+    }
+
+
+# True when the calls leave the context and the selection as they were: each context
+# pushed is popped, each saved selection is removed
+def cleanedUp(calls) :
+
+    names = [ name for name, args in calls ]
+
+    return names.count("context_push") == names.count("context_pop") \
+           and names.count("Channel.save") == names.count("Image.remove_channel")
+
+
+# estimated undo memory per arrow and per run (see gimp_stand_in.pushUndo), and
+# whether undo, context and selection are restored after a failing run (no path
+# selected)
+def measureUndo(procedure, settings, pathsNumber) :
+
+    runArrows(procedure, 1, settings)
+    bytes1 = Gimp.log.undoBytes
+    runArrows(procedure, pathsNumber, settings)
+    bytesN = Gimp.log.undoBytes
+
+    perArrow = (bytesN - bytes1) / float(pathsNumber - 1)
+
+    image = Gimp.Image(2000, 2000)
+    layer = image.addLayer()
+    config = procedure.create_config()
+    for name, value in settings.items() :
+        config.set_property(name, value)
+    # end for
+    Gimp.log.clear()
+    returnValues = procedure.runFunc(procedure, Gimp.RunMode.NONINTERACTIVE, image,
+                                     [layer], config, None)
+    status = returnValues[0]
+
+    return {
+        "perArrow": perArrow,
+        "fixed": bytes1 - perArrow,
+        "restoredOnError": status != Gimp.PDBStatusType.SUCCESS and image.undoDisabled == 0
+                           and cleanedUp(Gimp.log.calls),
+    }
+
+
+# runs of the undo report: on a new layer, without undo, on the selected layer, and on
+# the selected layer through a staging layer
+UNDO_SETTINGS = [
+    ("", {}),
+    ("/noUndo", {"disableUndo": True}),
+    ("/onLayer", {"createLayer": False}),
+    ("/staging", {"createLayer": False, "stagingLayer": True}),
+]
+
+# layer properties that keep the staging layer off (see stagingTarget)
+STAGING_FALLBACKS = [("group", True), ("lockAlpha", True), ("lockContent", True)]
+
+
+def undoReport(procedure, pathsNumber) :
+
+    print("{:40s} {:>14s} {:>14s} {:>10s}".format("style/tail/tail style (2000x2000)",
+          "undo kB/arrow", "undo kB fixed", "restored"))
+
+    failures = []
+    for arrowStyle, tailType, tailStyle in combinations() :
+        for suffix, extraSettings in UNDO_SETTINGS :
+
+            settings = {"arrowStyle": arrowStyle, "tailType": tailType,
+                        "tailStyle": tailStyle}
+            settings.update(extraSettings)
+            disableUndo = settings.get("disableUndo", False)
+            result = measureUndo(procedure, settings, pathsNumber)
+            key = comboKey(arrowStyle, tailType, tailStyle, True, False) + suffix
+            print("{:40s} {:14.1f} {:14.1f} {:>10s}".format(key, result["perArrow"] / 1024.0,
+                  result["fixed"] / 1024.0, "yes" if result["restoredOnError"] else "NO"))
+
+            if not result["restoredOnError"] :
+                failures.append(key + ": undo not restored after an error")
+            if disableUndo and ( result["perArrow"] != 0 or result["fixed"] != 0 ) :
+                failures.append(key + ": undo memory used with undo disabled")
+
+        # end for
+    # end for
+
+    # exception in the thread computing the arrows: raised in the run, undo, context
+    # and selection restored all the same
+    def failingGeometries(*arguments) :
+        raise ZeroDivisionError("arrow computation failed")
+        yield
+
+    computing = plugin.groupedArrowGeometries
+    plugin.groupedArrowGeometries = failingGeometries
+    try :
+        runPlugIn(procedure, pathsNumber, {"pipelined": True})
+        failures.append("exception of the computing thread not raised")
+    except ZeroDivisionError :
+        if not cleanedUp(Gimp.log.calls) :
+            failures.append("context or selection not restored after an exception")
+        # end if
+    finally :
+        plugin.groupedArrowGeometries = computing
+    # end try
+
+    # exception while an arrow is drawn: the computing thread joined before the run ends
+    # (more paths than the queue holds, so that it is still computing)
+    def failingArrow(*arguments) :
+        raise ZeroDivisionError("arrow drawing failed")
+
+    drawing = plugin.drawArrow
+    plugin.drawArrow = failingArrow
+    threads = threading.active_count()
+    try :
+        runPlugIn(procedure, 4 * plugin.PIPELINE_QUEUE_SIZE, {"pipelined": True})
+        failures.append("exception of the drawing not raised")
+    except ZeroDivisionError :
+        if threading.active_count() != threads :
+            failures.append("computing thread still running after an exception")
+        # end if
+    finally :
+        plugin.drawArrow = drawing
+    # end try
+
+    # layers a paste would change: drawn on directly, no staging layer
+    for name, value in STAGING_FALLBACKS :
+        settings = {"createLayer": False, "stagingLayer": True}
+        returnValues, image, calls = runPlugIn(procedure, pathsNumber, settings, 1, {name: value})
+        if any( callName == "floating_sel_anchor" for callName, args in calls ) :
+            failures.append("staging layer pasted on a layer with {}={}".format(name, value))
+        # end if
+    # end for
+
+    # staging layer pasted on the user's layers: the same layer items, drawn on, and the
+    # staging layer and its buffer gone
+    settings = {"createLayer": False, "stagingLayer": True}
+    returnValues, image, calls = runPlugIn(procedure, pathsNumber, settings, 2)
+    names = [ callName for callName, args in calls ]
+    userLayers = [ layer for layer in image.layers if layer.name.startswith("layer ") ]
+    if len(image.layers) != 2 or len(userLayers) != 2 \
+       or any( layer.bounds is None for layer in userLayers ) :
+        failures.append("staging layer not pasted on the user's layers")
+    if image.selectedLayers != userLayers or names.count("floating_sel_anchor") != 2 :
+        failures.append("user's layers not selected again after the staging layer")
+    if Gimp.buffers != {} :
+        failures.append("buffer of the staging layer not deleted")
+    # end if
+
+    # layers and channels selected together: both selected again at the end
+    returnValues, image, calls = runPlugIn(procedure, pathsNumber, {"createLayer": False}, 2,
+                                           {}, 1)
+    reselected = dict( (callName, args[-1]) for callName, args in calls
+                       if callName in ("Image.set_selected_layers", "Image.set_selected_channels") )
+    if reselected != {"Image.set_selected_layers": 2, "Image.set_selected_channels": 1} :
+        failures.append("layers and channel not both selected again: {}".format(reselected))
+    # end if
+
+    if failures :
+        print("\n".join(failures))
+        return 1
+    # end if
+
+    return 0
+
+
+# calls that only read the image or set the context (pushed and popped)
+def readOnly(name) :
+
+    method = name.split(".")[-1]
+
+    return method.startswith("get_") or method.startswith("is_") or method.startswith("stroke_get_") \
+           or method.startswith("context_") \
+           or ( name.startswith("Selection.") and name != "Selection.none" ) \
+           or name in ("message", "color_parse_name", "Image.undo_is_enabled")
+
+
+# calls of a real run counted by the plan
+PLAN_CALLS = {
+    "paths": ["Path.new"],
+    "strokes": ["Drawable.edit_stroke_item"],
+    "fills": ["Drawable.edit_fill"],
+    "pixelWrites": ["Drawable.merge_shadow"],
+    "selectionOps": ["Image.select_item", "Image.select_rectangle", "Selection.none"],
+    "layers": ["Layer.new"],
+    "merges": ["floating_sel_anchor"],
+}
+
+PLAN_SETTINGS = [
+    {},
+    {"createLayer": False},
+    {"keepPaths": True},
+    {"rasterFill": True},
+    {"rasterFill": True, "keepPaths": True},
+    {"outlineFill": True},
+    {"outlineFill": True, "rasterFill": True},
+    {"rasterFill": True, "markerSpacing": 60.0}, # repeated heads in several pixel writes
+    {"rasterFill": True, "wingLen": 300.0}, # heads over RASTER_MAX_AREA: selection fills
+    {"animationFrames": 3},
+    {"arrowHeadOnly": True},
+    {"arrowTailOnly": True},
+    {"createLayer": False, "drawables": 3},
+    {"createLayer": False, "rasterFill": True, "drawables": 3},
+    {"createLayer": False, "stagingLayer": True},
+    {"createLayer": False, "stagingLayer": True, "rasterFill": True, "drawables": 3},
+    {"createLayer": False, "stagingLayer": True, "selection": [0, 0, 1000, 2000]},
+]
+
+
+# dry run of every combination: nothing changed in the image, and the planned totals
+# are the calls made by the same run for real
+def planReport(procedure, pathsNumber) :
+
+    failures = []
+    runs = 0
+
+    for extraSettings in PLAN_SETTINGS :
+        for arrowStyle, tailType, tailStyle in combinations() :
+
+            settings = {"arrowStyle": arrowStyle, "tailType": tailType, "tailStyle": tailStyle}
+            settings.update(extraSettings)
+            drawablesNumber = settings.pop("drawables", 1) # selected layers, not an argument
+            selection = settings.pop("selection", None) # user selection, not an argument
+            key = "/".join([arrowStyle, tailType, tailStyle] +
+                           [ "{}={}".format(name, value) for name, value in extraSettings.items() ])
+
+            settings["dryRun"] = True
+            returnValues, image, calls = runPlugIn(procedure, pathsNumber, settings,
+                                                   drawablesNumber, {}, 0, selection)
+            changes = sorted(set( name for name, args in calls if not readOnly(name) ))
+            if changes :
+                failures.append("{}: dry run calls {}".format(key, ", ".join(changes)))
+            # end if
+            plan = json.loads(returnValues[3])
+
+            settings["dryRun"] = False
+            returnValues, image, calls = runPlugIn(procedure, pathsNumber, settings,
+                                                   drawablesNumber, {}, 0, selection)
+            for count, names in PLAN_CALLS.items() :
+                made = sum( 1 for name, args in calls if name in names )
+                if plan["total"][count] != made :
+                    failures.append("{}: {} planned {}, made {}".format(key, count,
+                                    plan["total"][count], made))
+            # end for
+            runs += 1
+
+        # end for
+    # end for
+
+    print("{} combinations, dry run against real run".format(runs))
+    print("example plan ({} paths):".format(pathsNumber))
+    print(json.dumps(plan["total"]), plan["layerSize"])
+
+    if failures :
+        print("\n".join(failures))
+        return 1
+    # end if
+
+    print("plan matches")
+
+    return 0
+
+
+# contact sheet on one path, with each sweep: cells, image size and calls; then the
+# geometry of the cells computed on the shared curve against a curve per cell
+def sheetReport(repeats=5) :
+
+    procedure = plugin.strokeArrows().do_create_procedure(plugin.SHEET_PROCEDURE)
+
+    for sweepParameter, sweepValues in (("none", ""), ("harpoonFactor", "-5 0 2.5"),
+                                        ("tipAngle", "20 35 60 90")) :
+
+        image = Gimp.Image(2000, 2000)
+        layer = image.addLayer()
+        image.addUserPath(syntheticPath(0), "path 0")
+
+        config = procedure.create_config()
+        config.set_property("sweepParameter", sweepParameter)
+        config.set_property("sweepValues", sweepValues)
+
+        Gimp.log.clear()
+        returnValues = procedure.runFunc(procedure, Gimp.RunMode.NONINTERACTIVE, image,
+                                         [layer], config, None)
+        if returnValues[0] != Gimp.PDBStatusType.SUCCESS :
+            print("{}: {}".format(sweepParameter, returnValues.error.message))
+            return 1
+        # end if
+
+        sheetImage = returnValues[4]
+        print("sweep {:14s} {:3d} cells, {} x {} px, {} PDB calls".format(sweepParameter,
+              returnValues[1], sheetImage.width, sheetImage.height, len(Gimp.log.pdbCalls())))
+
+    # end for
+
+    # exception while the cells are drawn: undo of the sheet, context and selection back
+    # as they were all the same
+    def failingArrow(*arguments) :
+        raise ZeroDivisionError("arrow drawing failed")
+
+    drawing = plugin.drawArrow
+    plugin.drawArrow = failingArrow
+    Gimp.log.clear()
+    try :
+        procedure.runFunc(procedure, Gimp.RunMode.NONINTERACTIVE, image, [layer], config, None)
+        print("exception of the cells not raised")
+        return 1
+    except ZeroDivisionError :
+        names = [ name for name, args in Gimp.log.calls ]
+        if not cleanedUp(Gimp.log.calls) \
+           or names.count("Image.undo_disable") != names.count("Image.undo_enable") :
+            print("undo, context or selection of the sheet not restored after an exception")
+            return 1
+        # end if
+    finally :
+        plugin.drawArrow = drawing
+    # end try
+
+    flatList = syntheticPath(0)
+    styles = [ arrow_geometry.prepareStyle(arrowStyle, 4.0, 40.0, 35.0, harpoonFactor, tailType,
+                                           tailStyle, 20.0, True)
+               for harpoonFactor in (-5.0, 0.0, 2.5) for arrowStyle in plugin.SHEET_STYLES
+               for tailType, tailStyle in plugin.SHEET_TAILS ]
+
+    start = time.perf_counter()
+    for i in range(repeats) :
+        curve = arrow_geometry.Curve.fromFlatList(flatList)
+        list(arrow_geometry.styleVariants(curve, styles))
+    # end for
+    shared = (time.perf_counter() - start) / repeats
+
+    start = time.perf_counter()
+    for i in range(repeats) :
+        for style in styles :
+            arrow_geometry.computeArrow(None, style, curve=arrow_geometry.Curve.fromFlatList(flatList))
+        # end for
+    # end for
+    separate = (time.perf_counter() - start) / repeats
+
+    print("{} cells: shared curve {:.1f} ms, a curve per cell {:.1f} ms".format(len(styles),
+          shared * 1000.0, separate * 1000.0))
+
+    return 0
+
+
+# resident mode on the stand-in: the served procedure makes the same calls as the
+# plug-in procedure, keeps the prepared styles (none prepared again after the first
+# call, where pl-stroke-arrows prepares them at each call), and the service ends when
+# stopped; the start of python and GIMP saved by the service is measured by
+# benchmark_gimp.py
+def serviceReport(pathsNumber, callsNumber=20) :
+
+    plugIn = plugin.strokeArrows()
+    service = plugIn.do_create_procedure(plugin.SERVICE_PROCEDURE)
+    served = []
+
+    # styles prepared during a call
+    prepared = []
+    preparing = arrow_geometry.prepareStyle
+    def countedPrepareStyle(*arguments, **parameters) :
+        prepared.append(1)
+        return preparing(*arguments, **parameters)
+
+    def servedCall(tempProcedures) :
+        del prepared[:]
+        returnValues, image, calls = runPlugIn(tempProcedures["pl-stroke-arrows-served"],
+                                               pathsNumber, {})
+        served.append((len(prepared), returnValues[0], [ name for name, args in calls ],
+                       len(plugin.serviceState["styles"])))
+
+    def stopCall(tempProcedures) :
+        stop = tempProcedures[plugin.SERVICE_STOP_PROCEDURE]
+        stop.runFunc(stop, stop.create_config(), None)
+
+    # calls with a new style each: the kept styles stay within the cache size
+    sizes = []
+    def newStyleCall(tempProcedures, wingLen) :
+        runPlugIn(tempProcedures["pl-stroke-arrows-served"], 1, {"wingLen": wingLen})
+        sizes.append(len(plugin.serviceState["styles"]))
+
+    for i in range(callsNumber) :
+        plugIn.queueCall(servedCall)
+    # end for
+    for i in range(plugin.STYLE_CACHE_SIZE + 10) :
+        plugIn.queueCall(lambda tempProcedures, wingLen=10.0 + i : newStyleCall(tempProcedures, wingLen))
+    # end for
+    plugIn.queueCall(stopCall)
+
+    procedure = newProcedure()
+    direct = []
+
+    arrow_geometry.prepareStyle = countedPrepareStyle
+    try :
+        service.runFunc(service, service.create_config(), None)
+        for i in range(callsNumber) :
+            del prepared[:]
+            returnValues, image, calls = runPlugIn(procedure, pathsNumber, {})
+            direct.append((len(prepared), [ name for name, args in calls ]))
+        # end for
+    finally :
+        arrow_geometry.prepareStyle = preparing
+    # end try
+
+    failures = []
+    if any( status != Gimp.PDBStatusType.SUCCESS for count, status, names, styles in served ) :
+        failures.append("a served call failed")
+    if any( names != direct[0][1] for count, status, names, styles in served ) :
+        failures.append("served calls differ from pl-stroke-arrows")
+    if any( styles != 1 for count, status, names, styles in served ) :
+        failures.append("prepared style not kept between calls")
+    if any( count != 0 for count, status, names, styles in served[1:] ) \
+       or any( count == 0 for count, names in direct ) :
+        failures.append("served calls prepare their style again")
+    if max(sizes) > plugin.STYLE_CACHE_SIZE :
+        failures.append("{} styles kept, more than {}".format(max(sizes), plugin.STYLE_CACHE_SIZE))
+    if plugIn.tempProcedures != {} or plugin.serviceState["running"] :
+        failures.append("service not stopped")
+    # end if
+
+    print("{} calls of {} paths, styles prepared: served {}, pl-stroke-arrows {}".format(
+          callsNumber, pathsNumber, sum( call[0] for call in served ),
+          sum( call[0] for call in direct )))
+
+    if failures :
+        print("\n".join(failures))
+        return 1
+    # end if
+
+    print("same calls, styles kept (at most {}), service stopped".format(plugin.STYLE_CACHE_SIZE))
+
+    return 0
+
+
+# SVG text of the synthetic paths, one <path> each, drawn in image pixels; extra:
+# elements added at the end (not drawn as the paths)
+def syntheticSvg(pathsNumber, extra="") :
+
+    lines = ['<svg xmlns="http://www.w3.org/2000/svg" width="2000" height="2000">']
+
+    for i in range(pathsNumber) :
+        coords = [ repr(value) for value in syntheticPath(i)[2:-2] ]
+        d = "M {} {} ".format(*coords[:2]) + " ".join( "C " + " ".join(coords[k:k + 6])
+                                                       for k in range(2, len(coords), 6) )
+        lines.append('<path id="path{}" d="{}"/>'.format(i, d))
+    # end for
+
+    lines.append(extra)
+    lines.append("</svg>")
+
+    return "\n".join(lines)
+
+
+# calls that change the image, with the points of the paths made
+def drawingCalls(calls) :
+
+    return [ (name, [ [ round(value, 6) for value in flatList ] for flatList, closed in args[0].strokes ]
+                    if name == "Path.stroke_new_from_points" else None)
+             for name, args in calls if not readOnly(name) ]
+
+
+# SVG procedure on the stand-in: the paths of a file draw the same arrows as the same
+# paths selected in the image, without reading or adding any path item, and without
+# staging layer; paths hidden (<defs>, display none) or with wrong parameters are left
+# out; the memory taken while reading the file does not grow with the number of paths
+def svgReport(pathsNumber) :
+
+    procedure = plugin.strokeArrows().do_create_procedure(plugin.SVG_PROCEDURE)
+    failures = []
+
+    # a path in <defs> (not drawn), one with wrong parameters, and the same synthetic
+    # path again through a group transform
+    extra = ('<defs><path id="hidden" d="M 0 0 C 10 10 20 20 30 30"/></defs>\n'
+             '<path id="styled" style="fill:none;display:none" d="M 0 0 L 100 100"/>\n'
+             '<path id="wrong" data-arrow="style=round" d="M 0 0 L 100 100"/>\n'
+             '<g transform="translate(10 20) scale(2)"><path id="scaled" d="M 50 50 L 100 50"/></g>')
+
+    with tempfile.TemporaryDirectory() as workDir :
+
+        svgName = os.path.join(workDir, "paths.svg")
+        with open(svgName, "w") as svgFile :
+            svgFile.write(syntheticSvg(pathsNumber))
+        # end with
+
+        for settings in ({}, {"createLayer": False}, {"rasterFill": True}, {"outlineFill": True}) :
+
+            svgSettings = dict(settings)
+            svgSettings["svgFile"] = Gimp.File.new_for_path(svgName)
+            returnValues, image, svgCalls = runPlugIn(procedure, 0, svgSettings)
+            returnValues, image, pathCalls = runPlugIn(newProcedure(), pathsNumber, settings)
+
+            key = " ".join( "{}={}".format(name, value) for name, value in settings.items() ) or "defaults"
+            names = set( name for name, args in svgCalls )
+            if names & {"Path.get_strokes", "Path.stroke_get_points"} :
+                failures.append("{}: paths of the image read".format(key))
+            if drawingCalls(svgCalls) != drawingCalls(pathCalls) :
+                failures.append("{}: not the same drawing as the paths".format(key))
+            # end if
+
+        # end for
+
+        # staging layer: not used, it would need all the paths at once
+        svgSettings = {"svgFile": Gimp.File.new_for_path(svgName), "createLayer": False,
+                       "stagingLayer": True}
+        returnValues, image, calls = runPlugIn(procedure, 0, svgSettings)
+        if any( name == "floating_sel_anchor" for name, args in calls ) :
+            failures.append("staging layer used with an SVG file")
+        # end if
+
+        with open(svgName, "w") as svgFile :
+            svgFile.write(syntheticSvg(pathsNumber, extra))
+        # end with
+        svgSettings = {"svgFile": Gimp.File.new_for_path(svgName), "dryRun": True}
+        returnValues, image, calls = runPlugIn(procedure, 0, svgSettings)
+        plan = json.loads(returnValues[3])
+        drawnNames = [ work["name"] for work in plan["paths"] ]
+        messages = [ args[0] for name, args in calls if name == "message" ]
+
+        if drawnNames != [ "path{}".format(i) for i in range(pathsNumber) ] + ["scaled"] :
+            failures.append("paths drawn: {}".format(", ".join(drawnNames)))
+        if len(messages) != 1 or "wrong" not in messages[0] :
+            failures.append("wrong parameters not reported")
+        # end if
+
+        # memory taken while reading files of growing size
+        peaks = []
+        userParameters = {"arrowStyle": "filled", "strokeWidth": 4.0, "wingLen": 40.0,
+                          "tipAngle": 35.0, "harpoonFactor": 0.0, "tailType": "none",
+                          "tailStyle": "default", "tailSize": 80.0, "tailUnitRelative": True,
+                          "markerSpacing": 0.0}
+        for number in (200, 2000) :
+            with open(svgName, "w") as svgFile :
+                svgFile.write(syntheticSvg(number))
+            # end with
+            tracemalloc.start()
+            start = time.perf_counter()
+            count = sum( 1 for group in plugin.svgGroups(svgName, userParameters) )
+            duration = time.perf_counter() - start
+            peaks.append(tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+            print("{:5d} paths read: {:.1f} ms, peak {:.0f} kB".format(count, duration * 1000.0,
+                  peaks[-1] / 1024.0))
+        # end for
+
+        if peaks[1] > 2 * peaks[0] :
+            failures.append("memory grows with the number of paths")
+        # end if
+
+    # end with
+
+    if failures :
+        print("\n".join(failures))
+        return 1
+    # end if
+
+    print("same drawing as the paths, no path read, flat memory")
+
+    return 0
+
+
+def comboKey(arrowStyle, tailType, tailStyle, createLayer, keepPaths) :
+
+    return "{}/{}/{}{}{}".format(arrowStyle, tailType, tailStyle,
+                                 "" if createLayer else "/onLayer",
+                                 "/keepPaths" if keepPaths else "")
+
+
+#*************************************************************************************
+
+
+def main() :
+
+    parser = argparse.ArgumentParser(description="Count the PDB calls made per arrow.")
+    parser.add_argument("--paths", type=int, default=5, help="number of paths of the large run")
+    parser.add_argument("--check", action="store_true", help="fail when the budget is exceeded")
+    parser.add_argument("--write-budget", action="store_true", help="store the counts as budget")
+    parser.add_argument("--detail", metavar="STYLE/TAIL/TAILSTYLE",
+                        help="list the calls of a single arrow run")
+    parser.add_argument("--undo", action="store_true",
+                        help="estimated undo memory, with and without the disable undo option")
+    parser.add_argument("--plan", action="store_true",
+                        help="check the dry run against a real run")
+    parser.add_argument("--sheet", action="store_true",
+                        help="style contact sheet calls, and the time saved by the shared geometry")
+    parser.add_argument("--service", action="store_true",
+                        help="check the resident mode against the plug-in procedure")
+    parser.add_argument("--svg", action="store_true",
+                        help="check the SVG procedure against the same paths in the image")
+    args = parser.parse_args()
+
+    if args.sheet :
+        return sheetReport()
+    # end if
+
+    if args.service :
+        return serviceReport(args.paths)
+    # end if
+
+    if args.svg :
+        return svgReport(args.paths)
+    # end if
+
+    procedure = newProcedure()
+
+    if args.undo :
+        return undoReport(procedure, args.paths)
+    # end if
+
+    if args.plan :
+        return planReport(procedure, args.paths)
+    # end if
+
+    if args.detail :
+        arrowStyle, tailType, tailStyle = args.detail.split("/")
+        runArrows(procedure, 1, {"arrowStyle": arrowStyle, "tailType": tailType,
+                                 "tailStyle": tailStyle})
+        for name, count in sorted(Gimp.log.summary().items()) :
+            print("{:5d}  {}".format(count, name))
+        # end for
+        return 0
+    # end if
+
+    results = {}
+
+    for createLayer in (True, False) :
+        for keepPaths in (False, True) :
+            for arrowStyle, tailType, tailStyle in combinations() :
+
+                settings = {"arrowStyle": arrowStyle, "tailType": tailType,
+                            "tailStyle": tailStyle, "createLayer": createLayer,
+                            "keepPaths": keepPaths}
+                key = comboKey(arrowStyle, tailType, tailStyle, createLayer, keepPaths)
+                results[key] = measure(procedure, settings, args.paths)
+
+            # end for
+        # end for
+    # end for
+
+    print("{:40s} {:>9s} {:>7s} {:>12s} {:>11s}".format(
+          "style/tail/tail style", "PDB/arrow", "fixed", "full-img/arr", "full-img fix"))
+
+    for key, result in results.items() :
+        print("{:40s} {:9.1f} {:7.1f} {:12.1f} {:11.1f}".format(key, result["perArrow"],
+              result["fixed"], result["fullImagePerArrow"], result["fullImageFixed"]))
+    # end for
+
+    if args.write_budget :
+        with open(BUDGET_FILE, "w") as budgetFile :
+            json.dump(results, budgetFile, indent=1, sort_keys=True)
+        # end with
+        print("budget written to", BUDGET_FILE)
+    # end if
+
+    if args.check :
+
+        with open(BUDGET_FILE) as budgetFile :
+            budget = json.load(budgetFile)
+        # end with
+
+        failures = []
+        for key, result in results.items() :
+            if key not in budget :
+                continue
+            for field in ("perArrow", "fullImagePerArrow", "fixed", "fullImageFixed") :
+                if result[field] > budget[key][field] + 1e-6 :
+                    failures.append("{} {}: {:.1f} > {:.1f}".format(key, field,
+                                    result[field], budget[key][field]))
+            # end for
+        # end for
+
+        if failures :
+            print("\nPDB budget exceeded:")
+            print("\n".join(failures))
+            return 1
+        # end if
+
+        print("\nPDB budget respected")
+    # end if
+
+    return 0
+
+
+if __name__ == "__main__" :
+    sys.exit(main())
@@ -0,0 +1,886 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Stand-in for the gi.repository.Gimp API, used to run the plug-in offline
+#
+# Every call that would be a round trip to the GIMP core is recorded with its
+# arguments, so the whole drawArrows flow can be run and measured without GIMP.
+# Only the part of the API used by pl_stroke_arrows.py is provided.
+#
+# License: GPLv3 (see pl_stroke_arrows.py)
+
+import sys
+import array
+import types
+
+
+#*************************************************************************************
+
+
+# calls that touch the whole canvas (selection mask or full size layer)
+FULL_IMAGE_CALLS = {
+    "Image.select_item",
+    "Channel.save",
+    "Image.remove_channel",
+    "Selection.is_empty",
+    "Selection.bounds",
+    "Layer.new",
+    "Layer.resize",
+    "Image.select_rectangle",
+    "Selection.none",
+}
+
+# rough size of what the undo stack keeps, see Image.pushUndo
+UNDO_PIXEL_BYTES = 4     # RGBA 8 bits copy of the touched pixels
+UNDO_MASK_BYTES = 1      # selection mask copy
+UNDO_PATH_POINT_BYTES = 16
+
+# calls that never leave the plug-in process
+LOCAL_CALLS = {
+    "color_parse_name",
+}
+
+
+class CallLog :
+
+    def __init__(self) :
+        self.calls = []
+        self.undoBytes = 0
+
+    def record(self, name, *args) :
+        self.calls.append((name, args))
+
+    def clear(self) :
+        self.calls = []
+        self.undoBytes = 0
+
+    def count(self, name=None) :
+        if name is None :
+            return len(self.pdbCalls())
+        return sum(1 for thisName, args in self.calls if thisName == name)
+
+    def pdbCalls(self) :
+        return [ call for call in self.calls if call[0] not in LOCAL_CALLS ]
+
+    def fullImageCalls(self) :
+        return [ call for call in self.calls if call[0] in FULL_IMAGE_CALLS ]
+
+    def summary(self) :
+        counts = {}
+        for thisName, args in self.pdbCalls() :
+            counts[thisName] = counts.get(thisName, 0) + 1
+        # end for
+        return counts
+
+
+log = CallLog()
+
+
+#*************************************************************************************
+
+
+def boundsOf(flatList) :
+
+    xs = flatList[0::2]
+    ys = flatList[1::2]
+
+    return [min(xs), min(ys), max(xs), max(ys)]
+
+
+def boundsArea(box) :
+
+    if box is None :
+        return 0
+
+    return max(0.0, box[2] - box[0]) * max(0.0, box[3] - box[1])
+
+
+def unionBounds(box1, box2) :
+
+    if box1 is None :
+        return box2
+    if box2 is None :
+        return box1
+
+    return [min(box1[0], box2[0]), min(box1[1], box2[1]),
+            max(box1[2], box2[2]), max(box1[3], box2[3])]
+
+
+#*************************************************************************************
+
+
+class Enum :
+
+    def __init__(self, **values) :
+        self.__dict__.update(values)
+
+
+RunMode = Enum(INTERACTIVE=0, NONINTERACTIVE=1, WITH_LAST_VALS=2)
+PDBStatusType = Enum(EXECUTION_ERROR=0, CALLING_ERROR=1, PASS_THROUGH=2, SUCCESS=3, CANCEL=4)
+PDBProcType = Enum(INTERNAL=0, PLUGIN=1, PERSISTENT=2, TEMPORARY=3)
+FillType = Enum(FOREGROUND=0, BACKGROUND=1, CIELAB_MIDDLE_GRAY=2, WHITE=3, TRANSPARENT=4,
+                PATTERN=5)
+FileChooserAction = Enum(OPEN=0, SAVE=1, SELECT_FOLDER=2, CREATE_FOLDER=3)
+
+
+class Error :
+
+    def __init__(self, message="") :
+        self.message = message
+
+    @staticmethod
+    def new_literal(quark, message, code) :
+        return Error(message)
+
+
+class Parasite :
+
+    def __init__(self, name, flags, data) :
+        self.name = name
+        self.flags = flags
+        self.data = list(data)
+
+    @staticmethod
+    def new(name, flags, data) :
+        return Parasite(name, flags, data)
+
+    def get_data(self) :
+        return self.data
+
+
+#*************************************************************************************
+
+
+class Item :
+
+    def __init__(self, image, name) :
+        self.image = image
+        self.name = name
+        self.bounds = None # drawn area
+
+    def get_name(self) :
+        log.record("Item.get_name", self)
+        return self.name
+
+    def get_parent(self) :
+        log.record("Item.get_parent", self)
+        return None
+
+    def is_layer(self) :
+        return False
+
+    def is_channel(self) :
+        return False
+
+    def is_layer_mask(self) :
+        return False
+
+
+class Path (Item) :
+
+    def __init__(self, image, name) :
+        Item.__init__(self, image, name)
+        self.strokes = []
+        self.parasites = {}
+
+    @staticmethod
+    def new(image, name) :
+        log.record("Path.new", image, name)
+        return Path(image, name)
+
+    def stroke_new_from_points(self, strokeType, flatList, closed) :
+        log.record("Path.stroke_new_from_points", self, len(flatList), closed)
+        self.strokes.append((list(flatList), closed))
+        self.bounds = unionBounds(self.bounds, boundsOf(flatList))
+        return len(self.strokes)
+
+    def bezier_stroke_new_ellipse(self, x, y, radiusX, radiusY, angle) :
+        log.record("Path.bezier_stroke_new_ellipse", self, x, y, radiusX, radiusY)
+        box = [x - radiusX, y - radiusY, x + radiusX, y + radiusY]
+        self.strokes.append((box, True))
+        self.bounds = unionBounds(self.bounds, box)
+        return len(self.strokes)
+
+    def get_strokes(self) :
+        log.record("Path.get_strokes", self)
+        return list(range(1, len(self.strokes) + 1))
+
+    def stroke_get_points(self, strokeID) :
+        log.record("Path.stroke_get_points", self, strokeID)
+        flatList, closed = self.strokes[strokeID - 1]
+        return 0, list(flatList), closed
+
+    def get_parasite(self, name) :
+        log.record("Item.get_parasite", self, name)
+        return self.parasites.get(name)
+
+
+class Drawable (Item) :
+
+    def __init__(self, image, name, width, height) :
+        Item.__init__(self, image, name)
+        self.width = width
+        self.height = height
+        self.offsets = [0, 0]
+
+    def edit_stroke_item(self, item) :
+        log.record("Drawable.edit_stroke_item", self, item)
+        self.bounds = unionBounds(self.bounds, item.bounds)
+        self.image.pushUndo(boundsArea(item.bounds) * UNDO_PIXEL_BYTES)
+        return True
+
+    def edit_fill(self, fillType) :
+        log.record("Drawable.edit_fill", self, fillType)
+        self.bounds = unionBounds(self.bounds, self.image.selectionBounds)
+        self.image.pushUndo(boundsArea(self.image.selectionBounds) * UNDO_PIXEL_BYTES)
+        return True
+
+    def fill(self, fillType) :
+        log.record("Drawable.fill", self, fillType)
+        self.bounds = [0, 0, self.width, self.height]
+        self.image.pushUndo(self.width * self.height * UNDO_PIXEL_BYTES)
+        return True
+
+    def get_width(self) :
+        log.record("Drawable.get_width", self)
+        return self.width
+
+    def get_height(self) :
+        log.record("Drawable.get_height", self)
+        return self.height
+
+    def get_offsets(self) :
+        log.record("Drawable.get_offsets", self)
+        return True, self.offsets[0], self.offsets[1]
+
+    def get_buffer(self) :
+        log.record("Drawable.get_buffer", self)
+        return Buffer(self, False)
+
+    def get_shadow_buffer(self) :
+        log.record("Drawable.get_shadow_buffer", self)
+        return Buffer(self, True)
+
+    # the shadow is applied inside the selection bounds (whole drawable when empty)
+    def merge_shadow(self, pushUndo) :
+        log.record("Drawable.merge_shadow", self, pushUndo)
+        box = self.image.selectionBounds
+        if box is None :
+            box = [0, 0, self.width, self.height]
+        self.bounds = unionBounds(self.bounds, box)
+        if pushUndo :
+            self.image.pushUndo(boundsArea(box) * UNDO_PIXEL_BYTES)
+        return True
+
+    def update(self, x, y, width, height) :
+        log.record("Drawable.update", self, x, y, width, height)
+        return True
+
+
+# Gegl.Buffer of a drawable, transparent pixels; only the RGBA float format
+class Buffer :
+
+    def __init__(self, drawable, shadow) :
+        self.drawable = drawable
+        self.shadow = shadow
+
+    def get(self, rectangle, scale, formatName, abyssPolicy) :
+        log.record("Buffer.get", self, rectangle.width, rectangle.height, formatName)
+        return array.array("f", [0.0] * (4 * rectangle.width * rectangle.height)).tobytes()
+
+    def set(self, rectangle, formatName, data) :
+        log.record("Buffer.set", self, rectangle.width, rectangle.height, formatName)
+
+    def flush(self) :
+        log.record("Buffer.flush", self)
+
+
+class Rectangle :
+
+    def __init__(self, x, y, width, height) :
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+
+    @staticmethod
+    def new(x, y, width, height) :
+        return Rectangle(x, y, width, height)
+
+
+class Layer (Drawable) :
+
+    def __init__(self, image, name, width, height) :
+        Drawable.__init__(self, image, name, width, height)
+        # what drawing on the layer depends on: plain layer by default
+        self.group = False
+        self.lockAlpha = False
+        self.lockContent = False
+
+    @staticmethod
+    def new(image, name, width, height, imageType, opacity, mode) :
+        log.record("Layer.new", image, name, width, height)
+        return Layer(image, name, width, height)
+
+    def is_layer(self) :
+        return True
+
+    def is_group(self) :
+        log.record("Item.is_group", self)
+        return self.group
+
+    def get_lock_alpha(self) :
+        log.record("Layer.get_lock_alpha", self)
+        return self.lockAlpha
+
+    def get_lock_content(self) :
+        log.record("Item.get_lock_content", self)
+        return self.lockContent
+
+    def resize(self, width, height, offsetX, offsetY) :
+        log.record("Layer.resize", self, width, height, offsetX, offsetY)
+        self.image.pushUndo(self.width * self.height * UNDO_PIXEL_BYTES)
+        self.width = width
+        self.height = height
+        self.offsets = [self.offsets[0] - offsetX, self.offsets[1] - offsetY]
+
+    def set_offsets(self, offsetX, offsetY) :
+        log.record("Layer.set_offsets", self, offsetX, offsetY)
+        self.offsets = [offsetX, offsetY]
+
+
+class TextLayer (Layer) :
+
+    @staticmethod
+    def new(image, text, font, size, unit) :
+        log.record("TextLayer.new", image, text, size)
+        return TextLayer(image, text, int(size * max(len(line) for line in text.split("\n"))),
+                         int(size * (text.count("\n") + 1)))
+
+
+class Unit :
+
+    @staticmethod
+    def pixel() :
+        return "px"
+
+
+class Channel (Drawable) :
+
+    def __init__(self, image, name, width, height, bounds=None) :
+        Drawable.__init__(self, image, name, width, height)
+        self.bounds = bounds
+
+    def is_channel(self) :
+        return True
+
+    def save(self, image) :
+        log.record("Channel.save", self)
+        return Channel(image, "selection copy", image.width, image.height, image.selectionBounds)
+
+
+#*************************************************************************************
+
+
+class Image :
+
+    def __init__(self, width=1000, height=1000, baseType=0) :
+        self.width = width
+        self.height = height
+        self.baseType = baseType
+        self.layers = []
+        self.paths = []
+        self.channels = []
+        self.selectedPaths = []
+        self.selectedLayers = []
+        self.selectionBounds = None # None: empty selection
+        self.undoGroups = 0
+        self.undoDisabled = 0
+
+    @staticmethod
+    def new(width, height, baseType) :
+        log.record("Image.new", width, height, baseType)
+        return Image(width, height, baseType)
+
+    # helpers for the measurement scripts, not part of the API
+    def addUserPath(self, flatList, name="path", arrowParasite=None) :
+        thisPath = Path(self, name)
+        if arrowParasite is not None :
+            thisPath.parasites["arrow"] = Parasite("arrow", 0, arrowParasite.encode("utf-8"))
+        thisPath.strokes.append((list(flatList), False))
+        thisPath.bounds = boundsOf(flatList)
+        self.paths.append(thisPath)
+        self.selectedPaths.append(thisPath)
+        return thisPath
+
+    # estimated memory kept by the undo stack for one operation, in log.undoBytes
+    def pushUndo(self, size) :
+        if self.undoDisabled == 0 :
+            log.undoBytes += int(size)
+
+    def addLayer(self, name="background") :
+        layer = Layer(self, name, self.width, self.height)
+        self.layers.append(layer)
+        self.selectedLayers = [layer]
+        return layer
+
+    # API
+    def get_width(self) :
+        log.record("Image.get_width", self)
+        return self.width
+
+    def get_height(self) :
+        log.record("Image.get_height", self)
+        return self.height
+
+    def get_base_type(self) :
+        log.record("Image.get_base_type", self)
+        return self.baseType
+
+    def undo_group_start(self) :
+        log.record("Image.undo_group_start", self)
+        self.undoGroups += 1
+
+    def undo_group_end(self) :
+        log.record("Image.undo_group_end", self)
+        self.undoGroups -= 1
+
+    def undo_disable(self) :
+        log.record("Image.undo_disable", self)
+        self.undoDisabled += 1
+        return True
+
+    def undo_enable(self) :
+        log.record("Image.undo_enable", self)
+        self.undoDisabled -= 1
+        return True
+
+    def undo_freeze(self) :
+        log.record("Image.undo_freeze", self)
+        self.undoDisabled += 1
+        return True
+
+    def undo_thaw(self) :
+        log.record("Image.undo_thaw", self)
+        self.undoDisabled -= 1
+        return True
+
+    def undo_is_enabled(self) :
+        log.record("Image.undo_is_enabled", self)
+        return self.undoDisabled == 0
+
+    def get_selected_paths(self) :
+        log.record("Image.get_selected_paths", self)
+        return list(self.selectedPaths)
+
+    def set_selected_paths(self, paths) :
+        log.record("Image.set_selected_paths", self, len(paths))
+        self.selectedPaths = list(paths)
+
+    def set_selected_layers(self, layers) :
+        log.record("Image.set_selected_layers", self, len(layers))
+        self.selectedLayers = list(layers)
+
+    def set_selected_channels(self, channels) :
+        log.record("Image.set_selected_channels", self, len(channels))
+
+    def get_selection(self) :
+        log.record("Image.get_selection", self)
+        return Channel(self, "selection", self.width, self.height, self.selectionBounds)
+
+    def insert_layer(self, layer, parent, position) :
+        log.record("Image.insert_layer", self, layer, position)
+        self.layers.insert(position, layer)
+
+    def insert_path(self, thisPath, parent, position) :
+        log.record("Image.insert_path", self, thisPath, position)
+        self.paths.insert(position, thisPath)
+        self.pushUndo(pathPoints(thisPath) * UNDO_PATH_POINT_BYTES)
+
+    def remove_path(self, thisPath) :
+        log.record("Image.remove_path", self, thisPath)
+        self.paths.remove(thisPath)
+        self.pushUndo(pathPoints(thisPath) * UNDO_PATH_POINT_BYTES)
+
+    def remove_channel(self, channel) :
+        log.record("Image.remove_channel", self, channel)
+
+    def get_item_position(self, item) :
+        log.record("Image.get_item_position", self, item)
+        return self.layers.index(item)
+
+    def remove_layer(self, layer) :
+        log.record("Image.remove_layer", self, layer)
+        self.layers.remove(layer)
+        self.pushUndo(layer.width * layer.height * UNDO_PIXEL_BYTES)
+
+    def select_rectangle(self, operation, x, y, width, height) :
+        log.record("Image.select_rectangle", self, operation, x, y, width, height)
+        self.pushUndo(self.width * self.height * UNDO_MASK_BYTES)
+        box = [x, y, x + width, y + height]
+        if operation == 2 :
+            self.selectionBounds = box
+        elif operation == 0 :
+            self.selectionBounds = unionBounds(self.selectionBounds, box)
+        # end if
+
+    def select_item(self, operation, item) :
+        log.record("Image.select_item", self, operation, item)
+        self.pushUndo(self.width * self.height * UNDO_MASK_BYTES)
+        if operation == 2 : # replace
+            self.selectionBounds = item.bounds
+        elif operation == 0 : # add
+            self.selectionBounds = unionBounds(self.selectionBounds, item.bounds)
+        elif operation == 3 and self.selectionBounds is not None and item.bounds is not None :
+            box = [max(self.selectionBounds[0], item.bounds[0]),
+                   max(self.selectionBounds[1], item.bounds[1]),
+                   min(self.selectionBounds[2], item.bounds[2]),
+                   min(self.selectionBounds[3], item.bounds[3])]
+            self.selectionBounds = box if box[0] < box[2] and box[1] < box[3] else None
+        elif operation == 3 :
+            self.selectionBounds = None
+        # end if
+
+
+def pathPoints(thisPath) :
+
+    return sum( len(flatList) // 2 for flatList, closed in thisPath.strokes )
+
+
+class Selection :
+
+    @staticmethod
+    def is_empty(image) :
+        log.record("Selection.is_empty", image)
+        return image.selectionBounds is None
+
+    @staticmethod
+    def bounds(image) :
+        log.record("Selection.bounds", image)
+        if image.selectionBounds is None :
+            return True, False, 0, 0, 0, 0
+        x1, y1, x2, y2 = [ int(round(value)) for value in image.selectionBounds ]
+        return True, True, x1, y1, x2, y2
+
+    @staticmethod
+    def none(image) :
+        log.record("Selection.none", image)
+        image.pushUndo(image.width * image.height * UNDO_MASK_BYTES)
+        image.selectionBounds = None
+
+
+# named buffers: the drawn bounds of the copied drawable, in image coordinates
+buffers = {}
+
+
+def edit_named_copy(drawables, name) :
+    log.record("edit_named_copy", len(drawables), name)
+    buffers[name] = drawables[0].bounds
+    return name
+
+
+# the floating selection keeps the buffer and the drawable it is anchored on
+def edit_named_paste(drawable, name, pasteInto) :
+    log.record("edit_named_paste", drawable, name, pasteInto)
+    floating = Layer(drawable.image, "Pasted Layer", drawable.width, drawable.height)
+    floating.bounds = buffers[name]
+    floating.target = drawable
+    return floating
+
+
+# the pasted pixels clipped to the drawable, the undo step keeps the pixels under them
+def floating_sel_anchor(floating) :
+    log.record("floating_sel_anchor", floating)
+    target = floating.target
+    drawn = floating.bounds
+    if drawn is not None :
+        clip = [target.offsets[0], target.offsets[1],
+                target.offsets[0] + target.width, target.offsets[1] + target.height]
+        drawn = [max(drawn[0], clip[0]), max(drawn[1], clip[1]),
+                 min(drawn[2], clip[2]), min(drawn[3], clip[3])]
+        if drawn[0] < drawn[2] and drawn[1] < drawn[3] :
+            target.bounds = unionBounds(target.bounds, drawn)
+            target.image.pushUndo(boundsArea(drawn) * UNDO_PIXEL_BYTES)
+    return True
+
+
+def buffer_delete(name) :
+    log.record("buffer_delete", name)
+    del buffers[name]
+    return True
+
+
+#*************************************************************************************
+
+
+def context_push() :
+    log.record("context_push")
+
+def context_pop() :
+    log.record("context_pop")
+
+def context_set_foreground(color) :
+    log.record("context_set_foreground", color)
+
+def color_parse_name(name) :
+    log.record("color_parse_name", name)
+    return name
+
+class Color :
+
+    def __init__(self, rgba) :
+        self.rgba = rgba
+
+    def get_rgba(self) :
+        return self.rgba
+
+
+def context_get_foreground() :
+    log.record("context_get_foreground")
+    return Color((0.0, 0.0, 0.0, 1.0))
+
+def context_set_antialias(value) :
+    log.record("context_set_antialias", value)
+
+def context_set_feather(value) :
+    log.record("context_set_feather", value)
+
+def context_set_line_width(value) :
+    log.record("context_set_line_width", value)
+
+def context_set_line_join_style(value) :
+    log.record("context_set_line_join_style", value)
+
+def context_set_line_cap_style(value) :
+    log.record("context_set_line_cap_style", value)
+
+def context_set_stroke_method(value) :
+    log.record("context_set_stroke_method", value)
+
+def context_set_line_miter_limit(value) :
+    log.record("context_set_line_miter_limit", value)
+
+def context_get_font() :
+    log.record("context_get_font")
+    return "Sans-serif"
+
+def message(text) :
+    log.record("message", text)
+
+
+class Display :
+
+    @staticmethod
+    def new(image) :
+        log.record("Display.new", image)
+
+
+#*************************************************************************************
+
+
+# procedure registration, enough to read back the arguments and their defaults
+
+class Choice :
+
+    def __init__(self) :
+        self.names = []
+
+    @staticmethod
+    def new() :
+        return Choice()
+
+    def add(self, nick, value, label, help) :
+        self.names.append(nick)
+
+
+class Procedure :
+
+    def __init__(self, plugIn, name, procType, runFunc, runData) :
+        self.plugIn = plugIn
+        self.name = name
+        self.runFunc = runFunc
+        self.defaults = {}
+        self.choices = {}
+        self.returnDefaults = {}
+
+    @classmethod
+    def new(cls, plugIn, name, procType, runFunc, runData) :
+        return cls(plugIn, name, procType, runFunc, runData)
+
+    def get_name(self) :
+        return self.name
+
+    def get_plug_in(self) :
+        return self.plugIn
+
+    def new_return_values(self, status, error) :
+        returnValues = ValueArray([status] + list(self.returnDefaults.values()))
+        returnValues.error = error
+        return returnValues
+
+    def add_enum_argument(self, name, nick, blurb, enumType, default, flags) :
+        self.defaults[name] = default
+
+    def add_choice_argument(self, name, nick, blurb, choice, default, flags) :
+        self.defaults[name] = default
+        self.choices[name] = choice.names
+
+    def add_double_argument(self, name, nick, blurb, minimum, maximum, default, flags) :
+        self.defaults[name] = default
+
+    def add_int_argument(self, name, nick, blurb, minimum, maximum, default, flags) :
+        self.defaults[name] = default
+
+    def add_boolean_argument(self, name, nick, blurb, default, flags) :
+        self.defaults[name] = default
+
+    def add_string_argument(self, name, nick, blurb, default, flags) :
+        self.defaults[name] = default
+
+    def add_double_array_argument(self, name, nick, blurb, flags) :
+        self.defaults[name] = []
+
+    def add_int32_array_argument(self, name, nick, blurb, flags) :
+        self.defaults[name] = []
+
+    def add_file_argument(self, name, nick, blurb, action, none_ok, default, flags) :
+        self.defaults[name] = default
+
+    def add_int_return_value(self, name, nick, blurb, minimum, maximum, default, flags) :
+        self.returnDefaults[name] = default
+
+    def add_string_return_value(self, name, nick, blurb, default, flags) :
+        self.returnDefaults[name] = default
+
+    def add_image_return_value(self, name, nick, blurb, none_ok, flags) :
+        self.returnDefaults[name] = None
+
+    def create_config(self) :
+        return Config(self.defaults)
+
+    def __getattr__(self, name) :
+        # set_menu_label, add_menu_path, set_documentation... have no effect here
+        if name.startswith("set_") or name.startswith("add_menu") :
+            return lambda *args : None
+        raise AttributeError(name)
+
+
+# status, then the return values in their declaration order; the error is kept aside
+class ValueArray (list) :
+
+    def index(self, position) :
+        return self[position]
+
+    def remove(self, position) :
+        del self[position]
+
+
+class ImageProcedure (Procedure) :
+    pass
+
+
+class Config :
+
+    def __init__(self, values) :
+        self.values = dict(values)
+
+    def get_property(self, name) :
+        return self.values[name]
+
+    def set_property(self, name, value) :
+        self.values[name] = value
+
+
+# temporary procedures and persistent mode: the calls made to the temporary procedures
+# are queued with queueCall (helper, not part of the API) and run one by one by
+# persistent_process
+class PlugIn :
+
+    @staticmethod
+    def error_quark() :
+        return 0
+
+    def add_temp_procedure(self, procedure) :
+        log.record("PlugIn.add_temp_procedure", procedure.name)
+        self.__dict__.setdefault("tempProcedures", {})[procedure.name] = procedure
+
+    def remove_temp_procedure(self, name) :
+        log.record("PlugIn.remove_temp_procedure", name)
+        del self.tempProcedures[name]
+
+    def persistent_enable(self) :
+        log.record("PlugIn.persistent_enable")
+
+    # run the next queued call, as GIMP would when a temporary procedure is called
+    def persistent_process(self, timeout) :
+        if self.__dict__.get("pendingCalls", []) == [] :
+            raise RuntimeError("persistent_process: no call waiting, the service never stops")
+        call = self.pendingCalls.pop(0)
+        call(self.tempProcedures)
+
+    def queueCall(self, call) :
+        self.__dict__.setdefault("pendingCalls", []).append(call)
+
+
+# file arguments (Gio.File), only the local path is read
+class File :
+
+    def __init__(self, path) :
+        self.path = path
+
+    @staticmethod
+    def new_for_path(path) :
+        return File(path)
+
+    def get_path(self) :
+        return self.path
+
+
+#*************************************************************************************
+
+
+# install the stand-in as gi.repository.Gimp (and the few other modules the plug-in
+# imports) before the plug-in module is imported
+def install() :
+
+    gimpModule = sys.modules[__name__]
+
+    gi = types.ModuleType("gi")
+    gi.require_version = lambda name, version : None
+    repository = types.ModuleType("gi.repository")
+
+    gimpUi = types.ModuleType("gi.repository.GimpUi")
+    gimpUi.ICON_GEGL = "gimp-gegl"
+
+    gObject = types.ModuleType("gi.repository.GObject")
+    gObject.ParamFlags = Enum(READWRITE=3)
+    gObject.TYPE_INT = int
+    gObject.TYPE_STRING = str
+    gObject.Value = lambda valueType, value : value
+
+    gLib = types.ModuleType("gi.repository.GLib")
+    gLib.Error = Error
+
+    gegl = types.ModuleType("gi.repository.Gegl")
+    gegl.Rectangle = Rectangle
+    gegl.AbyssPolicy = Enum(NONE=0, CLAMP=1, LOOP=2, BLACK=3, WHITE=4)
+
+    gio = types.ModuleType("gi.repository.Gio")
+    gio.File = File
+
+    repository.Gimp = gimpModule
+    repository.GimpUi = gimpUi
+    repository.GObject = gObject
+    repository.GLib = gLib
+    repository.Gegl = gegl
+    repository.Gio = gio
+    gi.repository = repository
+
+    sys.modules["gi"] = gi
+    sys.modules["gi.repository"] = repository
+    sys.modules["gi.repository.Gimp"] = gimpModule
+    sys.modules["gi.repository.GimpUi"] = gimpUi
+    sys.modules["gi.repository.GObject"] = gObject
+    sys.modules["gi.repository.GLib"] = gLib
+    sys.modules["gi.repository.Gegl"] = gegl
+    sys.modules["gi.repository.Gio"] = gio